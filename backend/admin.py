@@ -27,6 +27,9 @@ def show_menu():
     print("2. Reset All Passwords (to 'password123')")
     print("3. Reset User Workouts")
     print("4. Delete User")
+    print("5. Rebuild Exercise History (last weights)")
+    print("6. Recompute Client Metrics")
+    print("7. Rebuild Daily Activity Rollup")
     print()
     print("0. Exit")
     print()
@@ -121,6 +124,19 @@ def main():
                 user_id = input("Enter user ID: ").strip()
                 run_script('delete_user.py', ['--id', user_id])
 
+        elif choice == '5':
+            # Rebuild last performance table
+            run_script('backfill_exercise_last.py')
+
+        elif choice == '6':
+            # Recompute ClientMetrics from source tables
+            dry_run = input("Dry run first (show changes only)? (yes/no): ").lower().strip()
+            run_script('recompute_metrics.py', ['--dry-run'] if dry_run == 'yes' else [])
+
+        elif choice == '7':
+            # Rebuild daily_user_activity (calendar, streaks)
+            run_script('rebuild_activity_rollup.py')
+
         else:
             print("\n❌ Invalid choice. Please try again.")
             input("\nPress Enter to continue...")
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
 from app.models.models import User, UserRole
 from app.schemas.schemas import (
@@ -9,21 +10,37 @@ from app.schemas.schemas import (
     UserResponse,
     Token,
     LoginRequest,
+    RefreshTokenRequest,
+    DeviceSessionResponse,
     ChangePasswordRequest,
     PasswordResetRequest,
     PasswordResetConfirm,
     PasswordResetResponse
 )
 from app.core.security import (
-    get_password_hash,
-    verify_password,
-    create_access_token,
+    get_password_hash_async,
+    verify_password_async,
+    password_needs_rehash,
+    create_user_access_token,
     validate_password_strength,
     get_current_user,
+    get_token_user,
+    TokenUser,
     check_login_attempts,
     record_login_attempt
 )
 from app.core.config import settings
+from app.core.login_attempts import login_client_ip
+from app.core.user_cache import publish_user_change, user_cache, user_from_snapshot
+from app.core.refresh_tokens import (
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
+    revoke_refresh_family,
+    revoke_user_refresh_tokens,
+    active_refresh_tokens,
+    invalid_refresh_token
+)
 from datetime import datetime
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -44,11 +61,16 @@ def calculate_age(date_of_birth: datetime) -> int:
     return age
 
 
+def device_name_of(request: Request, device_name: Optional[str] = None) -> Optional[str]:
+    """Name of the device signing in: the one given by the client, else its User-Agent"""
+    return device_name or request.headers.get("user-agent")
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,7 +78,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
     # Check if username already exists
-    existing_username = db.query(User).filter(User.username == user_data.username).first()
+    existing_username = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -71,7 +93,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -87,8 +109,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Add calculated fields
     response = UserResponse.from_orm(new_user)
@@ -99,10 +121,11 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
-    """Login user and return JWT token"""
+async def login(login_data: LoginRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """Login user and return JWT access token and refresh token"""
     # Check if account is locked due to failed attempts
-    is_locked, attempts_remaining = check_login_attempts(db, login_data.email)
+    client_ip = login_client_ip(request)
+    is_locked, attempts_remaining = await check_login_attempts(login_data.email, client_ip)
 
     if is_locked:
         raise HTTPException(
@@ -111,13 +134,13 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
         )
 
     # Check if login identifier is email or username
-    user = db.query(User).filter(
-        (User.email == login_data.email) | (User.username == login_data.email)
-    ).first()
+    user = await db.scalar(
+        select(User).where((User.email == login_data.email) | (User.username == login_data.email))
+    )
 
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user or not await verify_password_async(login_data.password, user.hashed_password):
         # Record failed attempt
-        record_login_attempt(db, login_data.email, success=False, user_id=user.id if user else None)
+        await record_login_attempt(login_data.email, success=False, user_id=user.id if user else None, ip_address=client_ip)
 
         # Calculate remaining attempts for better UX
         new_attempts_remaining = attempts_remaining - 1
@@ -133,25 +156,33 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Upgrade the hash when BCRYPT_ROUNDS changed (committed with the refresh token)
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash_async(login_data.password)
+        await db.run_sync(lambda session: publish_user_change(session, user.id))
+
+    # Refresh token for this device
+    refresh_token = await issue_refresh_token(db, user.id, device_name_of(request, login_data.device_name))
+
     # Record successful login
-    record_login_attempt(db, login_data.email, success=True, user_id=user.id)
+    await record_login_attempt(login_data.email, success=True, user_id=user.id, ip_address=client_ip)
+    await db.commit()
 
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id}, expires_delta=access_token_expires
-    )
+    access_token = create_user_access_token(user)
 
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 
 @router.post("/token", response_model=Token)
 async def login_oauth(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """OAuth2 compatible token endpoint"""
     # Check if account is locked due to failed attempts
-    is_locked, attempts_remaining = check_login_attempts(db, form_data.username)
+    client_ip = login_client_ip(request)
+    is_locked, attempts_remaining = await check_login_attempts(form_data.username, client_ip)
 
     if is_locked:
         raise HTTPException(
@@ -160,13 +191,13 @@ async def login_oauth(
         )
 
     # Check if login identifier is email or username
-    user = db.query(User).filter(
-        (User.email == form_data.username) | (User.username == form_data.username)
-    ).first()
+    user = await db.scalar(
+        select(User).where((User.email == form_data.username) | (User.username == form_data.username))
+    )
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         # Record failed attempt
-        record_login_attempt(db, form_data.username, success=False, user_id=user.id if user else None)
+        await record_login_attempt(form_data.username, success=False, user_id=user.id if user else None, ip_address=client_ip)
 
         # Calculate remaining attempts for better UX
         new_attempts_remaining = attempts_remaining - 1
@@ -182,15 +213,83 @@ async def login_oauth(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Upgrade the hash when BCRYPT_ROUNDS changed (committed with the refresh token)
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash_async(form_data.password)
+        await db.run_sync(lambda session: publish_user_change(session, user.id))
+
+    # Refresh token for this device
+    refresh_token = await issue_refresh_token(db, user.id, device_name_of(request))
+
     # Record successful login
-    record_login_attempt(db, form_data.username, success=True, user_id=user.id)
+    await record_login_attempt(form_data.username, success=True, user_id=user.id, ip_address=client_ip)
+    await db.commit()
 
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.id}, expires_delta=access_token_expires
-    )
+    access_token = create_user_access_token(user)
+
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(refresh_data: RefreshTokenRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Trade a refresh token for a new access token and refresh token
+    The refresh token is single use: it is revoked and replaced by the one returned
+    """
+    user_id, refresh_token = await rotate_refresh_token(db, refresh_data.refresh_token)
+
+    snapshot = user_cache.get(user_id)
+    user = user_from_snapshot(snapshot) if snapshot is not None else await db.get(User, user_id)
+    if user is None:
+        raise invalid_refresh_token()
+
+    await db.commit()
+
+    return {
+        "access_token": create_user_access_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token
+    }
 
-    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout")
+async def logout(refresh_data: RefreshTokenRequest, db: AsyncSession = Depends(get_db)):
+    """Sign this device out by revoking its refresh token"""
+    await revoke_refresh_token(db, refresh_data.refresh_token)
+    await db.commit()
+    return {"message": "Logged out successfully"}
+
+
+@router.get("/devices", response_model=List[DeviceSessionResponse])
+async def list_devices(
+    current_user: TokenUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Devices the authenticated user is signed in on"""
+    return [
+        DeviceSessionResponse(
+            id=token.family_id,
+            device_name=token.device_name,
+            last_refreshed_at=token.created_at,
+            expires_at=token.expires_at
+        )
+        for token in await active_refresh_tokens(db, current_user.id)
+    ]
+
+
+@router.delete("/devices/{device_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def sign_out_device(
+    device_id: str,
+    current_user: TokenUser = Depends(get_token_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Sign one device out; its access token stays valid until it expires"""
+    if not await revoke_refresh_family(db, device_id, user_id=current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found"
+        )
+    await db.commit()
 
 
 @router.get("/me", response_model=UserResponse)
@@ -205,12 +304,13 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 @router.post("/change-password")
 async def change_password(
     password_data: ChangePasswordRequest,
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Change password for authenticated user"""
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -224,23 +324,33 @@ async def change_password(
         )
 
     # Check if new password is different from current
-    if verify_password(password_data.new_password, current_user.hashed_password):
+    if await verify_password_async(password_data.new_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="New password must be different from current password"
         )
 
-    # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    # Update password and sign out every other session (tokens from before the change are revoked)
+    current_user.hashed_password = await get_password_hash_async(password_data.new_password)
+    current_user.token_epoch = (current_user.token_epoch or 0) + 1
+    await db.run_sync(lambda session: publish_user_change(session, current_user.id))
+    await revoke_user_refresh_tokens(db, current_user.id)
+    refresh_token = await issue_refresh_token(db, current_user.id, device_name_of(request))
+    await db.commit()
 
-    return {"message": "Password changed successfully"}
+    # Replacement tokens for the session that changed the password
+    return {
+        "message": "Password changed successfully",
+        "access_token": create_user_access_token(current_user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token
+    }
 
 
 @router.post("/forgot-password", response_model=PasswordResetResponse)
 async def forgot_password(
     request_data: PasswordResetRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Request password reset (generates token and sends email)"""
     from app.models.models import PasswordResetToken
@@ -248,9 +358,9 @@ async def forgot_password(
     import secrets
 
     # Find user by email or username
-    user = db.query(User).filter(
-        (User.email == request_data.email) | (User.username == request_data.email)
-    ).first()
+    user = await db.scalar(
+        select(User).where((User.email == request_data.email) | (User.username == request_data.email))
+    )
 
     # Always return success message to prevent user enumeration
     success_message = "If an account with that email/username exists, a password reset link has been sent."
@@ -265,10 +375,12 @@ async def forgot_password(
     reset_token = secrets.token_urlsafe(32)
 
     # Expire old tokens for this user
-    old_tokens = db.query(PasswordResetToken).filter(
-        PasswordResetToken.user_id == user.id,
-        PasswordResetToken.used == False
-    ).all()
+    old_tokens = (await db.scalars(
+        select(PasswordResetToken).where(
+            PasswordResetToken.user_id == user.id,
+            PasswordResetToken.used == False
+        )
+    )).all()
     for token in old_tokens:
         token.used = True
 
@@ -283,7 +395,7 @@ async def forgot_password(
     )
 
     db.add(new_token)
-    db.commit()
+    await db.commit()
 
     # Send password reset email
     try:
@@ -307,17 +419,19 @@ async def forgot_password(
 @router.post("/reset-password")
 async def reset_password(
     reset_data: PasswordResetConfirm,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Reset password using token"""
     from app.models.models import PasswordResetToken
     from datetime import datetime, timezone
 
     # Find token
-    token_record = db.query(PasswordResetToken).filter(
-        PasswordResetToken.token == reset_data.token,
-        PasswordResetToken.used == False
-    ).first()
+    token_record = await db.scalar(
+        select(PasswordResetToken).where(
+            PasswordResetToken.token == reset_data.token,
+            PasswordResetToken.used == False
+        )
+    )
 
     if not token_record:
         raise HTTPException(
@@ -328,14 +442,14 @@ async def reset_password(
     # Check if token is expired
     if token_record.expires_at < datetime.now(timezone.utc):
         token_record.used = True
-        db.commit()
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Reset token has expired"
         )
 
     # Get user
-    user = db.query(User).filter(User.id == token_record.user_id).first()
+    user = await db.get(User, token_record.user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -350,11 +464,15 @@ async def reset_password(
         )
 
     # Update password
-    user.hashed_password = get_password_hash(reset_data.new_password)
+    user.hashed_password = await get_password_hash_async(reset_data.new_password)
+    # Revoke every token issued before the reset
+    user.token_epoch = (user.token_epoch or 0) + 1
+    await db.run_sync(lambda session: publish_user_change(session, user.id))
+    await revoke_user_refresh_tokens(db, user.id)
 
     # Mark token as used
     token_record.used = True
 
-    db.commit()
+    await db.commit()
 
     return {"message": "Password has been reset successfully"}
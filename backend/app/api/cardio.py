@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
+from app.db.pagination import page_with_cursor, paginate
 from app.models.models import User, CardioSession
 from app.schemas.schemas import (
     CardioSessionCreate,
@@ -10,19 +12,33 @@ from app.schemas.schemas import (
     CardioSessionUpdate
 )
 from app.core.security import get_current_user
+from app.services.streak_service import update_user_streak
+from app.services.activity_rollup import refresh_daily_activity, get_session_day
+from app.services.metrics_events import enqueue_metrics_event, schedule_event_processing, CARDIO_LOGGED
 
 router = APIRouter(prefix="/cardio", tags=["Cardio"])
 
 
+def record_cardio_changed(sync_db, user_id: str, day) -> None:
+    """Refresh the per-user data derived from cardio sessions of a day (daily rollup, streak)"""
+    refresh_daily_activity(sync_db, user_id, day)
+    update_user_streak(sync_db, user_id)
+
+
+def record_cardio_logged(sync_db, cardio_id: str, user_id: str) -> None:
+    """Update the per-user data for a new cardio session and queue its ClientMetrics update"""
+    record_cardio_changed(sync_db, user_id, get_session_day(sync_db, CardioSession, cardio_id))
+    enqueue_metrics_event(sync_db, CARDIO_LOGGED, cardio_id, user_id)
+
+
 @router.post("", response_model=CardioSessionResponse, status_code=status.HTTP_201_CREATED)
 async def create_cardio_session(
     cardio_data: CardioSessionCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Log a new cardio session"""
-    from app.services.metrics_service import update_metrics_after_cardio
-
     new_cardio = CardioSession(
         user_id=current_user.id,
         activity_type=cardio_data.activity_type,
@@ -35,45 +51,55 @@ async def create_cardio_session(
     )
 
     db.add(new_cardio)
-    db.commit()
-    db.refresh(new_cardio)
+    await db.flush()
+    await db.run_sync(lambda sync_db: record_cardio_logged(sync_db, new_cardio.id, current_user.id))
+    await db.commit()
+    await db.refresh(new_cardio)
 
-    # Update metrics after cardio session is logged
-    update_metrics_after_cardio(db, new_cardio.id)
+    # Apply metrics after the response is sent
+    schedule_event_processing(background_tasks)
 
     return new_cardio
 
 
 @router.get("", response_model=List[CardioSessionResponse])
 async def get_cardio_sessions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     activity_type: str = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all cardio sessions for current user"""
-    query = db.query(CardioSession).filter(CardioSession.user_id == current_user.id)
+    """
+    Get all cardio sessions for current user, newest first
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page
+    """
+    query = select(CardioSession).where(CardioSession.user_id == current_user.id)
 
     if activity_type:
-        query = query.filter(CardioSession.activity_type.ilike(f"%{activity_type}%"))
+        query = query.where(CardioSession.activity_type.ilike(f"%{activity_type}%"))
 
-    sessions = query.order_by(CardioSession.start_time.desc()).offset(skip).limit(limit).all()
+    sort_key = [CardioSession.start_time, CardioSession.id]
+    sessions = (await db.scalars(paginate(query, sort_key, cursor, skip, limit))).all()
 
-    return sessions
+    return page_with_cursor(response, sessions, sort_key, limit)
 
 
 @router.get("/{session_id}", response_model=CardioSessionResponse)
 async def get_cardio_session(
     session_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get specific cardio session"""
-    session = db.query(CardioSession).filter(
-        CardioSession.id == session_id,
-        CardioSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        select(CardioSession).where(
+            CardioSession.id == session_id,
+            CardioSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -89,13 +115,15 @@ async def update_cardio_session(
     session_id: str,
     cardio_update: CardioSessionUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update cardio session"""
-    session = db.query(CardioSession).filter(
-        CardioSession.id == session_id,
-        CardioSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        select(CardioSession).where(
+            CardioSession.id == session_id,
+            CardioSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -116,8 +144,14 @@ async def update_cardio_session(
     if cardio_update.notes is not None:
         session.notes = cardio_update.notes
 
-    db.commit()
-    db.refresh(session)
+    await db.flush()
+    await db.run_sync(
+        lambda sync_db: refresh_daily_activity(
+            sync_db, current_user.id, get_session_day(sync_db, CardioSession, session_id)
+        )
+    )
+    await db.commit()
+    await db.refresh(session)
 
     return session
 
@@ -126,13 +160,15 @@ async def update_cardio_session(
 async def delete_cardio_session(
     session_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete cardio session"""
-    session = db.query(CardioSession).filter(
-        CardioSession.id == session_id,
-        CardioSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        select(CardioSession).where(
+            CardioSession.id == session_id,
+            CardioSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -140,7 +176,11 @@ async def delete_cardio_session(
             detail="Cardio session not found"
         )
 
-    db.delete(session)
-    db.commit()
+    day = await db.run_sync(lambda sync_db: get_session_day(sync_db, CardioSession, session_id))
+
+    await db.delete(session)
+    await db.flush()
+    await db.run_sync(lambda sync_db: record_cardio_changed(sync_db, current_user.id, day))
+    await db.commit()
 
     return None
@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 import os
 import uuid
 from pathlib import Path
 from app.db.database import get_db
+from app.db.pagination import page_with_cursor, paginate
 from app.models.models import User, Exercise, AssignedExercise, UserRole
 from app.schemas.schemas import (
     ExerciseCreate, ExerciseResponse, ExerciseUpdate,
     AssignedExerciseCreate, AssignedExerciseResponse
 )
-from app.core.security import get_current_user
+from app.core.security import get_current_user, TokenUser
 from app.core.permissions import require_personal_trainer, check_client_belongs_to_trainer
 from app.core.config import settings
 
@@ -54,8 +57,8 @@ async def create_exercise(
     description: Optional[str] = Form(None),
     equipment: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None),
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new exercise (Personal Trainers only)"""
     image_path = None
@@ -72,56 +75,60 @@ async def create_exercise(
     )
 
     db.add(new_exercise)
-    db.commit()
-    db.refresh(new_exercise)
+    await db.commit()
+    await db.refresh(new_exercise)
 
     return new_exercise
 
 
 @router.get("", response_model=List[ExerciseResponse])
 async def get_exercises(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     muscle_group: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Get exercises based on user role:
     - Personal Trainers: See all exercises they created
     - Clients: See only exercises assigned to them by their PT
+    Oldest first; pass the X-Next-Cursor response header back as `cursor` to get the next page
     """
-    query = db.query(Exercise)
+    query = select(Exercise)
 
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT sees exercises they created
-        query = query.filter(Exercise.created_by == current_user.id)
+        query = query.where(Exercise.created_by == current_user.id)
     else:
         # Client sees only assigned exercises
-        assigned_exercise_ids = db.query(AssignedExercise.exercise_id).filter(
+        assigned_exercise_ids = select(AssignedExercise.exercise_id).where(
             AssignedExercise.client_id == current_user.id
-        ).subquery()
-        query = query.filter(Exercise.id.in_(assigned_exercise_ids))
+        )
+        query = query.where(Exercise.id.in_(assigned_exercise_ids))
 
     if muscle_group:
-        query = query.filter(Exercise.muscle_group.ilike(f"%{muscle_group}%"))
+        query = query.where(Exercise.muscle_group.ilike(f"%{muscle_group}%"))
 
     if search:
-        query = query.filter(Exercise.name.ilike(f"%{search}%"))
+        query = query.where(Exercise.name.ilike(f"%{search}%"))
 
-    exercises = query.offset(skip).limit(limit).all()
-    return exercises
+    sort_key = [Exercise.created_at, Exercise.id]
+    exercises = (await db.scalars(paginate(query, sort_key, cursor, skip, limit, descending=False))).all()
+    return page_with_cursor(response, exercises, sort_key, limit)
 
 
 @router.get("/{exercise_id}", response_model=ExerciseResponse)
 async def get_exercise(
     exercise_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get specific exercise by ID with authorization check"""
-    exercise = db.query(Exercise).filter(Exercise.id == exercise_id).first()
+    exercise = await db.get(Exercise, exercise_id)
     if not exercise:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -138,10 +145,12 @@ async def get_exercise(
             )
     else:
         # CLIENT can only view exercises assigned to them
-        is_assigned = db.query(AssignedExercise).filter(
-            AssignedExercise.exercise_id == exercise_id,
-            AssignedExercise.client_id == current_user.id
-        ).first()
+        is_assigned = await db.scalar(
+            select(AssignedExercise.id).where(
+                AssignedExercise.exercise_id == exercise_id,
+                AssignedExercise.client_id == current_user.id
+            ).limit(1)
+        )
         if not is_assigned:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -159,14 +168,16 @@ async def update_exercise(
     description: Optional[str] = Form(None),
     equipment: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None),
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update exercise (Personal Trainers only, own exercises)"""
-    exercise = db.query(Exercise).filter(
-        Exercise.id == exercise_id,
-        Exercise.created_by == current_user.id
-    ).first()
+    exercise = await db.scalar(
+        select(Exercise).where(
+            Exercise.id == exercise_id,
+            Exercise.created_by == current_user.id
+        )
+    )
     if not exercise:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -189,8 +200,8 @@ async def update_exercise(
                 os.remove(old_path)
         exercise.image_path = save_exercise_image(image)
 
-    db.commit()
-    db.refresh(exercise)
+    await db.commit()
+    await db.refresh(exercise)
 
     return exercise
 
@@ -198,14 +209,16 @@ async def update_exercise(
 @router.delete("/{exercise_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_exercise(
     exercise_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete exercise (Personal Trainers only, own exercises)"""
-    exercise = db.query(Exercise).filter(
-        Exercise.id == exercise_id,
-        Exercise.created_by == current_user.id
-    ).first()
+    exercise = await db.scalar(
+        select(Exercise).where(
+            Exercise.id == exercise_id,
+            Exercise.created_by == current_user.id
+        )
+    )
     if not exercise:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -218,8 +231,8 @@ async def delete_exercise(
         if os.path.exists(file_path):
             os.remove(file_path)
 
-    db.delete(exercise)
-    db.commit()
+    await db.delete(exercise)
+    await db.commit()
 
     return None
 
@@ -229,15 +242,17 @@ async def delete_exercise(
 @router.post("/assign", response_model=AssignedExerciseResponse, status_code=status.HTTP_201_CREATED)
 async def assign_exercise_to_client(
     assignment: AssignedExerciseCreate,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Personal Trainer assigns an exercise from library to a client"""
     # Verify the exercise exists and belongs to this PT
-    exercise = db.query(Exercise).filter(
-        Exercise.id == assignment.exercise_id,
-        Exercise.created_by == current_user.id
-    ).first()
+    exercise = await db.scalar(
+        select(Exercise).where(
+            Exercise.id == assignment.exercise_id,
+            Exercise.created_by == current_user.id
+        )
+    )
     if not exercise:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -245,7 +260,7 @@ async def assign_exercise_to_client(
         )
 
     # Verify the client exists and belongs to this PT
-    client = db.query(User).filter(User.id == assignment.client_id).first()
+    client = await db.get(User, assignment.client_id)
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -255,10 +270,12 @@ async def assign_exercise_to_client(
     check_client_belongs_to_trainer(client, current_user)
 
     # Check if already assigned
-    existing = db.query(AssignedExercise).filter(
-        AssignedExercise.exercise_id == assignment.exercise_id,
-        AssignedExercise.client_id == assignment.client_id
-    ).first()
+    existing = await db.scalar(
+        select(AssignedExercise.id).where(
+            AssignedExercise.exercise_id == assignment.exercise_id,
+            AssignedExercise.client_id == assignment.client_id
+        ).limit(1)
+    )
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -274,8 +291,8 @@ async def assign_exercise_to_client(
     )
 
     db.add(new_assignment)
-    db.commit()
-    db.refresh(new_assignment)
+    await db.commit()
+    await db.refresh(new_assignment, attribute_names=["assigned_at", "exercise"])
 
     return new_assignment
 
@@ -283,12 +300,12 @@ async def assign_exercise_to_client(
 @router.get("/assigned/{client_id}", response_model=List[AssignedExerciseResponse])
 async def get_assigned_exercises(
     client_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all exercises assigned to a specific client (PT only)"""
     # Verify client belongs to this PT
-    client = db.query(User).filter(User.id == client_id).first()
+    client = await db.get(User, client_id)
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -297,10 +314,14 @@ async def get_assigned_exercises(
 
     check_client_belongs_to_trainer(client, current_user)
 
-    assignments = db.query(AssignedExercise).filter(
-        AssignedExercise.client_id == client_id,
-        AssignedExercise.personal_trainer_id == current_user.id
-    ).all()
+    assignments = (await db.scalars(
+        select(AssignedExercise).options(
+            selectinload(AssignedExercise.exercise)
+        ).where(
+            AssignedExercise.client_id == client_id,
+            AssignedExercise.personal_trainer_id == current_user.id
+        )
+    )).all()
 
     return assignments
 
@@ -308,21 +329,23 @@ async def get_assigned_exercises(
 @router.delete("/assign/{assignment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def unassign_exercise(
     assignment_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Remove exercise assignment from client (PT only)"""
-    assignment = db.query(AssignedExercise).filter(
-        AssignedExercise.id == assignment_id,
-        AssignedExercise.personal_trainer_id == current_user.id
-    ).first()
+    assignment = await db.scalar(
+        select(AssignedExercise).where(
+            AssignedExercise.id == assignment_id,
+            AssignedExercise.personal_trainer_id == current_user.id
+        )
+    )
     if not assignment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Assignment not found"
         )
 
-    db.delete(assignment)
-    db.commit()
+    await db.delete(assignment)
+    await db.commit()
 
     return None
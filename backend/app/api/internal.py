@@ -0,0 +1,68 @@
+"""
+Internal operational endpoints
+Not used by the frontend - protected by the INTERNAL_API_TOKEN shared secret
+"""
+
+import os
+from fastapi import APIRouter, Depends, Query
+from app.db.database import engine, async_engine, replica_engine
+from app.db.pool import get_worker_pool_stats
+from app.db.slow_queries import leaderboard
+from app.core.config import settings
+from app.core.permissions import require_internal_access
+from app.core.security import hashing_pool
+from app.core.login_attempts import login_audit
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    dependencies=[Depends(require_internal_access)]
+)
+
+
+@router.get("/pool-stats")
+async def get_pool_stats():
+    """
+    Connection pool saturation for the worker that serves this request
+    Reports checked-out, idle and overflow connections plus checkout wait times
+    """
+    engines = {
+        "async": async_engine,
+        "sync": engine
+    }
+    if replica_engine is not None:
+        engines["replica"] = replica_engine
+
+    return get_worker_pool_stats(engines)
+
+
+@router.get("/password-hashing")
+async def get_password_hashing_stats():
+    """
+    Password hashing pool of the worker that serves this request
+    Reports hashes waiting for a thread, running and rejected, plus wait and hash times
+    """
+    return {"worker_pid": os.getpid(), **hashing_pool.snapshot()}
+
+
+@router.get("/login-audit")
+async def get_login_audit_stats():
+    """
+    Login attempt audit queue of the worker that serves this request
+    Reports rows waiting to be written to login_attempts, written and dropped
+    """
+    return {"worker_pid": os.getpid(), **login_audit.snapshot()}
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(limit: int = Query(20, ge=1, le=200)):
+    """
+    Statements with the highest cumulative database time in the current window
+    Statements are normalized (literals and placeholders replaced by ?); counts are per worker
+    """
+    return {
+        "worker_pid": os.getpid(),
+        "window_started_at": leaderboard.window_started_at,
+        "slow_query_ms": settings.SLOW_QUERY_MS,
+        "statements": leaderboard.top(limit)
+    }
@@ -3,31 +3,39 @@ API endpoints for client metrics and progress tracking
 Personal Trainers can view comprehensive metrics about their clients
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
+from app.db.pagination import page_with_cursor, paginate
 from app.models.models import User, ClientMetrics, WeightHistory, UserRole
 from app.schemas.schemas import (
     ClientMetricsResponse,
     ClientMetricsDetailedResponse,
     WeightHistoryResponse
 )
-from app.core.security import get_current_user
+from app.core.security import get_current_user, TokenUser
 from app.core.permissions import require_personal_trainer, check_client_belongs_to_trainer
+from app.services.trainer_summary import get_trainer_summary
 from app.services.metrics_service import (
     get_or_create_client_metrics,
     reset_client_workouts,
-    calculate_client_progress
+    calculate_client_progress,
+    DEFAULT_PROGRESS_WINDOWS
 )
 
 router = APIRouter(prefix="/metrics", tags=["Metrics"])
 
+MAX_PROGRESS_WINDOWS = 5
+
+WEIGHT_HISTORY_SORT_KEY = [WeightHistory.recorded_at, WeightHistory.id]
+
 
 @router.post("/workouts/reset")
 async def reset_my_workouts(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Allow a client to reset their workout count
@@ -39,31 +47,51 @@ async def reset_my_workouts(
             detail="Only clients can reset their workout count"
         )
 
-    result = reset_client_workouts(db, current_user.id)
+    client_id = current_user.id
+    result = await db.run_sync(lambda sync_db: reset_client_workouts(sync_db, client_id))
     return result
 
 
 @router.get("/my-metrics", response_model=ClientMetricsResponse)
 async def get_my_metrics(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get current user's metrics (for clients to see their own progress)
     """
-    metrics = get_or_create_client_metrics(db, current_user.id)
+    client_id = current_user.id
+    metrics = await db.run_sync(lambda sync_db: get_or_create_client_metrics(sync_db, client_id))
+    await db.commit()
     return metrics
 
 
+def progress_windows(
+    windows: List[int] = Query(
+        list(DEFAULT_PROGRESS_WINDOWS),
+        description="Trend windows in days, e.g. ?windows=7&windows=30&windows=90"
+    )
+) -> List[int]:
+    """Validate the requested progress trend windows"""
+    if len(windows) > MAX_PROGRESS_WINDOWS or any(days < 1 or days > 365 for days in windows):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Up to {MAX_PROGRESS_WINDOWS} windows of 1 to 365 days are allowed"
+        )
+    return windows
+
+
 @router.get("/my-progress")
 async def get_my_progress(
+    windows: List[int] = Depends(progress_windows),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get detailed progress analysis for current user
     """
-    progress = calculate_client_progress(db, current_user.id)
+    client_id = current_user.id
+    _, progress = await db.run_sync(lambda sync_db: calculate_client_progress(sync_db, client_id, windows))
 
     if not progress:
         raise HTTPException(
@@ -76,33 +104,37 @@ async def get_my_progress(
 
 @router.get("/weight-history", response_model=List[WeightHistoryResponse])
 async def get_my_weight_history(
+    response: Response,
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get weight history for current user
+    Get weight history for current user, newest first
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page
     """
-    history = db.query(WeightHistory).filter(
-        WeightHistory.user_id == current_user.id
-    ).order_by(WeightHistory.recorded_at.desc()).limit(limit).all()
+    query = select(WeightHistory).where(WeightHistory.user_id == current_user.id)
+    history = (await db.scalars(paginate(query, WEIGHT_HISTORY_SORT_KEY, cursor, 0, limit))).all()
 
-    return history
+    return page_with_cursor(response, history, WEIGHT_HISTORY_SORT_KEY, limit)
 
 
 # ===== Personal Trainer Endpoints =====
 
 @router.get("/clients", response_model=List[ClientMetricsResponse])
 async def get_all_clients_metrics(
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get metrics for all clients of the current Personal Trainer
     """
-    metrics = db.query(ClientMetrics).filter(
-        ClientMetrics.personal_trainer_id == current_user.id
-    ).all()
+    metrics = (await db.scalars(
+        select(ClientMetrics).where(
+            ClientMetrics.personal_trainer_id == current_user.id
+        )
+    )).all()
 
     return metrics
 
@@ -110,13 +142,13 @@ async def get_all_clients_metrics(
 @router.get("/clients/{client_id}", response_model=ClientMetricsDetailedResponse)
 async def get_client_metrics_detail(
     client_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get detailed metrics for a specific client
     """
-    client = db.query(User).filter(User.id == client_id).first()
+    client = await db.get(User, client_id)
 
     if not client:
         raise HTTPException(
@@ -126,18 +158,26 @@ async def get_client_metrics_detail(
 
     check_client_belongs_to_trainer(client, current_user)
 
-    metrics = db.query(ClientMetrics).filter(
-        ClientMetrics.client_id == client_id
-    ).first()
+    metrics = await db.scalar(
+        select(ClientMetrics).where(
+            ClientMetrics.client_id == client_id
+        )
+    )
 
     if not metrics:
         # Create metrics if they don't exist
-        metrics = get_or_create_client_metrics(db, client_id, current_user.id)
+        trainer_id = current_user.id
+        metrics = await db.run_sync(
+            lambda sync_db: get_or_create_client_metrics(sync_db, client_id, trainer_id)
+        )
+        await db.commit()
 
     # Get weight history
-    weight_history = db.query(WeightHistory).filter(
-        WeightHistory.user_id == client_id
-    ).order_by(WeightHistory.recorded_at.desc()).limit(20).all()
+    weight_history = (await db.scalars(
+        select(WeightHistory).where(
+            WeightHistory.user_id == client_id
+        ).order_by(WeightHistory.recorded_at.desc()).limit(20)
+    )).all()
 
     # Create response with additional client details
     response = ClientMetricsDetailedResponse(
@@ -153,13 +193,16 @@ async def get_client_metrics_detail(
 @router.get("/clients/{client_id}/progress")
 async def get_client_progress(
     client_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    windows: List[int] = Depends(progress_windows),
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get detailed progress analysis for a specific client
     """
-    client = db.query(User).filter(User.id == client_id).first()
+    client, progress = await db.run_sync(
+        lambda sync_db: calculate_client_progress(sync_db, client_id, windows)
+    )
 
     if not client:
         raise HTTPException(
@@ -169,8 +212,6 @@ async def get_client_progress(
 
     check_client_belongs_to_trainer(client, current_user)
 
-    progress = calculate_client_progress(db, client_id)
-
     if not progress:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -187,14 +228,16 @@ async def get_client_progress(
 @router.get("/clients/{client_id}/weight-history", response_model=List[WeightHistoryResponse])
 async def get_client_weight_history(
     client_id: str,
+    response: Response,
     limit: int = 50,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get weight history for a specific client
     """
-    client = db.query(User).filter(User.id == client_id).first()
+    client = await db.get(User, client_id)
 
     if not client:
         raise HTTPException(
@@ -204,64 +247,21 @@ async def get_client_weight_history(
 
     check_client_belongs_to_trainer(client, current_user)
 
-    history = db.query(WeightHistory).filter(
-        WeightHistory.user_id == client_id
-    ).order_by(WeightHistory.recorded_at.desc()).limit(limit).all()
+    query = select(WeightHistory).where(WeightHistory.user_id == client_id)
+    history = (await db.scalars(paginate(query, WEIGHT_HISTORY_SORT_KEY, cursor, 0, limit))).all()
 
-    return history
+    return page_with_cursor(response, history, WEIGHT_HISTORY_SORT_KEY, limit)
 
 
 @router.get("/dashboard-summary")
 async def get_trainer_dashboard_summary(
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get summary statistics for Personal Trainer dashboard
     Shows aggregate data across all clients
+    Computed on the primary: the result is cached, and a lagging replica would refill the cache
+    with stale figures right after an invalidation
     """
-    from sqlalchemy import func
-
-    # Get all metrics for this trainer's clients
-    all_metrics = db.query(ClientMetrics).filter(
-        ClientMetrics.personal_trainer_id == current_user.id
-    ).all()
-
-    if not all_metrics:
-        return {
-            "total_clients": 0,
-            "total_workouts_all_clients": 0,
-            "total_training_hours_all_clients": 0,
-            "average_client_consistency": 0,
-            "most_active_client": None,
-            "most_consistent_client": None
-        }
-
-    # Calculate aggregates
-    total_clients = len(all_metrics)
-    total_workouts = sum([m.total_workouts_completed for m in all_metrics])
-    total_hours = sum([m.total_training_hours for m in all_metrics])
-    avg_consistency = sum([m.consistency_percentage or 0 for m in all_metrics]) / total_clients if total_clients > 0 else 0
-
-    # Find most active client (by workouts)
-    most_active = max(all_metrics, key=lambda m: m.total_workouts_completed)
-    most_active_client = db.query(User).filter(User.id == most_active.client_id).first()
-
-    # Find most consistent client (by consistency percentage)
-    most_consistent = max(all_metrics, key=lambda m: m.consistency_percentage or 0)
-    most_consistent_client = db.query(User).filter(User.id == most_consistent.client_id).first()
-
-    return {
-        "total_clients": total_clients,
-        "total_workouts_all_clients": total_workouts,
-        "total_training_hours_all_clients": round(total_hours, 2),
-        "average_client_consistency": round(avg_consistency, 1),
-        "most_active_client": {
-            "name": most_active_client.name,
-            "workouts": most_active.total_workouts_completed
-        } if most_active_client else None,
-        "most_consistent_client": {
-            "name": most_consistent_client.name,
-            "consistency": round(most_consistent.consistency_percentage, 1)
-        } if most_consistent_client else None
-    }
+    return await get_trainer_summary(db, current_user.id)
@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.db.database import get_db, get_read_db
 from app.models.models import User, UserRole
-from app.schemas.schemas import UserResponse, UserUpdate, DashboardStats, HealthMetrics, ClientListResponse
-from app.core.security import get_current_user
+from app.schemas.schemas import (
+    UserResponse, UserUpdate, DashboardStats, HealthMetrics, ClientListResponse, ActivityCalendar
+)
+from app.core.security import get_current_user, TokenUser
 from app.core.permissions import require_personal_trainer
+from app.core.user_cache import publish_user_change
 from app.api.auth import calculate_bmi, calculate_age
+from app.services.streak_service import get_active_streak
+from app.services.activity_rollup import get_activity_calendar
 from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -64,17 +71,19 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 async def update_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current user profile"""
     from app.services.metrics_service import track_weight_change
 
     # Check if username is being updated and if it's already taken
     if user_update.username is not None and user_update.username != current_user.username:
-        existing_username = db.query(User).filter(
-            User.username == user_update.username,
-            User.id != current_user.id
-        ).first()
+        existing_username = await db.scalar(
+            select(User).where(
+                User.username == user_update.username,
+                User.id != current_user.id
+            )
+        )
         if existing_username:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -101,74 +110,56 @@ async def update_profile(
     if user_update.desired_weight is not None:
         current_user.desired_weight = user_update.desired_weight
 
-    db.commit()
-    db.refresh(current_user)
+    await db.run_sync(lambda session: publish_user_change(session, current_user.id))
+    await db.commit()
+    await db.refresh(current_user)
 
     # Track weight change in history and update metrics
     if weight_changed:
-        track_weight_change(db, current_user.id, current_user.weight)
+        new_weight = current_user.weight
+        await db.run_sync(lambda session: track_weight_change(session, current_user.id, new_weight))
 
     response = UserResponse.from_orm(current_user)
     response.bmi = calculate_bmi(current_user.weight, current_user.height)
     response.age = calculate_age(current_user.date_of_birth)
-    if current_user.personal_trainer:
-        response.personal_trainer_name = current_user.personal_trainer.name
+    if current_user.personal_trainer_id:
+        personal_trainer = await db.get(User, current_user.personal_trainer_id)
+        if personal_trainer:
+            response.personal_trainer_name = personal_trainer.name
     return response
 
 
 @router.get("/dashboard", response_model=DashboardStats)
 async def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get dashboard statistics for current user"""
     from app.models.models import WorkoutSession, CardioSession, Exercise
 
     # Total workouts
-    total_workouts = db.query(WorkoutSession).filter(
-        WorkoutSession.user_id == current_user.id,
-        WorkoutSession.end_time.isnot(None)
-    ).count()
+    total_workouts = await db.scalar(
+        select(func.count()).select_from(WorkoutSession).where(
+            WorkoutSession.user_id == current_user.id,
+            WorkoutSession.end_time.isnot(None)
+        )
+    )
 
     # Total cardio sessions
-    total_cardio = db.query(CardioSession).filter(
-        CardioSession.user_id == current_user.id
-    ).count()
+    total_cardio = await db.scalar(
+        select(func.count()).select_from(CardioSession).where(
+            CardioSession.user_id == current_user.id
+        )
+    )
 
     # Calculate BMI
     current_bmi = calculate_bmi(current_user.weight, current_user.height)
 
-    # Calculate active streak (consecutive days with workouts)
-    today = datetime.now().date()
-    active_streak = 0
-    check_date = today
-
-    while True:
-        has_workout = db.query(WorkoutSession).filter(
-            WorkoutSession.user_id == current_user.id,
-            WorkoutSession.start_time >= check_date,
-            WorkoutSession.start_time < check_date + timedelta(days=1),
-            WorkoutSession.end_time.isnot(None)
-        ).first() is not None
-
-        has_cardio = db.query(CardioSession).filter(
-            CardioSession.user_id == current_user.id,
-            CardioSession.start_time >= check_date,
-            CardioSession.start_time < check_date + timedelta(days=1)
-        ).first() is not None
-
-        if has_workout or has_cardio:
-            active_streak += 1
-            check_date -= timedelta(days=1)
-        else:
-            break
-
-        # Limit to prevent infinite loop
-        if active_streak > 365:
-            break
+    # Active streak is maintained on the user when sessions are logged or deleted
+    active_streak = get_active_streak(current_user)
 
     # Total exercises in library
-    total_exercises = db.query(Exercise).count()
+    total_exercises = await db.scalar(select(func.count()).select_from(Exercise))
 
     return DashboardStats(
         total_workouts=total_workouts,
@@ -317,18 +308,55 @@ async def get_health_metrics(
     )
 
 
+def calendar_year(year: Optional[int] = Query(None, ge=2000, le=2100)) -> int:
+    """Calendar year from the query string, defaulting to the current year"""
+    return year or datetime.utcnow().year
+
+
+def calendar_response(request: Request, response: Response, calendar: dict):
+    """
+    Return the calendar with a content ETag; 304 when the client already has this version
+    Clients must revalidate (no-cache) so a newly logged session shows up immediately
+    """
+    payload = ActivityCalendar(**calendar)
+    etag = '"' + hashlib.sha1(payload.model_dump_json().encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return payload
+
+
+@router.get("/activity-calendar", response_model=ActivityCalendar)
+async def get_my_activity_calendar(
+    request: Request,
+    response: Response,
+    year: int = Depends(calendar_year),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Year-at-a-glance activity heatmap of the current user (one intensity level per day)"""
+    user_id = current_user.id
+    calendar = await db.run_sync(lambda sync_db: get_activity_calendar(sync_db, user_id, year))
+    return calendar_response(request, response, calendar)
+
+
 # ===== Client Management Endpoints (Personal Trainers) =====
 
 @router.get("/clients", response_model=List[ClientListResponse])
 async def get_my_clients(
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all clients assigned to the current Personal Trainer"""
-    clients = db.query(User).filter(
-        User.personal_trainer_id == current_user.id,
-        User.role == UserRole.CLIENT
-    ).all()
+    clients = (await db.scalars(
+        select(User).where(
+            User.personal_trainer_id == current_user.id,
+            User.role == UserRole.CLIENT
+        )
+    )).all()
 
     return clients
 
@@ -336,13 +364,14 @@ async def get_my_clients(
 @router.get("/clients/{client_id}", response_model=UserResponse)
 async def get_client_detail(
     client_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user),
+    _: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get detailed information about a specific client"""
     from app.core.permissions import check_client_belongs_to_trainer
 
-    client = db.query(User).filter(User.id == client_id).first()
+    client = await db.get(User, client_id)
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -359,16 +388,43 @@ async def get_client_detail(
     return response
 
 
+@router.get("/clients/{client_id}/activity-calendar", response_model=ActivityCalendar)
+async def get_client_activity_calendar(
+    client_id: str,
+    request: Request,
+    response: Response,
+    year: int = Depends(calendar_year),
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Year-at-a-glance activity heatmap of a specific client"""
+    from app.core.permissions import check_client_belongs_to_trainer
+
+    client = await db.get(User, client_id)
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Client not found"
+        )
+
+    check_client_belongs_to_trainer(client, current_user)
+
+    calendar = await db.run_sync(lambda sync_db: get_activity_calendar(sync_db, client_id, year))
+    return calendar_response(request, response, calendar)
+
+
 @router.get("/available-clients", response_model=List[ClientListResponse])
 async def get_available_clients(
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all clients without a personal trainer"""
-    available_clients = db.query(User).filter(
-        User.role == UserRole.CLIENT,
-        User.personal_trainer_id.is_(None)
-    ).all()
+    available_clients = (await db.scalars(
+        select(User).where(
+            User.role == UserRole.CLIENT,
+            User.personal_trainer_id.is_(None)
+        )
+    )).all()
 
     return available_clients
 
@@ -376,14 +432,16 @@ async def get_available_clients(
 @router.post("/clients/{client_id}/assign")
 async def assign_client_to_trainer(
     client_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Assign a client to the current personal trainer"""
-    client = db.query(User).filter(
-        User.id == client_id,
-        User.role == UserRole.CLIENT
-    ).first()
+    client = await db.scalar(
+        select(User).where(
+            User.id == client_id,
+            User.role == UserRole.CLIENT
+        )
+    )
 
     if not client:
         raise HTTPException(
@@ -398,7 +456,8 @@ async def assign_client_to_trainer(
         )
 
     client.personal_trainer_id = current_user.id
-    db.commit()
+    await db.run_sync(lambda session: publish_user_change(session, client.id))
+    await db.commit()
 
     return {"message": "Client assigned successfully"}
 
@@ -406,13 +465,13 @@ async def assign_client_to_trainer(
 @router.delete("/clients/{client_id}/unassign")
 async def unassign_client_from_trainer(
     client_id: str,
-    current_user: User = Depends(require_personal_trainer),
-    db: Session = Depends(get_db)
+    current_user: TokenUser = Depends(require_personal_trainer),
+    db: AsyncSession = Depends(get_db)
 ):
     """Remove a client from the current personal trainer"""
     from app.core.permissions import check_client_belongs_to_trainer
 
-    client = db.query(User).filter(User.id == client_id).first()
+    client = await db.get(User, client_id)
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -422,6 +481,7 @@ async def unassign_client_from_trainer(
     check_client_belongs_to_trainer(client, current_user)
 
     client.personal_trainer_id = None
-    db.commit()
+    await db.run_sync(lambda session: publish_user_change(session, client.id))
+    await db.commit()
 
     return {"message": "Client unassigned successfully"}
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
-from app.models.models import User, WorkoutPlan, PlanExercise, Exercise, UserRole, AssignedExercise
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import List, Optional
+from app.db.database import get_db, get_read_db
+from app.db.pagination import page_with_cursor, paginate
+from app.models.models import (
+    User, WorkoutPlan, PlanExercise, Exercise, UserRole, AssignedExercise, UserExerciseLast
+)
 from app.schemas.schemas import (
     WorkoutPlanCreate,
     WorkoutPlanResponse,
@@ -14,11 +19,49 @@ from app.core.security import get_current_user
 router = APIRouter(prefix="/workout-plans", tags=["Workout Plans"])
 
 
+def plan_with_exercises():
+    """
+    Select workout plans with their exercises eagerly loaded for serialization
+    One extra query for all plan exercises of the page, each joined to its exercise
+    """
+    return select(WorkoutPlan).options(
+        selectinload(WorkoutPlan.plan_exercises).joinedload(PlanExercise.exercise)
+    )
+
+
+async def attach_last_weights(db: AsyncSession, plans: List[WorkoutPlan]) -> None:
+    """
+    Set the last performance (weight, sets, reps, date) on every plan exercise
+    Reads the plan owners' rows from user_exercise_last in a single primary-key lookup
+    """
+    user_ids = {plan.user_id for plan in plans}
+    exercise_ids = {pe.exercise_id for plan in plans for pe in plan.plan_exercises}
+    if not exercise_ids:
+        return
+
+    rows = await db.scalars(
+        select(UserExerciseLast).where(
+            UserExerciseLast.user_id.in_(user_ids),
+            UserExerciseLast.exercise_id.in_(exercise_ids)
+        )
+    )
+    last_performance = {(row.user_id, row.exercise_id): row for row in rows}
+
+    for plan in plans:
+        for plan_exercise in plan.plan_exercises:
+            last = last_performance.get((plan.user_id, plan_exercise.exercise_id))
+            if last is not None:
+                plan_exercise.last_weight_used = last.weight_used
+                plan_exercise.last_sets_completed = last.sets_completed
+                plan_exercise.last_reps_completed = last.reps_completed
+                plan_exercise.last_performed_at = last.performed_at
+
+
 @router.post("", response_model=WorkoutPlanResponse, status_code=status.HTTP_201_CREATED)
 async def create_workout_plan(
     plan_data: WorkoutPlanCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new workout plan"""
     # Determine the user_id for the workout plan
@@ -27,10 +70,12 @@ async def create_workout_plan(
     # If client_id is provided and user is a PT, create plan for that client
     if plan_data.client_id and current_user.role == UserRole.PERSONAL_TRAINER:
         # Verify the client belongs to this PT
-        client = db.query(User).filter(
-            User.id == plan_data.client_id,
-            User.personal_trainer_id == current_user.id
-        ).first()
+        client = await db.scalar(
+            select(User).where(
+                User.id == plan_data.client_id,
+                User.personal_trainer_id == current_user.id
+            )
+        )
 
         if not client:
             raise HTTPException(
@@ -48,12 +93,12 @@ async def create_workout_plan(
         is_active=plan_data.is_active
     )
     db.add(new_plan)
-    db.flush()  # Get the ID without committing
+    await db.flush()  # Get the ID without committing
 
     # Add exercises to plan
     for exercise_data in plan_data.exercises:
         # Verify exercise exists
-        exercise = db.query(Exercise).filter(Exercise.id == exercise_data.exercise_id).first()
+        exercise = await db.get(Exercise, exercise_data.exercise_id)
         if not exercise:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -70,10 +115,12 @@ async def create_workout_plan(
                 )
         else:
             # CLIENT can only use exercises assigned to them
-            is_assigned = db.query(AssignedExercise).filter(
-                AssignedExercise.exercise_id == exercise_data.exercise_id,
-                AssignedExercise.client_id == current_user.id
-            ).first()
+            is_assigned = await db.scalar(
+                select(AssignedExercise.id).where(
+                    AssignedExercise.exercise_id == exercise_data.exercise_id,
+                    AssignedExercise.client_id == current_user.id
+                ).limit(1)
+            )
             if not is_assigned:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -91,48 +138,47 @@ async def create_workout_plan(
         )
         db.add(plan_exercise)
 
-    db.commit()
-    db.refresh(new_plan)
+    await db.commit()
 
-    return new_plan
+    return await db.scalar(
+        plan_with_exercises().where(WorkoutPlan.id == new_plan.id).execution_options(populate_existing=True)
+    )
 
 
 @router.get("", response_model=List[WorkoutPlanResponse])
 async def get_workout_plans(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all workout plans for current user"""
-    from app.models.models import ExerciseLog, WorkoutSession
-    from sqlalchemy import desc
-
+    """
+    Get all workout plans for current user, oldest first
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page
+    """
     # Different query based on user role
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT sees all workout plans for their clients
         # Join WorkoutPlan with User to filter by personal_trainer_id
-        plans = db.query(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).filter(
+        query = plan_with_exercises().join(User, WorkoutPlan.user_id == User.id).where(
             User.personal_trainer_id == current_user.id
-        ).offset(skip).limit(limit).all()
+        )
     else:
         # Clients see only their own workout plans
-        plans = db.query(WorkoutPlan).filter(
-            WorkoutPlan.user_id == current_user.id
-        ).offset(skip).limit(limit).all()
+        query = plan_with_exercises().where(WorkoutPlan.user_id == current_user.id)
+
+    sort_key = [WorkoutPlan.created_at, WorkoutPlan.id]
+    plans = page_with_cursor(
+        response,
+        (await db.scalars(paginate(query, sort_key, cursor, skip, limit, descending=False))).all(),
+        sort_key,
+        limit
+    )
 
     # Enrich plan exercises with last weight used
-    for plan in plans:
-        for plan_exercise in plan.plan_exercises:
-            # Get the last exercise log for this exercise by this user
-            last_log = db.query(ExerciseLog).join(WorkoutSession).filter(
-                WorkoutSession.user_id == current_user.id,
-                ExerciseLog.exercise_id == plan_exercise.exercise_id,
-                WorkoutSession.end_time.isnot(None)  # Only completed sessions
-            ).order_by(desc(ExerciseLog.completed_at)).first()
-
-            if last_log and last_log.weight_used is not None:
-                plan_exercise.last_weight_used = last_log.weight_used
+    await attach_last_weights(db, plans)
 
     return plans
 
@@ -141,25 +187,26 @@ async def get_workout_plans(
 async def get_workout_plan(
     plan_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get specific workout plan"""
-    from app.models.models import ExerciseLog, WorkoutSession
-    from sqlalchemy import desc
-
     # Different query based on user role
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT can view workout plans for their clients
-        plan = db.query(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).filter(
-            WorkoutPlan.id == plan_id,
-            User.personal_trainer_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            plan_with_exercises().join(User, WorkoutPlan.user_id == User.id).where(
+                WorkoutPlan.id == plan_id,
+                User.personal_trainer_id == current_user.id
+            )
+        )
     else:
         # Clients can only view their own workout plans
-        plan = db.query(WorkoutPlan).filter(
-            WorkoutPlan.id == plan_id,
-            WorkoutPlan.user_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            plan_with_exercises().where(
+                WorkoutPlan.id == plan_id,
+                WorkoutPlan.user_id == current_user.id
+            )
+        )
 
     if not plan:
         raise HTTPException(
@@ -168,16 +215,7 @@ async def get_workout_plan(
         )
 
     # Enrich plan exercises with last weight used
-    for plan_exercise in plan.plan_exercises:
-        # Get the last exercise log for this exercise by this user
-        last_log = db.query(ExerciseLog).join(WorkoutSession).filter(
-            WorkoutSession.user_id == current_user.id,
-            ExerciseLog.exercise_id == plan_exercise.exercise_id,
-            WorkoutSession.end_time.isnot(None)  # Only completed sessions
-        ).order_by(desc(ExerciseLog.completed_at)).first()
-
-        if last_log and last_log.weight_used is not None:
-            plan_exercise.last_weight_used = last_log.weight_used
+    await attach_last_weights(db, [plan])
 
     return plan
 
@@ -187,22 +225,26 @@ async def update_workout_plan(
     plan_id: str,
     plan_update: WorkoutPlanUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update workout plan"""
     # Different query based on user role
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT can update workout plans for their clients
-        plan = db.query(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).filter(
-            WorkoutPlan.id == plan_id,
-            User.personal_trainer_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            plan_with_exercises().join(User, WorkoutPlan.user_id == User.id).where(
+                WorkoutPlan.id == plan_id,
+                User.personal_trainer_id == current_user.id
+            )
+        )
     else:
         # Clients can only update their own workout plans
-        plan = db.query(WorkoutPlan).filter(
-            WorkoutPlan.id == plan_id,
-            WorkoutPlan.user_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            plan_with_exercises().where(
+                WorkoutPlan.id == plan_id,
+                WorkoutPlan.user_id == current_user.id
+            )
+        )
 
     if not plan:
         raise HTTPException(
@@ -217,32 +259,37 @@ async def update_workout_plan(
     if plan_update.is_active is not None:
         plan.is_active = plan_update.is_active
 
-    db.commit()
-    db.refresh(plan)
+    await db.commit()
 
-    return plan
+    return await db.scalar(
+        plan_with_exercises().where(WorkoutPlan.id == plan_id).execution_options(populate_existing=True)
+    )
 
 
 @router.delete("/{plan_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_workout_plan(
     plan_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete workout plan"""
     # Different query based on user role
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT can delete workout plans for their clients
-        plan = db.query(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).filter(
-            WorkoutPlan.id == plan_id,
-            User.personal_trainer_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            select(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).where(
+                WorkoutPlan.id == plan_id,
+                User.personal_trainer_id == current_user.id
+            )
+        )
     else:
         # Clients can only delete their own workout plans
-        plan = db.query(WorkoutPlan).filter(
-            WorkoutPlan.id == plan_id,
-            WorkoutPlan.user_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            select(WorkoutPlan).where(
+                WorkoutPlan.id == plan_id,
+                WorkoutPlan.user_id == current_user.id
+            )
+        )
 
     if not plan:
         raise HTTPException(
@@ -250,8 +297,8 @@ async def delete_workout_plan(
             detail="Workout plan not found"
         )
 
-    db.delete(plan)
-    db.commit()
+    await db.delete(plan)
+    await db.commit()
 
     return None
 
@@ -261,22 +308,26 @@ async def add_exercise_to_plan(
     plan_id: str,
     exercise_data: PlanExerciseCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add an exercise to workout plan"""
     # Different query based on user role
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT can modify workout plans for their clients
-        plan = db.query(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).filter(
-            WorkoutPlan.id == plan_id,
-            User.personal_trainer_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            plan_with_exercises().join(User, WorkoutPlan.user_id == User.id).where(
+                WorkoutPlan.id == plan_id,
+                User.personal_trainer_id == current_user.id
+            )
+        )
     else:
         # Clients can only modify their own workout plans
-        plan = db.query(WorkoutPlan).filter(
-            WorkoutPlan.id == plan_id,
-            WorkoutPlan.user_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            plan_with_exercises().where(
+                WorkoutPlan.id == plan_id,
+                WorkoutPlan.user_id == current_user.id
+            )
+        )
 
     if not plan:
         raise HTTPException(
@@ -285,7 +336,7 @@ async def add_exercise_to_plan(
         )
 
     # Verify exercise exists
-    exercise = db.query(Exercise).filter(Exercise.id == exercise_data.exercise_id).first()
+    exercise = await db.get(Exercise, exercise_data.exercise_id)
     if not exercise:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -302,10 +353,12 @@ async def add_exercise_to_plan(
             )
     else:
         # CLIENT can only use exercises assigned to them
-        is_assigned = db.query(AssignedExercise).filter(
-            AssignedExercise.exercise_id == exercise_data.exercise_id,
-            AssignedExercise.client_id == current_user.id
-        ).first()
+        is_assigned = await db.scalar(
+            select(AssignedExercise.id).where(
+                AssignedExercise.exercise_id == exercise_data.exercise_id,
+                AssignedExercise.client_id == current_user.id
+            ).limit(1)
+        )
         if not is_assigned:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -323,10 +376,11 @@ async def add_exercise_to_plan(
     )
 
     db.add(plan_exercise)
-    db.commit()
-    db.refresh(plan)
+    await db.commit()
 
-    return plan
+    return await db.scalar(
+        plan_with_exercises().where(WorkoutPlan.id == plan_id).execution_options(populate_existing=True)
+    )
 
 
 @router.delete("/{plan_id}/exercises/{plan_exercise_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -334,22 +388,26 @@ async def remove_exercise_from_plan(
     plan_id: str,
     plan_exercise_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Remove an exercise from workout plan"""
     # Different query based on user role
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT can modify workout plans for their clients
-        plan = db.query(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).filter(
-            WorkoutPlan.id == plan_id,
-            User.personal_trainer_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            select(WorkoutPlan).join(User, WorkoutPlan.user_id == User.id).where(
+                WorkoutPlan.id == plan_id,
+                User.personal_trainer_id == current_user.id
+            )
+        )
     else:
         # Clients can only modify their own workout plans
-        plan = db.query(WorkoutPlan).filter(
-            WorkoutPlan.id == plan_id,
-            WorkoutPlan.user_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            select(WorkoutPlan).where(
+                WorkoutPlan.id == plan_id,
+                WorkoutPlan.user_id == current_user.id
+            )
+        )
 
     if not plan:
         raise HTTPException(
@@ -357,10 +415,12 @@ async def remove_exercise_from_plan(
             detail="Workout plan not found"
         )
 
-    plan_exercise = db.query(PlanExercise).filter(
-        PlanExercise.id == plan_exercise_id,
-        PlanExercise.workout_plan_id == plan_id
-    ).first()
+    plan_exercise = await db.scalar(
+        select(PlanExercise).where(
+            PlanExercise.id == plan_exercise_id,
+            PlanExercise.workout_plan_id == plan_id
+        )
+    )
 
     if not plan_exercise:
         raise HTTPException(
@@ -368,8 +428,8 @@ async def remove_exercise_from_plan(
             detail="Exercise not found in plan"
         )
 
-    db.delete(plan_exercise)
-    db.commit()
+    await db.delete(plan_exercise)
+    await db.commit()
 
     return None
 
@@ -379,11 +439,11 @@ async def update_plan_exercise_weight(
     plan_exercise_id: str,
     weight_data: dict,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update the weight for a specific exercise in a workout plan"""
     # Get the plan exercise
-    plan_exercise = db.query(PlanExercise).filter(PlanExercise.id == plan_exercise_id).first()
+    plan_exercise = await db.get(PlanExercise, plan_exercise_id)
 
     if not plan_exercise:
         raise HTTPException(
@@ -392,7 +452,7 @@ async def update_plan_exercise_weight(
         )
 
     # Get the workout plan to check permissions
-    plan = db.query(WorkoutPlan).filter(WorkoutPlan.id == plan_exercise.workout_plan_id).first()
+    plan = await db.get(WorkoutPlan, plan_exercise.workout_plan_id)
 
     if not plan:
         raise HTTPException(
@@ -403,7 +463,7 @@ async def update_plan_exercise_weight(
     # Check permissions: user must own the plan or be the PT of the plan owner
     if current_user.role == UserRole.PERSONAL_TRAINER:
         # PT must be the trainer of the client who owns this plan
-        client = db.query(User).filter(User.id == plan.user_id).first()
+        client = await db.get(User, plan.user_id)
         if not client or client.personal_trainer_id != current_user.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -419,7 +479,7 @@ async def update_plan_exercise_weight(
 
     # Update the weight
     plan_exercise.weight = weight_data.get('weight', 0)
-    db.commit()
+    await db.commit()
 
     return {"message": "Weight updated successfully", "weight": plan_exercise.weight}
 
@@ -429,11 +489,11 @@ async def update_plan_exercise(
     plan_exercise_id: str,
     exercise_data: dict,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a specific exercise in a workout plan (sets, reps, rest, weight)"""
     # Get the plan exercise
-    plan_exercise = db.query(PlanExercise).filter(PlanExercise.id == plan_exercise_id).first()
+    plan_exercise = await db.get(PlanExercise, plan_exercise_id)
 
     if not plan_exercise:
         raise HTTPException(
@@ -442,7 +502,7 @@ async def update_plan_exercise(
         )
 
     # Get the workout plan to check permissions
-    plan = db.query(WorkoutPlan).filter(WorkoutPlan.id == plan_exercise.workout_plan_id).first()
+    plan = await db.get(WorkoutPlan, plan_exercise.workout_plan_id)
 
     if not plan:
         raise HTTPException(
@@ -452,7 +512,7 @@ async def update_plan_exercise(
 
     # Check permissions: PT must be the trainer of the client who owns this plan
     if current_user.role == UserRole.PERSONAL_TRAINER:
-        client = db.query(User).filter(User.id == plan.user_id).first()
+        client = await db.get(User, plan.user_id)
         if not client or client.personal_trainer_id != current_user.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -478,7 +538,7 @@ async def update_plan_exercise(
     if 'notes' in exercise_data:
         plan_exercise.notes = exercise_data['notes']
 
-    db.commit()
-    db.refresh(plan_exercise)
+    await db.commit()
+    await db.refresh(plan_exercise)
 
     return {"message": "Exercise updated successfully"}
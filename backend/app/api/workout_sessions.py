@@ -1,34 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from typing import List, Optional
 from datetime import datetime
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
+from app.db.pagination import page_with_cursor, paginate
 from app.models.models import User, WorkoutSession, ExerciseLog, Exercise, WorkoutPlan
 from app.schemas.schemas import (
     WorkoutSessionCreate,
     WorkoutSessionResponse,
     WorkoutSessionUpdate,
     ExerciseLogCreate,
+    ExerciseLogBulkCreate,
     ExerciseLogResponse
 )
 from app.core.security import get_current_user
+from app.services.exercise_history_service import record_session_performance, rebuild_last_performance
+from app.services.streak_service import update_user_streak
+from app.services.activity_rollup import refresh_daily_activity, get_session_day
+from app.services.metrics_events import enqueue_metrics_event, schedule_event_processing, SESSION_ENDED
 
 router = APIRouter(prefix="/workout-sessions", tags=["Workout Sessions"])
 
 
+def record_session_changed(sync_db, session_id: str, user_id: str) -> None:
+    """Refresh the per-user data derived from a closed session (last performance, daily rollup)"""
+    record_session_performance(sync_db, session_id)
+    refresh_daily_activity(sync_db, user_id, get_session_day(sync_db, WorkoutSession, session_id))
+
+
+def record_session_closed(sync_db, session_id: str, user_id: str) -> None:
+    """
+    Update the per-user data derived from closed sessions (last performance, daily rollup,
+    streak) and queue the ClientMetrics update, all in the transaction that closes the session
+    """
+    record_session_changed(sync_db, session_id, user_id)
+    update_user_streak(sync_db, user_id)
+    enqueue_metrics_event(sync_db, SESSION_ENDED, session_id, user_id)
+
+
+def record_session_retimed(sync_db, session_id: str, user_id: str) -> None:
+    """Update the per-user data derived from a closed session whose end time was edited"""
+    record_session_changed(sync_db, session_id, user_id)
+    update_user_streak(sync_db, user_id)
+
+
+def record_session_deleted(sync_db, user_id: str, exercise_ids: set, day) -> None:
+    """Update the per-user data derived from a closed session that was deleted"""
+    # Fall back to the previous session for exercises this one was the latest for
+    if exercise_ids:
+        rebuild_last_performance(sync_db, user_id, exercise_ids)
+    refresh_daily_activity(sync_db, user_id, day)
+    update_user_streak(sync_db, user_id)
+
+
+def session_with_logs():
+    """
+    Select workout sessions with their exercise logs eagerly loaded for serialization
+    One extra query for all logs of the page, each joined to its exercise
+    """
+    return select(WorkoutSession).options(
+        selectinload(WorkoutSession.exercise_logs).joinedload(ExerciseLog.exercise)
+    )
+
+
 @router.post("", response_model=WorkoutSessionResponse, status_code=status.HTTP_201_CREATED)
 async def start_workout_session(
     session_data: WorkoutSessionCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Start a new workout session"""
     # Verify workout plan exists if provided
     if session_data.workout_plan_id:
-        plan = db.query(WorkoutPlan).filter(
-            WorkoutPlan.id == session_data.workout_plan_id,
-            WorkoutPlan.user_id == current_user.id
-        ).first()
+        plan = await db.scalar(
+            select(WorkoutPlan).where(
+                WorkoutPlan.id == session_data.workout_plan_id,
+                WorkoutPlan.user_id == current_user.id
+            )
+        )
         if not plan:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -42,41 +93,49 @@ async def start_workout_session(
     )
 
     db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
+    await db.commit()
+    await db.refresh(new_session, attribute_names=["start_time", "exercise_logs"])
 
     return new_session
 
 
 @router.get("", response_model=List[WorkoutSessionResponse])
 async def get_workout_sessions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     active_only: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all workout sessions for current user"""
-    query = db.query(WorkoutSession).filter(WorkoutSession.user_id == current_user.id)
+    """
+    Get all workout sessions for current user, newest first
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page
+    """
+    query = session_with_logs().where(WorkoutSession.user_id == current_user.id)
 
     if active_only:
-        query = query.filter(WorkoutSession.end_time.is_(None))
+        query = query.where(WorkoutSession.end_time.is_(None))
 
-    sessions = query.order_by(WorkoutSession.start_time.desc()).offset(skip).limit(limit).all()
+    sort_key = [WorkoutSession.start_time, WorkoutSession.id]
+    sessions = (await db.scalars(paginate(query, sort_key, cursor, skip, limit))).all()
 
-    return sessions
+    return page_with_cursor(response, sessions, sort_key, limit)
 
 
 @router.get("/active", response_model=Optional[WorkoutSessionResponse])
 async def get_active_session(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current active workout session"""
-    session = db.query(WorkoutSession).filter(
-        WorkoutSession.user_id == current_user.id,
-        WorkoutSession.end_time.is_(None)
-    ).order_by(WorkoutSession.start_time.desc()).first()
+    session = await db.scalar(
+        session_with_logs().where(
+            WorkoutSession.user_id == current_user.id,
+            WorkoutSession.end_time.is_(None)
+        ).order_by(WorkoutSession.start_time.desc()).limit(1)
+    )
 
     return session
 
@@ -85,13 +144,15 @@ async def get_active_session(
 async def get_workout_session(
     session_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get specific workout session"""
-    session = db.query(WorkoutSession).filter(
-        WorkoutSession.id == session_id,
-        WorkoutSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        session_with_logs().where(
+            WorkoutSession.id == session_id,
+            WorkoutSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -106,16 +167,17 @@ async def get_workout_session(
 async def update_workout_session(
     session_id: str,
     session_update: WorkoutSessionUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update workout session (e.g., end session)"""
-    from app.services.metrics_service import update_metrics_after_workout
-
-    session = db.query(WorkoutSession).filter(
-        WorkoutSession.id == session_id,
-        WorkoutSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        session_with_logs().where(
+            WorkoutSession.id == session_id,
+            WorkoutSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -123,22 +185,33 @@ async def update_workout_session(
             detail="Workout session not found"
         )
 
-    # Track if workout is being ended
+    # Track if workout is being ended, or if a closed session is being re-timed
     workout_ended = False
+    workout_retimed = False
     if session_update.end_time is not None and session.end_time is None:
         workout_ended = True
+    elif session_update.end_time is not None and session_update.end_time != session.end_time:
+        workout_retimed = True
 
     if session_update.notes is not None:
         session.notes = session_update.notes
     if session_update.end_time is not None:
         session.end_time = session_update.end_time
 
-    db.commit()
-    db.refresh(session)
+    if workout_ended:
+        await db.flush()
+        await db.run_sync(lambda sync_db: record_session_closed(sync_db, session_id, current_user.id))
+    elif workout_retimed:
+        # The session's minutes changed: recompute its day of the rollup and the streak
+        await db.flush()
+        await db.run_sync(lambda sync_db: record_session_retimed(sync_db, session_id, current_user.id))
+
+    await db.commit()
+    await db.refresh(session, attribute_names=["notes", "end_time"])
 
-    # Update metrics if workout was ended
+    # Apply metrics if workout was ended
     if workout_ended:
-        update_metrics_after_workout(db, session_id)
+        schedule_event_processing(background_tasks)
 
     return session
 
@@ -146,16 +219,17 @@ async def update_workout_session(
 @router.post("/{session_id}/end", response_model=WorkoutSessionResponse)
 async def end_workout_session(
     session_id: str,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """End workout session"""
-    from app.services.metrics_service import update_metrics_after_workout
-
-    session = db.query(WorkoutSession).filter(
-        WorkoutSession.id == session_id,
-        WorkoutSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        session_with_logs().where(
+            WorkoutSession.id == session_id,
+            WorkoutSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -170,11 +244,13 @@ async def end_workout_session(
         )
 
     session.end_time = datetime.now()
-    db.commit()
-    db.refresh(session)
+    await db.flush()
+    await db.run_sync(lambda sync_db: record_session_closed(sync_db, session_id, current_user.id))
+    await db.commit()
+    await db.refresh(session, attribute_names=["end_time"])
 
-    # Update metrics after workout completion
-    update_metrics_after_workout(db, session_id)
+    # Apply metrics after the response is sent
+    schedule_event_processing(background_tasks)
 
     return session
 
@@ -184,14 +260,16 @@ async def log_exercise(
     session_id: str,
     exercise_log: ExerciseLogCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Log an exercise during workout session"""
     # Verify session exists and belongs to user
-    session = db.query(WorkoutSession).filter(
-        WorkoutSession.id == session_id,
-        WorkoutSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        select(WorkoutSession).where(
+            WorkoutSession.id == session_id,
+            WorkoutSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -200,7 +278,7 @@ async def log_exercise(
         )
 
     # Verify exercise exists
-    exercise = db.query(Exercise).filter(Exercise.id == exercise_log.exercise_id).first()
+    exercise = await db.get(Exercise, exercise_log.exercise_id)
     if not exercise:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -210,6 +288,7 @@ async def log_exercise(
     new_log = ExerciseLog(
         session_id=session_id,
         exercise_id=exercise_log.exercise_id,
+        exercise=exercise,
         sets_completed=exercise_log.sets_completed,
         reps_completed=exercise_log.reps_completed,
         weight_used=exercise_log.weight_used,
@@ -218,23 +297,97 @@ async def log_exercise(
     )
 
     db.add(new_log)
-    db.commit()
-    db.refresh(new_log)
+
+    # Logs added to an already closed session still count as the latest performance
+    if session.end_time is not None:
+        await db.flush()
+        await db.run_sync(lambda sync_db: record_session_changed(sync_db, session_id, current_user.id))
+
+    await db.commit()
+    await db.refresh(new_log, attribute_names=["completed_at"])
 
     return new_log
 
 
+@router.post("/{session_id}/exercises/bulk", response_model=WorkoutSessionResponse, status_code=status.HTTP_201_CREATED)
+async def log_exercises_bulk(
+    session_id: str,
+    bulk: ExerciseLogBulkCreate,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Log every exercise of a session in one request, optionally ending the session
+    All exercises are validated with one query and inserted with one multi-row INSERT,
+    in a single transaction: either every log is saved or none is
+    """
+    session = await db.scalar(
+        select(WorkoutSession).where(
+            WorkoutSession.id == session_id,
+            WorkoutSession.user_id == current_user.id
+        )
+    )
+
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workout session not found"
+        )
+
+    if bulk.end_session and session.end_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Session already ended"
+        )
+
+    # Verify all exercises exist
+    exercise_ids = {log.exercise_id for log in bulk.exercise_logs}
+    found_ids = set((await db.scalars(select(Exercise.id).where(Exercise.id.in_(exercise_ids)))).all())
+    if found_ids != exercise_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Exercise not found: {', '.join(sorted(exercise_ids - found_ids))}"
+        )
+
+    # With RETURNING the rows go out as one multi-row INSERT instead of one statement per log
+    await db.scalars(
+        insert(ExerciseLog).returning(ExerciseLog.id),
+        [{"session_id": session_id, **log.model_dump()} for log in bulk.exercise_logs]
+    )
+
+    workout_ended = bulk.end_session
+    if workout_ended:
+        session.end_time = datetime.now()
+        await db.flush()
+        await db.run_sync(lambda sync_db: record_session_closed(sync_db, session_id, current_user.id))
+    elif session.end_time is not None:
+        # Logs added to an already closed session still count as the latest performance
+        await db.run_sync(lambda sync_db: record_session_changed(sync_db, session_id, current_user.id))
+
+    await db.commit()
+
+    if workout_ended:
+        schedule_event_processing(background_tasks)
+
+    return await db.scalar(
+        session_with_logs().where(WorkoutSession.id == session_id).execution_options(populate_existing=True)
+    )
+
+
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_workout_session(
     session_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete workout session"""
-    session = db.query(WorkoutSession).filter(
-        WorkoutSession.id == session_id,
-        WorkoutSession.user_id == current_user.id
-    ).first()
+    session = await db.scalar(
+        session_with_logs().where(
+            WorkoutSession.id == session_id,
+            WorkoutSession.user_id == current_user.id
+        )
+    )
 
     if not session:
         raise HTTPException(
@@ -242,7 +395,17 @@ async def delete_workout_session(
             detail="Workout session not found"
         )
 
-    db.delete(session)
-    db.commit()
+    was_closed = session.end_time is not None
+    exercise_ids = {log.exercise_id for log in session.exercise_logs}
+    if was_closed:
+        day = await db.run_sync(lambda sync_db: get_session_day(sync_db, WorkoutSession, session_id))
+
+    await db.delete(session)
+    await db.flush()
+
+    if was_closed:
+        await db.run_sync(lambda sync_db: record_session_deleted(sync_db, current_user.id, exercise_ids, day))
+
+    await db.commit()
 
     return None
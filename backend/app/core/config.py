@@ -8,10 +8,39 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "postgresql://gymuser:gympass123@db:5432/gymtracker"
 
+    # Database connection pool (per uvicorn worker - size workers x (pool + overflow) below max_connections)
+    DB_POOL_SIZE: int = 5  # Connections kept open in the pool
+    DB_MAX_OVERFLOW: int = 10  # Extra connections allowed above the pool size under load
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a free connection before failing
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced (-1 disables)
+    DB_POOL_PRE_PING: bool = True  # Test connections on checkout to drop stale ones
+    DB_PGBOUNCER_TRANSACTION_MODE: bool = False  # Disable app-side pooling and prepared statement caching behind PgBouncer
+    DB_RAISE_ON_LAZY_LOAD: bool = False  # Relationships raise instead of lazy loading (set in tests to catch N+1 queries)
+    DB_QUERY_STATS_HEADERS: bool = True  # Report per-request SQL statement count and time in X-DB-Query-Count / Server-Timing headers
+    SLOW_QUERY_MS: int = 500  # Statements slower than this are logged as JSON with their EXPLAIN plan (0 disables)
+    SLOW_QUERY_EXPLAIN: bool = True  # Capture the plan of slow statements (PostgreSQL, explained on the primary in a background thread)
+    SLOW_QUERY_WINDOW_MINUTES: int = 60  # Window of the statement leaderboard served by /api/internal/slow-queries
+
+    # Read replica (optional) - history and analytics GET endpoints read from it when set
+    DATABASE_REPLICA_URL: Optional[str] = None
+    READ_YOUR_WRITES_SECONDS: int = 5  # After a user writes, their reads stay on the primary for this long
+
+    # Metrics events (ClientMetrics updates are applied outside the request)
+    METRICS_EXTERNAL_WORKER: bool = False  # True when metrics_worker.py drains the queue; otherwise the API does it after responding
+    METRICS_WORKER_POLL_SECONDS: int = 5  # How often metrics_worker.py checks for new events
+    METRICS_EVENT_MAX_ATTEMPTS: int = 5  # Failed events are retried this many times, then left for inspection
+    METRICS_EVENT_RETENTION_DAYS: int = 30  # Processed events are deleted after this many days (0 keeps them)
+    TRAINER_SUMMARY_CACHE_SECONDS: int = 300  # Trainer dashboard summary cache lifetime (0 disables the cache)
+
+    # Authenticated user cache (per worker, invalidated across workers with LISTEN/NOTIFY on PostgreSQL)
+    USER_CACHE_SECONDS: int = 30  # How long get_current_user reuses a user's row (0 disables the cache)
+    USER_CACHE_MAX_ENTRIES: int = 10000
+
     # JWT
     SECRET_KEY: str = "your-secret-key-change-this-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30  # Unused refresh tokens expire; every refresh starts the period again
 
     # Application
     ENVIRONMENT: str = "development"
@@ -31,8 +60,19 @@ class Settings(BaseSettings):
     FRONTEND_URL: str = "http://localhost:8080"  # Frontend URL for reset links
 
     # Security
+    BCRYPT_ROUNDS: int = 12  # Password hash cost; existing hashes are upgraded on the next successful login
+    BCRYPT_MAX_CONCURRENCY: int = 4  # Password hashes computed in parallel per worker (threads, off the event loop)
+    BCRYPT_MAX_QUEUE: int = 64  # Logins waiting for a hashing thread before new ones get 503
     MAX_LOGIN_ATTEMPTS: int = 5  # Maximum failed login attempts before lockout
     LOGIN_LOCKOUT_MINUTES: int = 15  # Lockout duration in minutes
+    LOGIN_IP_MAX_ATTEMPTS: int = 50  # Failed logins from one IP address (any account) before it is locked out too (0 disables)
+    FORWARDED_ALLOW_IPS: str = "127.0.0.1"  # Proxies trusted for X-Forwarded-For (read by uvicorn too); comma separated
+    LOGIN_LIMITER_PATH: str = ""  # SQLite file holding the failure counters shared by the workers of a host (empty: /dev/shm)
+    LOGIN_AUDIT_FLUSH_SECONDS: float = 2.0  # How often queued login_attempts rows are written
+    LOGIN_AUDIT_BATCH_SIZE: int = 500  # Rows per INSERT
+    LOGIN_AUDIT_MAX_PENDING: int = 10000  # Queued rows per worker before the oldest are dropped
+    LOGIN_ATTEMPT_RETENTION_DAYS: int = 90  # login_attempts rows are deleted after this many days (0 keeps them)
+    INTERNAL_API_TOKEN: Optional[str] = None  # Token for /api/internal endpoints (X-Internal-Token header); unset disables them
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,90 @@
+"""
+Bounded thread pool for password hashing
+bcrypt burns a few hundred milliseconds of CPU per call; running it on the event loop froze the
+whole worker during login bursts. bcrypt releases the GIL, so a small thread pool hashes in
+parallel while the loop keeps serving requests, and the queue bound sheds load beyond that.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+
+
+class HashingPool:
+    """Runs hashing functions on at most max_workers threads with at most max_queue calls waiting"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queued = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    async def run(self, function, *args):
+        """Run function(*args) on the pool; 503 when too many calls are already waiting"""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server busy, please try again",
+                    headers={"Retry-After": "1"}
+                )
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        submitted = time.perf_counter()
+        # Guarded by the lock: whether a thread took the call, or its caller gave up waiting first
+        started = False
+        abandoned = False
+
+        def task():
+            nonlocal started
+            started_at = time.perf_counter()
+            with self._lock:
+                if abandoned:
+                    return None
+                started = True
+                self.queued -= 1
+                self.running += 1
+                self.total_wait_seconds += started_at - submitted
+                self.max_wait_seconds = max(self.max_wait_seconds, started_at - submitted)
+            try:
+                return function(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.total_run_seconds += time.perf_counter() - started_at
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            # A call cancelled while waiting (client disconnected) leaves the queue and is never run
+            with self._lock:
+                if not started:
+                    abandoned = True
+                    self.queued -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "average_wait_ms": round(self.total_wait_seconds * 1000 / self.completed, 2) if self.completed else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "average_hash_ms": round(self.total_run_seconds * 1000 / self.completed, 2) if self.completed else 0.0
+            }
@@ -0,0 +1,244 @@
+"""
+Login rate limiting and login attempt audit
+Failed logins are counted in a sliding window per identifier and per client IP address, held in
+a small SQLite file on memory-backed local storage (/dev/shm) that every worker of the host
+shares. The lockout check no longer counts rows of login_attempts, so login latency does not
+grow with that table. login_attempts stays the audit trail: rows are queued in memory and
+written in batches by a background task (write-behind), outside the login request.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from fastapi import Request
+from sqlalchemy import delete, insert
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.models import LoginAttempt
+
+logger = logging.getLogger("gymtracker.login_attempts")
+
+
+def default_limiter_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "gymtracker-login-limiter.sqlite3")
+
+
+class SlidingWindowLimiter:
+    """
+    Timestamps of the failures of each key within the last window_seconds
+    A key is locked once it holds its limit of failures; only the newest limit timestamps
+    can matter, so no key ever stores more. Stored in an SQLite file shared between processes
+    (":memory:" keeps it per process). The sqlite3 calls block (BEGIN IMMEDIATE waits up to the
+    busy timeout for another worker), so they run on the limiter's own thread, one at a time,
+    and the event loop only awaits them.
+    """
+
+    def __init__(self, path: str, window_seconds: float):
+        self.path = path
+        self.window_seconds = window_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process: workers forked after import must not share it
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            if self.path != ":memory:":
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")  # Losing the counters on a crash is harmless
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS login_failures ("
+                "key TEXT PRIMARY KEY, failures TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _recent(self, failures_json: Optional[str], now: float) -> List[float]:
+        if failures_json is None:
+            return []
+        return [at for at in json.loads(failures_json) if at > now - self.window_seconds]
+
+    async def _run(self, function, *args):
+        # Like the connection, the thread does not survive a fork
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="login-limiter")
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _failures(self, keys: tuple) -> Dict[str, int]:
+        now = time.time()
+        rows = dict(self._connect().execute(
+            f"SELECT key, failures FROM login_failures WHERE key IN ({', '.join('?' * len(keys))})", keys
+        ).fetchall())
+        return {key: len(self._recent(rows.get(key), now)) for key in keys}
+
+    def _record_failure(self, limits: Dict[str, int]) -> None:
+        now = time.time()
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for key, limit in limits.items():
+                row = connection.execute("SELECT failures FROM login_failures WHERE key = ?", (key,)).fetchone()
+                failures = (self._recent(row[0] if row else None, now) + [now])[-limit:]
+                connection.execute(
+                    "INSERT INTO login_failures (key, failures, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET failures = excluded.failures, updated_at = excluded.updated_at",
+                    (key, json.dumps(failures), now)
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _prune(self) -> None:
+        self._connect().execute("DELETE FROM login_failures WHERE updated_at <= ?", (time.time() - self.window_seconds,))
+
+    async def failures(self, *keys: str) -> Dict[str, int]:
+        """Failures of each key within the window"""
+        return await self._run(self._failures, keys)
+
+    async def record_failure(self, limits: Dict[str, int]) -> None:
+        """Add a failure to each key, keeping at most its limit of timestamps"""
+        await self._run(self._record_failure, limits)
+
+    async def prune(self) -> None:
+        """Forget keys without a failure in the window"""
+        await self._run(self._prune)
+
+
+class LoginAuditWriter:
+    """
+    Write-behind queue of login_attempts rows
+    Rows are inserted in batches every LOGIN_AUDIT_FLUSH_SECONDS; at most max_pending rows wait,
+    the oldest are dropped beyond that (e.g. while the database is unreachable)
+    """
+
+    # A batch the database keeps refusing is dropped after this many tries
+    MAX_BATCH_ATTEMPTS = 3
+
+    def __init__(self, batch_size: int, max_pending: int):
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: deque = deque()
+        self._failed_attempts = 0
+        self._overflowing = False
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def add(self, row: dict) -> None:
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+            if not self._overflowing:
+                self._overflowing = True
+                logger.error("Login audit queue full (%d rows): dropping the oldest rows", self.max_pending)
+        self._pending.append(row)
+
+    async def flush(self) -> int:
+        """Insert the queued rows; returns how many were written"""
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(LoginAttempt.__table__), batch)
+                    await db.commit()
+            except asyncio.CancelledError:
+                self._pending.extendleft(reversed(batch))
+                raise
+            except Exception as e:
+                self.failed_flushes += 1
+                self._failed_attempts += 1
+                logger.warning(
+                    "Login audit flush failed (attempt %d of %d): %s", self._failed_attempts, self.MAX_BATCH_ATTEMPTS, e
+                )
+                if self._failed_attempts >= self.MAX_BATCH_ATTEMPTS:
+                    self._failed_attempts = 0
+                    self.dropped += len(batch)
+                    logger.error("Dropped %d login audit rows the database kept refusing", len(batch))
+                else:
+                    self._pending.extendleft(reversed(batch))
+                break
+
+            self._failed_attempts = 0
+            self._overflowing = False
+            written += len(batch)
+            self.written += len(batch)
+        return written
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes
+        }
+
+
+login_limiter = SlidingWindowLimiter(
+    settings.LOGIN_LIMITER_PATH or default_limiter_path(), settings.LOGIN_LOCKOUT_MINUTES * 60
+)
+login_audit = LoginAuditWriter(settings.LOGIN_AUDIT_BATCH_SIZE, settings.LOGIN_AUDIT_MAX_PENDING)
+
+
+def login_client_ip(request: Request) -> Optional[str]:
+    """
+    Address of the client logging in, None when it is not known
+    Behind nginx, uvicorn (--proxy-headers) replaces the connection's address with the client's
+    from X-Forwarded-For, trusting the header only from FORWARDED_ALLOW_IPS. An address that is
+    still a trusted proxy's is not the client's: limiting it would lock out every user at once.
+    """
+    host = request.client.host if request.client else None
+    if host in {address.strip() for address in settings.FORWARDED_ALLOW_IPS.split(",")}:
+        return None
+    return host
+
+
+def limiter_keys(identifier: str, ip_address: Optional[str]) -> Dict[str, int]:
+    """Limiter keys of a login and the failures each allows"""
+    keys = {f"identifier:{identifier}": settings.MAX_LOGIN_ATTEMPTS}
+    if ip_address and settings.LOGIN_IP_MAX_ATTEMPTS > 0:
+        keys[f"ip:{ip_address}"] = settings.LOGIN_IP_MAX_ATTEMPTS
+    return keys
+
+
+async def purge_login_attempts() -> None:
+    """Delete audit rows older than LOGIN_ATTEMPT_RETENTION_DAYS (0 keeps them forever)"""
+    if settings.LOGIN_ATTEMPT_RETENTION_DAYS <= 0:
+        return
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.LOGIN_ATTEMPT_RETENTION_DAYS)
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(LoginAttempt).where(LoginAttempt.attempted_at < cutoff))
+        await db.commit()
+
+
+async def run_login_audit_writer() -> None:
+    """Background task: flush queued audit rows, and hourly prune the limiter and old audit rows"""
+    last_cleanup = 0.0
+    while True:
+        try:
+            await asyncio.sleep(settings.LOGIN_AUDIT_FLUSH_SECONDS)
+            await login_audit.flush()
+            if time.monotonic() - last_cleanup >= 3600:
+                last_cleanup = time.monotonic()
+                await login_limiter.prune()
+                await purge_login_attempts()
+        except asyncio.CancelledError:
+            # Write what is still queued before the worker exits
+            await login_audit.flush()
+            raise
+        except Exception:
+            logger.exception("Login audit writer error")
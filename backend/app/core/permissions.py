@@ -1,13 +1,16 @@
 """
 Role-based access control utilities
 """
-from fastapi import HTTPException, status, Depends
+import secrets
+from typing import Optional
+from fastapi import HTTPException, status, Depends, Header
+from app.core.config import settings
 from app.models.models import User, UserRole
-from app.core.security import get_current_user
+from app.core.security import TokenUser, get_token_user
 
 
-async def require_personal_trainer(current_user: User = Depends(get_current_user)) -> User:
-    """Ensure the current user is a personal trainer"""
+async def require_personal_trainer(current_user: TokenUser = Depends(get_token_user)) -> TokenUser:
+    """Ensure the current user is a personal trainer (from the token claims, no user lookup)"""
     if current_user.role != UserRole.PERSONAL_TRAINER:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -16,8 +19,8 @@ async def require_personal_trainer(current_user: User = Depends(get_current_user
     return current_user
 
 
-async def require_client(current_user: User = Depends(get_current_user)) -> User:
-    """Ensure the current user is a client"""
+async def require_client(current_user: TokenUser = Depends(get_token_user)) -> TokenUser:
+    """Ensure the current user is a client (from the token claims, no user lookup)"""
     if current_user.role != UserRole.CLIENT:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -26,7 +29,7 @@ async def require_client(current_user: User = Depends(get_current_user)) -> User
     return current_user
 
 
-def check_client_belongs_to_trainer(client: User, trainer: User):
+def check_client_belongs_to_trainer(client: User, trainer: TokenUser):
     """Verify that a client belongs to the specified trainer"""
     if client.personal_trainer_id != trainer.id:
         raise HTTPException(
@@ -34,3 +37,18 @@ def check_client_belongs_to_trainer(client: User, trainer: User):
             detail="This client is not assigned to you"
         )
     return True
+
+
+async def require_internal_access(x_internal_token: Optional[str] = Header(None)) -> None:
+    """Gate operational endpoints behind the INTERNAL_API_TOKEN shared secret"""
+    if not settings.INTERNAL_API_TOKEN:
+        # Internal endpoints are disabled unless a token is configured
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    if not x_internal_token or not secrets.compare_digest(x_internal_token, settings.INTERNAL_API_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid internal access token"
+        )
@@ -0,0 +1,161 @@
+"""
+Refresh tokens
+Login returns a short-lived access token (JWT) and a long-lived opaque refresh token. When the
+access token expires, the client trades the refresh token at /auth/refresh for a new pair: an
+indexed lookup by the token's hash instead of a bcrypt password check.
+Each refresh token is single use. A token presented again after it was rotated has leaked (or
+was replayed), so every token of that sign-in (its family) is revoked and the device must log in.
+"""
+
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.types import new_id
+from app.models.models import RefreshToken
+
+# A rotated token presented again this soon is a race (two tabs refreshing at once), not a replay
+ROTATION_GRACE = timedelta(seconds=30)
+
+# Rotated tokens are kept this long to detect their reuse, then deleted
+ROTATED_TOKEN_RETENTION = timedelta(days=1)
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _add_refresh_token(db: AsyncSession, user_id: str, family_id: str, device_name: Optional[str], token_id: Optional[str] = None) -> str:
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        id=token_id or new_id(),
+        user_id=user_id,
+        family_id=family_id,
+        token_hash=hash_refresh_token(token),
+        device_name=device_name[:200] if device_name else None,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+async def issue_refresh_token(db: AsyncSession, user_id: str, device_name: Optional[str] = None) -> str:
+    """
+    Refresh token for a new sign-in of a user; returns the token, only its hash is stored
+    Also drops the user's expired tokens. Does not commit.
+    """
+    await db.execute(
+        delete(RefreshToken).where(
+            RefreshToken.user_id == user_id,
+            RefreshToken.expires_at < datetime.now(timezone.utc)
+        ).execution_options(synchronize_session=False)
+    )
+    return _add_refresh_token(db, user_id, new_id(), device_name)
+
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Tuple[str, str]:
+    """
+    Revoke a live refresh token and issue its replacement in the same family
+    Returns (user_id, new token); 401 if the token is unknown, expired or revoked.
+    Commits the family revocation when a rotated token is reused, otherwise does not commit.
+    """
+    now = datetime.now(timezone.utc)
+    token_hash = hash_refresh_token(token)
+    replacement_id = new_id()
+
+    # Conditional update: of two concurrent refreshes with the same token only one wins
+    current = (await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > now
+        )
+        .values(revoked_at=now, replaced_by_id=replacement_id)
+        .returning(RefreshToken.user_id, RefreshToken.family_id, RefreshToken.device_name)
+        .execution_options(synchronize_session=False)
+    )).first()
+
+    if current is None:
+        reused_family_id = await db.scalar(
+            select(RefreshToken.family_id).where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.replaced_by_id.is_not(None),
+                RefreshToken.revoked_at < now - ROTATION_GRACE
+            )
+        )
+        if reused_family_id is not None:
+            await revoke_refresh_family(db, reused_family_id)
+            await db.commit()
+        raise invalid_refresh_token()
+
+    await db.execute(
+        delete(RefreshToken).where(
+            RefreshToken.family_id == current.family_id,
+            RefreshToken.revoked_at < now - ROTATED_TOKEN_RETENTION
+        ).execution_options(synchronize_session=False)
+    )
+    new_token = _add_refresh_token(db, current.user_id, current.family_id, current.device_name, replacement_id)
+    return current.user_id, new_token
+
+
+async def revoke_refresh_family(db: AsyncSession, family_id: str, user_id: Optional[str] = None) -> int:
+    """Sign one device out: revoke the live tokens of a sign-in family. Does not commit."""
+    query = update(RefreshToken).where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+    if user_id is not None:
+        query = query.where(RefreshToken.user_id == user_id)
+    result = await db.execute(
+        query.values(revoked_at=datetime.now(timezone.utc)).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def revoke_refresh_token(db: AsyncSession, token: str) -> int:
+    """
+    Sign out the device holding a live refresh token (its whole family). Does not commit.
+    An already rotated token revokes nothing: it may come from a tab that lost a refresh race,
+    and revoking the family would sign out the tab holding the replacement too.
+    """
+    family_id = select(RefreshToken.family_id).where(
+        RefreshToken.token_hash == hash_refresh_token(token),
+        RefreshToken.revoked_at.is_(None)
+    ).scalar_subquery()
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def revoke_user_refresh_tokens(db: AsyncSession, user_id: str) -> None:
+    """Sign a user out of every device (password change or reset). Does not commit."""
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def active_refresh_tokens(db: AsyncSession, user_id: str) -> List[RefreshToken]:
+    """Live token of each device a user is signed in on, most recently refreshed first"""
+    return list((await db.scalars(
+        select(RefreshToken).where(
+            RefreshToken.user_id == user_id,
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > datetime.now(timezone.utc)
+        ).order_by(RefreshToken.created_at.desc())
+    )).all())
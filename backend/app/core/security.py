@@ -1,16 +1,23 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
+from app.core.hashing import HashingPool
+from app.core.login_attempts import login_limiter, login_audit, limiter_keys
+from app.core.user_cache import user_cache, token_epoch_cache, user_snapshot, user_from_snapshot
 from app.db.database import get_db
-from app.models.models import User
+from app.models.models import User, UserRole
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# bcrypt runs here, off the event loop (see app/core/hashing.py)
+hashing_pool = HashingPool(settings.BCRYPT_MAX_CONCURRENCY, settings.BCRYPT_MAX_QUEUE)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -21,11 +28,29 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     # Bcrypt has a maximum password length of 72 bytes
     password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when a hash was made with a different cost than BCRYPT_ROUNDS ($2b$<cost>$...)"""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the hashing pool, for request handlers"""
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the hashing pool, for request handlers"""
+    return await hashing_pool.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -38,40 +63,123 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def decode_access_token(token: str) -> Optional[str]:
-    """Decode JWT token and return user_id"""
+def create_user_access_token(user: User) -> str:
+    """
+    Access token for a user, with the claims permission checks need: the role and the
+    user's token epoch (bumped to revoke every issued token)
+    """
+    return create_access_token(data={
+        "sub": user.id,
+        "role": UserRole(user.role).value,
+        "epoch": user.token_epoch or 0
+    })
+
+
+def decode_access_token_claims(token: str) -> Optional[dict]:
+    """Verified claims of a JWT token, None if invalid or expired"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        return user_id
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
-    credentials_exception = HTTPException(
+def decode_access_token(token: str) -> Optional[str]:
+    """Decode JWT token and return user_id"""
+    claims = decode_access_token_claims(token)
+    return claims["sub"] if claims else None
+
+
+class TokenUser:
+    """
+    Caller identity read from the access token claims, without loading the user row
+    Only the id and role, which never change; anything else is read from the user row
+    """
+
+    def __init__(self, id: str, role: UserRole):
+        self.id = id
+        self.role = role
+
+    @classmethod
+    def from_user(cls, user: User) -> "TokenUser":
+        return cls(user.id, UserRole(user.role))
+
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    user_id = decode_access_token(token)
-    if user_id is None:
-        raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
+async def get_token_epoch(db: AsyncSession, user_id: str) -> Optional[int]:
+    """Current token epoch of a user (None if the user no longer exists), cached like the user"""
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot["token_epoch"]
+
+    epoch = token_epoch_cache.get(user_id)
+    if epoch is None:
+        epoch = await db.scalar(select(User.token_epoch).where(User.id == user_id))
+        if epoch is not None:
+            token_epoch_cache.set(user_id, epoch)
+    return epoch
+
 
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """
+    Get current authenticated user
+    Served from the user cache when possible; the snapshot is merged into the request's
+    session without a query, so handlers can still modify and commit the user
+    """
+    claims = decode_access_token_claims(token)
+    if claims is None:
+        raise credentials_exception()
+    user_id = claims["sub"]
+
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        if snapshot["token_epoch"] != claims.get("epoch", 0):
+            raise credentials_exception()
+        return await db.merge(user_from_snapshot(snapshot), load=False)
+
+    user = await db.get(User, user_id)
+    if user is None or user.token_epoch != claims.get("epoch", 0):
+        raise credentials_exception()
+
+    user_cache.set(user_id, user_snapshot(user))
     return user
 
 
+async def get_token_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> TokenUser:
+    """
+    Get the authenticated caller from the token claims, for role-gated endpoints
+    Only the token epoch is checked against the database, through the cache
+    """
+    claims = decode_access_token_claims(token)
+    if claims is None:
+        raise credentials_exception()
+
+    # Tokens issued before role claims existed
+    if "role" not in claims:
+        return TokenUser.from_user(await get_current_user(token, db))
+
+    epoch = await get_token_epoch(db, claims["sub"])
+    if epoch is None or epoch != claims.get("epoch", 0):
+        raise credentials_exception()
+
+    return TokenUser(claims["sub"], UserRole(claims["role"]))
+
+
 def validate_password_strength(password: str) -> bool:
     """Validate password meets minimum requirements"""
     if len(password) < 8:
@@ -79,39 +187,31 @@ def validate_password_strength(password: str) -> bool:
     return True
 
 
-def check_login_attempts(db, identifier: str) -> tuple[bool, int]:
+async def check_login_attempts(identifier: str, ip_address: Optional[str] = None) -> tuple[bool, int]:
     """
-    Check if user has exceeded maximum login attempts
+    Check if the identifier (or the client IP address) has exceeded the failed login attempts
+    Counted in memory by the shared login limiter, not over the login_attempts table
     Returns: (is_locked, attempts_remaining)
     """
-    from app.models.models import LoginAttempt
-    from datetime import datetime, timedelta, timezone
-
-    lockout_window = datetime.now(timezone.utc) - timedelta(minutes=settings.LOGIN_LOCKOUT_MINUTES)
-
-    # Count failed attempts within lockout window
-    failed_attempts = db.query(LoginAttempt).filter(
-        LoginAttempt.identifier == identifier,
-        LoginAttempt.success == False,
-        LoginAttempt.attempted_at >= lockout_window
-    ).count()
+    keys = limiter_keys(identifier, ip_address)
+    failures = await login_limiter.failures(*keys)
+    attempts_remaining = min(max(0, limit - failures[key]) for key, limit in keys.items())
 
-    is_locked = failed_attempts >= settings.MAX_LOGIN_ATTEMPTS
-    attempts_remaining = max(0, settings.MAX_LOGIN_ATTEMPTS - failed_attempts)
+    return attempts_remaining == 0, attempts_remaining
 
-    return is_locked, attempts_remaining
 
-
-def record_login_attempt(db, identifier: str, success: bool, user_id: str = None, ip_address: str = None) -> None:
-    """Record a login attempt for security tracking"""
-    from app.models.models import LoginAttempt
-
-    attempt = LoginAttempt(
-        identifier=identifier,
-        success=success,
-        user_id=user_id,
-        ip_address=ip_address
-    )
-
-    db.add(attempt)
-    db.commit()
+async def record_login_attempt(identifier: str, success: bool, user_id: str = None, ip_address: str = None) -> None:
+    """
+    Record a login attempt: failures count towards the lockout right away, the audit row
+    is queued and written to login_attempts in the background
+    """
+    if not success:
+        await login_limiter.record_failure(limiter_keys(identifier, ip_address))
+
+    login_audit.add({
+        "identifier": identifier,
+        "success": success,
+        "user_id": user_id,
+        "ip_address": ip_address,
+        "attempted_at": datetime.now(timezone.utc)
+    })
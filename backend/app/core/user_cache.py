@@ -0,0 +1,101 @@
+"""
+Authenticated user cache
+get_current_user keeps a snapshot of each user's row for USER_CACHE_SECONDS instead of
+loading it on every request. Writers call publish_user_change() in the transaction that
+changes a user: it drops the local entry and, on PostgreSQL, sends a NOTIFY that every
+worker's listen_for_user_changes() task receives once the transaction commits.
+"""
+
+import asyncio
+from typing import List, Optional
+from sqlalchemy import inspect, select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import make_transient_to_detached
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import User
+
+USER_CHANGED_CHANNEL = "user_changed"
+
+user_cache = TTLCache(settings.USER_CACHE_SECONDS, max_entries=settings.USER_CACHE_MAX_ENTRIES)
+
+# user id -> token_epoch, for role-gated requests that never load the full user
+token_epoch_cache = TTLCache(settings.USER_CACHE_SECONDS, max_entries=settings.USER_CACHE_MAX_ENTRIES)
+
+# Other per-worker caches keyed by user id, dropped together with the user (e.g. trainer summaries)
+_dependent_caches: List[TTLCache] = []
+
+
+def register_user_keyed_cache(cache: TTLCache) -> None:
+    """Drop entries of cache whenever publish_user_change() is called for their user id"""
+    _dependent_caches.append(cache)
+
+
+def user_snapshot(user: User) -> dict:
+    """Column values of a loaded user"""
+    return {attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs}
+
+
+def user_from_snapshot(snapshot: dict) -> User:
+    """Detached User rebuilt from a snapshot, ready for session.merge(load=False) without a query"""
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def forget_user(user_id: str) -> None:
+    for cache in (user_cache, token_epoch_cache, *_dependent_caches):
+        cache.invalidate(user_id)
+
+
+def clear_user_caches() -> None:
+    for cache in (user_cache, token_epoch_cache, *_dependent_caches):
+        cache.clear()
+
+
+def publish_user_change(db, *user_ids: Optional[str]) -> None:
+    """
+    Drop cached snapshots of users changed in the current transaction, in every worker
+    Takes a sync Session (use db.run_sync from the API); the NOTIFY is delivered on commit
+    """
+    notify = db.get_bind().dialect.name == "postgresql"
+    for user_id in user_ids:
+        if not user_id:
+            continue
+        forget_user(user_id)
+        if notify:
+            db.execute(select(func.pg_notify(USER_CHANGED_CHANNEL, user_id)))
+
+
+async def listen_for_user_changes() -> None:
+    """
+    Background task: LISTEN for user changes made by any worker and drop them from the cache
+    Reconnects on connection loss; the cache is cleared then, as notifications may have been missed
+    """
+    url = make_url(settings.DATABASE_URL)
+    if url.get_backend_name() != "postgresql" or settings.USER_CACHE_SECONDS <= 0:
+        return
+
+    import asyncpg
+
+    dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(
+                USER_CHANGED_CHANNEL, lambda _connection, _pid, _channel, user_id: forget_user(user_id)
+            )
+            clear_user_caches()
+            await lost.wait()
+        except asyncio.CancelledError:
+            if connection is not None:
+                await connection.close()
+            raise
+        except Exception as e:
+            print(f"User cache listener error: {e}")
+
+        clear_user_caches()
+        await asyncio.sleep(5)
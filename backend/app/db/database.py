@@ -1,23 +1,130 @@
-from sqlalchemy import create_engine
+import uuid
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.core.config import settings
+from app.db.pool import TimedQueuePool, TimedAsyncQueuePool
 
-engine = create_engine(settings.DATABASE_URL)
+
+def get_async_database_url(url: str) -> str:
+    """
+    Translate a sync SQLAlchemy URL into its async driver equivalent
+    postgresql:// -> postgresql+asyncpg://, sqlite:// -> sqlite+aiosqlite://
+    """
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+def get_engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Connection pool options for an engine, taken from the DB_POOL_* settings
+    SQLite keeps the dialect's default pool; PgBouncer transaction mode hands pooling to PgBouncer
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+    if settings.DB_PGBOUNCER_TRANSACTION_MODE:
+        # PgBouncer reassigns server connections per transaction: no app-side pool and
+        # no named prepared statements that could collide on a shared server connection
+        options["poolclass"] = NullPool
+        if is_async:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            }
+        return options
+
+    options.update({
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    })
+    return options
+
+
+# Sync engine - used by admin scripts, migrations and init_db
+engine = create_engine(settings.DATABASE_URL, **get_engine_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine - used by the API so queries never block the event loop
+ASYNC_DATABASE_URL = get_async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **get_engine_options(ASYNC_DATABASE_URL, is_async=True))
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Replica engine - optional, serves read-only history and analytics endpoints
+replica_engine = None
+ReplicaSessionLocal = None
+if settings.DATABASE_REPLICA_URL:
+    ASYNC_REPLICA_URL = get_async_database_url(settings.DATABASE_REPLICA_URL)
+    replica_engine = create_async_engine(ASYNC_REPLICA_URL, **get_engine_options(ASYNC_REPLICA_URL, is_async=True))
+    ReplicaSessionLocal = async_sessionmaker(
+        bind=replica_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
 Base = declarative_base()
 
 
-def get_db():
+async def get_db():
     """Database dependency for FastAPI"""
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Read-only database dependency for GET endpoints
+    Uses the replica when configured, unless the user wrote recently (read-your-writes),
+    in which case the request's primary session is reused
+    """
+    if ReplicaSessionLocal is None or getattr(request.state, "read_from_primary", False):
+        yield db
+        return
+
+    async with ReplicaSessionLocal() as read_db:
+        yield read_db
+
+
+def dialect_insert(db, table):
+    """
+    INSERT construct with ON CONFLICT support (PostgreSQL, or SQLite in development)
+    Works with both sync Sessions and AsyncSessions
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(table)
 
 
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+
+
+def has_schema() -> bool:
+    """Whether the database already holds the application's tables (an existing install)"""
+    return inspect(engine).has_table("users")
@@ -0,0 +1,32 @@
+"""
+Dialect-aware SQL expressions for date arithmetic
+PostgreSQL in production, SQLite in development
+"""
+
+from sqlalchemy import func, cast, type_coerce, literal_column, Date, Float
+
+
+def _is_sqlite(db) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def activity_day(db, column):
+    """Calendar day of a timestamp column as a DATE expression"""
+    if _is_sqlite(db):
+        return type_coerce(func.date(column), Date)
+    return cast(column, Date)
+
+
+def day_number(db, day):
+    """Integer day number of a DATE expression - consecutive days differ by exactly 1"""
+    if _is_sqlite(db):
+        return func.julianday(day)
+    return day - literal_column("DATE '1970-01-01'", Date)
+
+
+def duration_seconds(db, start, end):
+    """Seconds between two timestamp expressions"""
+    if _is_sqlite(db):
+        return (func.julianday(end) - func.julianday(start)) * 86400
+    # EXTRACT returns numeric (Decimal) on PostgreSQL 14+
+    return cast(func.extract("epoch", end - start), Float)
@@ -0,0 +1,99 @@
+"""
+Keyset (cursor) pagination for list endpoints
+A page starts right after the last row of the previous page, found through the sort key
+index, so every page costs the same however deep the client has scrolled (unlike OFFSET)
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, String, bindparam, tuple_
+from sqlalchemy.types import TypeDecorator
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class CursorDateTime(TypeDecorator):
+    """
+    DateTime bound against a stored sort key
+    SQLite keeps timestamps as text and server_default=now() writes them without fractional
+    seconds, so a whole-second value must bind in that same form to compare equal to its row.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(DateTime(timezone=self.impl.timezone))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S")
+
+
+def cursor_param(column, value):
+    """Bind parameter for a cursor value compared with column"""
+    if isinstance(column.type, DateTime):
+        return bindparam(None, value, type_=CursorDateTime(timezone=column.type.timezone))
+    return bindparam(None, value, type_=column.type)
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Opaque cursor from the sort key values of a row"""
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_columns: Sequence) -> list:
+    """Sort key values from a cursor, 400 if it was not produced by encode_cursor for these columns"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(key_columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(key_columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def paginate(query, key_columns: Sequence, cursor: Optional[str], skip: int, limit: int, descending: bool = True):
+    """
+    Order a select by key_columns (the last one must be unique, e.g. id) and return one page
+    With a cursor the page starts after the cursor row; without one skip/limit apply as before.
+    Fetches limit + 1 rows so page_with_cursor can tell whether another page follows.
+    """
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in key_columns])
+
+    if cursor:
+        values = decode_cursor(cursor, key_columns)
+        key = tuple_(*key_columns)
+        after = tuple_(*[cursor_param(column, value) for column, value in zip(key_columns, values)])
+        # The bound on the leading column alone lets the planner range-scan the sort index
+        if descending:
+            query = query.where(key_columns[0] <= cursor_param(key_columns[0], values[0]), key < after)
+        else:
+            query = query.where(key_columns[0] >= cursor_param(key_columns[0], values[0]), key > after)
+    else:
+        query = query.offset(skip)
+
+    return query.limit(limit + 1)
+
+
+def page_with_cursor(response: Response, rows: Sequence, key_columns: Sequence, limit: int) -> List:
+    """Drop the extra row fetched by paginate and set the next page cursor header"""
+    rows = list(rows)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, column.key) for column in key_columns])
+    return rows
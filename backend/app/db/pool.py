@@ -0,0 +1,103 @@
+"""
+Connection pool instrumentation
+Tracks how long requests wait for a pooled connection and reports pool saturation,
+so uvicorn workers can be sized against Postgres max_connections
+"""
+
+import os
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolWaitStats:
+    """Cumulative connection checkout wait times for one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_ms": round(self.total_wait_seconds * 1000, 2),
+                "average_wait_ms": round(self.total_wait_seconds * 1000 / attempts, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2)
+            }
+
+
+class TimedPoolMixin:
+    """Measures the time spent inside the pool's _do_get (i.e. waiting for a free connection)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    """QueuePool for the sync engine with checkout wait tracking"""
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool for the async engine with checkout wait tracking"""
+
+
+def get_pool_status(engine) -> dict:
+    """
+    Describe the current state of an engine's connection pool
+    Counts are per worker process - every uvicorn worker holds its own pool
+    """
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        checked_out = pool.checkedout()
+        status.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": checked_out,
+            "idle": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "capacity": pool.size() + pool._max_overflow,
+            "timeout_seconds": pool.timeout()
+        })
+
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        status["wait"] = wait_stats.snapshot()
+
+    return status
+
+
+def get_worker_pool_stats(engines: dict) -> dict:
+    """Pool status of every named engine in this worker process"""
+    return {
+        "worker_pid": os.getpid(),
+        "engines": {name: get_pool_status(engine) for name, engine in engines.items()}
+    }
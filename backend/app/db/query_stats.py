@@ -0,0 +1,128 @@
+"""
+Per-request SQL statement counting
+Every statement run through any engine is counted and timed via SQLAlchemy engine events;
+the middleware reports the totals of each request in X-DB-Query-Count / Server-Timing headers
+so N+1 patterns (e.g. lazy loads while serializing) show up in the browser dev tools.
+query_budget() asserts the same totals in tests. Statements are also fed to the slow query log.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+from app.db import slow_queries
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+
+
+class QueryStats:
+    """Statements executed and time spent in the database for one request (or budget block)"""
+
+    def __init__(self, keep_statements: bool = False):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.statements: Optional[List[str]] = [] if keep_statements else None
+        self.scope: Optional[dict] = None
+
+    def record(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            if self.statements is not None:
+                self.statements.append(statement)
+
+    @property
+    def total_ms(self) -> float:
+        return self.total_seconds * 1000
+
+    @property
+    def endpoint(self) -> Optional[str]:
+        """Method and route template of the request, e.g. "GET /api/workout-sessions/{session_id}" """
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return f'{self.scope.get("method")} {getattr(route, "path", self.scope.get("path"))}'
+
+
+# Stats of the request being served (context variables follow SQLAlchemy's async greenlets)
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+
+# Active query_budget() blocks; process wide so statements run by the TestClient's thread count too
+_budgets: List[QueryStats] = []
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_times"].pop()
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for budget in _budgets:
+        budget.record(statement, elapsed)
+
+    slow_queries.observe(
+        statement, parameters, elapsed, executemany, conn.dialect.name, stats.endpoint if stats else None
+    )
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_timer(exception_context):
+    start_times = exception_context.connection.info.get("query_start_times") if exception_context.connection else None
+    if start_times:
+        start_times.pop()
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats of the request being served, None outside a request"""
+    return _request_stats.get()
+
+
+async def query_stats_middleware(request: Request, call_next):
+    """Count the SQL statements of a request and report them in the response headers"""
+    stats = QueryStats()
+    stats.scope = request.scope
+    token = _request_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_stats.reset(token)
+
+    if settings.DB_QUERY_STATS_HEADERS:
+        response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+        response.headers["Server-Timing"] = f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries"'
+    return response
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """
+    Fail (AssertionError) when the block runs more than max_queries SQL statements
+    For tests: wrap an endpoint call to pin down how many queries it may issue, e.g.
+
+        with query_budget(3):
+            client.get("/api/workout-sessions", headers=auth)
+    """
+    stats = QueryStats(keep_statements=True)
+    _budgets.append(stats)
+    try:
+        yield stats
+    finally:
+        _budgets.remove(stats)
+
+    if stats.count > max_queries:
+        statements = "\n\n".join(stats.statements)
+        raise AssertionError(
+            f"Query budget exceeded: {stats.count} statements (budget {max_queries})\n\n{statements}"
+        )
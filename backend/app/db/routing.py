@@ -0,0 +1,92 @@
+"""
+Read-your-writes stickiness for replica routing
+After a user issues a write, their reads are pinned to the primary for
+READ_YOUR_WRITES_SECONDS so they never see replica lag on their own changes.
+The window travels with the client in a signed cookie, so whichever worker (or host)
+serves the next read honours it; clients that drop cookies fall back to the
+marker kept by the worker that served the write.
+"""
+
+import hashlib
+import hmac
+import time
+from typing import Dict, Optional
+from fastapi import Request
+from app.core.config import settings
+from app.core.security import decode_access_token
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Cookie carrying "<unix time until which reads stay on the primary>.<signature>"
+PRIMARY_UNTIL_COOKIE = "gymtracker_primary_until"
+
+# user_id -> monotonic time until which the user's reads stay on the primary
+_recent_writers: Dict[str, float] = {}
+_MAX_TRACKED_WRITERS = 10000
+
+
+def mark_recent_write(user_id: str) -> None:
+    """Pin a user's reads to the primary for the stickiness window"""
+    now = time.monotonic()
+    if len(_recent_writers) >= _MAX_TRACKED_WRITERS:
+        for expired_user_id in [uid for uid, until in _recent_writers.items() if until <= now]:
+            del _recent_writers[expired_user_id]
+    _recent_writers[user_id] = now + settings.READ_YOUR_WRITES_SECONDS
+
+
+def has_recent_write(user_id: str) -> bool:
+    """True while the user is inside their read-your-writes window"""
+    until = _recent_writers.get(user_id)
+    if until is None:
+        return False
+    if until <= time.monotonic():
+        _recent_writers.pop(user_id, None)
+        return False
+    return True
+
+
+def _sign_primary_until(user_id: str, until: int) -> str:
+    message = f"{user_id}:{until}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def primary_until_cookie(user_id: str) -> str:
+    """Cookie value pinning a user's reads to the primary for the stickiness window"""
+    until = int(time.time()) + settings.READ_YOUR_WRITES_SECONDS
+    return f"{until}.{_sign_primary_until(user_id, until)}"
+
+
+def has_primary_until_cookie(request: Request, user_id: str) -> bool:
+    """True while the request carries an unexpired window signed for this user"""
+    until, _, signature = request.cookies.get(PRIMARY_UNTIL_COOKIE, "").partition(".")
+    if not until.isdigit() or int(until) <= time.time():
+        return False
+    return hmac.compare_digest(signature, _sign_primary_until(user_id, int(until)))
+
+
+def get_request_user_id(request: Request) -> Optional[str]:
+    """User id from the bearer token, without touching the database"""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return decode_access_token(token)
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """Route a user's reads to the primary while their recent writes may not be on the replica yet"""
+    user_id = get_request_user_id(request)
+    request.state.read_from_primary = user_id is not None and (
+        has_primary_until_cookie(request, user_id) or has_recent_write(user_id)
+    )
+
+    response = await call_next(request)
+
+    if user_id is not None and request.method in WRITE_METHODS and response.status_code < 400:
+        mark_recent_write(user_id)
+        response.set_cookie(
+            PRIMARY_UNTIL_COOKIE, primary_until_cookie(user_id),
+            max_age=settings.READ_YOUR_WRITES_SECONDS, path="/api", httponly=True, samesite="lax"
+        )
+
+    return response
@@ -0,0 +1,201 @@
+"""
+Slow query log and statement leaderboard
+Statements slower than SLOW_QUERY_MS are logged as one JSON line with the endpoint that ran
+them, the shapes (never the values) of their parameters and their EXPLAIN plan. The plan is
+captured by a background thread on the primary, so the slow request is not delayed further.
+Every statement also feeds a per-worker leaderboard of normalized statements by cumulative
+time, served by /api/internal/slow-queries.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger("gymtracker.slow_queries")
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# One plan per normalized statement is enough to diagnose it
+_recent_plans = TTLCache(ttl_seconds=300, max_entries=500)
+
+_explain_queue: "queue.Queue[dict]" = queue.Queue(maxsize=100)
+_explain_thread: Optional[threading.Thread] = None
+_explain_thread_lock = threading.Lock()
+
+_PLACEHOLDER = re.compile(r"\$\d+(::\w+(\[\])?)?|%\(\w+\)s|\?|'(?:[^']|'')*'|\b\d+(\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """Statement with literals and placeholders replaced by ? and IN lists collapsed, for grouping"""
+    normalized = _PLACEHOLDER.sub("?", statement)
+    normalized = _VALUE_LIST.sub("(...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def parameter_shapes(parameters, executemany: bool = False):
+    """Type (and length for collections) of each bound parameter, without the values themselves"""
+    if executemany:
+        return {"executemany": len(parameters)}
+
+    def shape(value):
+        if isinstance(value, (list, tuple, set)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    if isinstance(parameters, dict):
+        return {name: shape(value) for name, value in parameters.items()}
+    return [shape(value) for value in parameters or ()]
+
+
+class StatementLeaderboard:
+    """
+    Cumulative time per normalized statement over a rolling window
+    The window restarts every window_seconds so old hot spots age out
+    """
+
+    def __init__(self, window_seconds: float, max_statements: int = 1000):
+        self.window_seconds = window_seconds
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._stats: Dict[str, dict] = {}
+        self._window_start = time.monotonic()
+        self.window_started_at = datetime.now(timezone.utc)
+
+    def record(self, fingerprint: str, seconds: float, slow: bool) -> None:
+        with self._lock:
+            if time.monotonic() - self._window_start >= self.window_seconds:
+                self._reset()
+
+            entry = self._stats.get(fingerprint)
+            if entry is None:
+                if len(self._stats) >= self.max_statements:
+                    # Make room by dropping the statement that cost the least so far
+                    del self._stats[min(self._stats, key=lambda key: self._stats[key]["total_seconds"])]
+                entry = self._stats[fingerprint] = {"calls": 0, "slow_calls": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
+            entry["calls"] += 1
+            entry["slow_calls"] += int(slow)
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def top(self, limit: int) -> List[dict]:
+        """The limit statements with the highest cumulative time in the current window"""
+        with self._lock:
+            ranked = sorted(self._stats.items(), key=lambda item: item[1]["total_seconds"], reverse=True)[:limit]
+            return [
+                {
+                    "statement": fingerprint,
+                    "calls": entry["calls"],
+                    "slow_calls": entry["slow_calls"],
+                    "total_ms": round(entry["total_seconds"] * 1000, 2),
+                    "mean_ms": round(entry["total_seconds"] * 1000 / entry["calls"], 3),
+                    "max_ms": round(entry["max_seconds"] * 1000, 2)
+                }
+                for fingerprint, entry in ranked
+            ]
+
+
+leaderboard = StatementLeaderboard(window_seconds=settings.SLOW_QUERY_WINDOW_MINUTES * 60)
+
+
+def observe(statement: str, parameters, seconds: float, executemany: bool, dialect: str, endpoint: Optional[str]) -> None:
+    """Called for every executed statement: update the leaderboard, queue slow ones for logging"""
+    fingerprint = normalize_statement(statement)
+    slow = 0 < settings.SLOW_QUERY_MS <= seconds * 1000
+    leaderboard.record(fingerprint, seconds, slow)
+    if not slow:
+        return
+
+    entry = {
+        "event": "slow_query",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(seconds * 1000, 2),
+        "endpoint": endpoint,
+        "statement": fingerprint,
+        "parameters": parameter_shapes(parameters, executemany),
+        "worker_pid": os.getpid(),
+    }
+    explain = (
+        settings.SLOW_QUERY_EXPLAIN and dialect == "postgresql" and not executemany
+        and statement.lstrip().upper().startswith(EXPLAINABLE)
+    )
+    if not explain:
+        write_log_entry(entry)
+        return
+
+    try:
+        _explain_queue.put_nowait({"entry": entry, "statement": statement, "parameters": parameters})
+    except queue.Full:
+        entry["plan_skipped"] = "explain queue full"
+        write_log_entry(entry)
+        return
+    _ensure_explain_thread()
+
+
+def write_log_entry(entry: dict) -> None:
+    logger.warning(json.dumps(entry, default=str))
+
+
+def explain_statement(statement: str, parameters) -> list:
+    """
+    EXPLAIN (ANALYZE off) plan of a statement, as JSON, on the primary
+    asyncpg statements use $n placeholders, so they are prepared and explained through EXECUTE
+    """
+    from app.db.database import engine
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if isinstance(parameters, dict):
+            cursor.execute(f"EXPLAIN (ANALYZE off, FORMAT JSON) {statement}", parameters)
+            return cursor.fetchone()[0]
+
+        cursor.execute(f"PREPARE slow_query_plan AS {statement}")
+        try:
+            arguments = f"({', '.join(['%s'] * len(parameters))})" if parameters else ""
+            cursor.execute(f"EXPLAIN (ANALYZE off, FORMAT JSON) EXECUTE slow_query_plan{arguments}", tuple(parameters or ()))
+            return cursor.fetchone()[0]
+        finally:
+            connection.rollback()
+            cursor.execute("DEALLOCATE slow_query_plan")
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def _explain_worker() -> None:
+    while True:
+        item = _explain_queue.get()
+        entry = item["entry"]
+        try:
+            plan = _recent_plans.get(entry["statement"])
+            if plan is None:
+                plan = explain_statement(item["statement"], item["parameters"])
+                _recent_plans.set(entry["statement"], plan)
+            entry["plan"] = plan
+        except Exception as e:
+            entry["plan_error"] = str(e)
+        write_log_entry(entry)
+
+
+def _ensure_explain_thread() -> None:
+    global _explain_thread
+    with _explain_thread_lock:
+        if _explain_thread is None or not _explain_thread.is_alive():
+            _explain_thread = threading.Thread(target=_explain_worker, name="slow-query-explain", daemon=True)
+            _explain_thread.start()
@@ -0,0 +1,54 @@
+"""
+Column types shared by the models
+"""
+
+import os
+import time
+import uuid
+from sqlalchemy import String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.types import TypeDecorator
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (version 7): 48-bit millisecond timestamp followed by random bits
+    New rows land at the end of primary key indexes instead of random pages
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | (0x7 << 76)  # version 7
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    """Default primary key value"""
+    return str(uuid7())
+
+
+class GUID(TypeDecorator):
+    """
+    Identifier column: native 16-byte UUID on PostgreSQL, VARCHAR(36) elsewhere (SQLite)
+    Values are exchanged as canonical strings either way, so API payloads are unchanged.
+    On PostgreSQL a malformed id binds as NULL: lookups by it match no row (404)
+    instead of failing the query with an invalid uuid cast.
+    """
+    impl = String(36)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(UUID(as_uuid=False))
+        return dialect.type_descriptor(String(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "postgresql":
+            return value
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            return None
+
+    def process_result_value(self, value, dialect):
+        return str(value) if value is not None else None
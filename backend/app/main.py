@@ -1,10 +1,15 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.db.database import init_db
+from app.db.database import init_db, has_schema, async_engine, replica_engine
 from app.db.migrations import run_migrations
-from app.api import auth, users, exercises, workout_plans, workout_sessions, cardio, metrics
+from app.api import auth, users, exercises, workout_plans, workout_sessions, cardio, metrics, internal
+from app.db.routing import read_your_writes_middleware
+from app.db.query_stats import query_stats_middleware
 from app.core.config import settings
+from app.core.user_cache import listen_for_user_changes
+from app.core.login_attempts import run_login_audit_writer
 import os
 
 app = FastAPI(
@@ -20,8 +25,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-DB-Query-Count", "Server-Timing"],
 )
 
+# Pin a user's reads to the primary right after they write (only needed with a read replica)
+if settings.DATABASE_REPLICA_URL:
+    app.middleware("http")(read_your_writes_middleware)
+
+# Count SQL statements per request (N+1 detection headers, slow query log endpoint names)
+app.middleware("http")(query_stats_middleware)
+
 # Mount uploads directory for serving images
 uploads_dir = os.path.join(settings.UPLOAD_DIR, "exercises")
 os.makedirs(uploads_dir, exist_ok=True)
@@ -35,17 +48,40 @@ app.include_router(workout_plans.router, prefix="/api")
 app.include_router(workout_sessions.router, prefix="/api")
 app.include_router(cardio.router, prefix="/api")
 app.include_router(metrics.router, prefix="/api")
+app.include_router(internal.router, prefix="/api")
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and run migrations on startup"""
-    init_db()
-    print("Running database migrations...")
-    run_migrations()
+    if has_schema():
+        # Upgrade first: create_all would add the newer tables with UUID foreign keys to the
+        # VARCHAR ids that migration 0014 has yet to convert, which PostgreSQL rejects
+        print("Running database migrations...")
+        run_migrations()
+        init_db()
+    else:
+        # New database: the base tables come from the models, the migrations then find them current
+        init_db()
+        print("Running database migrations...")
+        run_migrations()
+    # Drop cached users changed by other workers
+    app.state.user_cache_listener = asyncio.create_task(listen_for_user_changes())
+    app.state.login_audit_writer = asyncio.create_task(run_login_audit_writer())
     print("Application ready!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks (writing queued login attempts first) and close pooled database connections"""
+    app.state.user_cache_listener.cancel()
+    app.state.login_audit_writer.cancel()
+    await asyncio.gather(app.state.login_audit_writer, return_exceptions=True)
+    await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
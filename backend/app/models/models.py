@@ -1,10 +1,18 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Text, Boolean, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column, String, Integer, Float, Date, DateTime, ForeignKey, Text, Boolean, Enum, UniqueConstraint, Index
+)
+from sqlalchemy.orm import backref, relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
-import uuid
+from app.db.types import GUID, new_id
+from app.core.config import settings
 import enum
 
+# Loading strategy of every relationship. API queries load what they serialize with explicit
+# selectinload/joinedload options; tests set DB_RAISE_ON_LAZY_LOAD=true so a relationship
+# touched without one fails loudly instead of issuing one query per row.
+LAZY_LOADING = "raise_on_sql" if settings.DB_RAISE_ON_LAZY_LOAD else "select"
+
 
 class UserRole(str, enum.Enum):
     PERSONAL_TRAINER = "personal_trainer"
@@ -14,7 +22,7 @@ class UserRole(str, enum.Enum):
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID, primary_key=True, default=new_id)
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
@@ -26,35 +34,44 @@ class User(Base):
     height = Column(Float, nullable=False)  # cm
     desired_weight = Column(Float, nullable=True)  # kg - target weight goal
     phone = Column(String, nullable=True)
-    personal_trainer_id = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    personal_trainer_id = Column(GUID, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    current_streak = Column(Integer, nullable=False, default=0)  # Consecutive active days ending at last_active_date
+    last_active_date = Column(Date, nullable=True)
+    token_epoch = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped to revoke every issued token
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
-    personal_trainer = relationship("User", remote_side=[id], foreign_keys=[personal_trainer_id], backref="clients")
-    workout_plans = relationship("WorkoutPlan", back_populates="user", cascade="all, delete-orphan")
-    workout_sessions = relationship("WorkoutSession", back_populates="user", cascade="all, delete-orphan")
-    cardio_sessions = relationship("CardioSession", back_populates="user", cascade="all, delete-orphan")
-    created_exercises = relationship("Exercise", back_populates="creator", cascade="all, delete-orphan")
+    personal_trainer = relationship(
+        "User", remote_side=[id], foreign_keys=[personal_trainer_id],
+        backref=backref("clients", lazy=LAZY_LOADING), lazy=LAZY_LOADING
+    )
+    workout_plans = relationship("WorkoutPlan", back_populates="user", cascade="all, delete-orphan", lazy=LAZY_LOADING)
+    workout_sessions = relationship("WorkoutSession", back_populates="user", cascade="all, delete-orphan", lazy=LAZY_LOADING)
+    cardio_sessions = relationship("CardioSession", back_populates="user", cascade="all, delete-orphan", lazy=LAZY_LOADING)
+    created_exercises = relationship("Exercise", back_populates="creator", cascade="all, delete-orphan", lazy=LAZY_LOADING)
 
 
 class Exercise(Base):
     __tablename__ = "exercises"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID, primary_key=True, default=new_id)
     name = Column(String, nullable=False, index=True)
     description = Column(Text, nullable=True)
     muscle_group = Column(String, nullable=False)
     equipment = Column(String, nullable=True)
     image_path = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    created_by = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_by = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    # Sort key of the paginated exercise listing (see migration 0017)
+    __table_args__ = (Index("ix_exercises_created_by_created", created_by, created_at, id),)
 
     # Relationships
-    creator = relationship("User", back_populates="created_exercises")
-    plan_exercises = relationship("PlanExercise", back_populates="exercise", cascade="all, delete-orphan")
-    exercise_logs = relationship("ExerciseLog", back_populates="exercise", passive_deletes=True)
-    assigned_exercises = relationship("AssignedExercise", back_populates="exercise", cascade="all, delete-orphan")
+    creator = relationship("User", back_populates="created_exercises", lazy=LAZY_LOADING)
+    plan_exercises = relationship("PlanExercise", back_populates="exercise", cascade="all, delete-orphan", lazy=LAZY_LOADING)
+    exercise_logs = relationship("ExerciseLog", back_populates="exercise", passive_deletes=True, lazy=LAZY_LOADING)
+    assigned_exercises = relationship("AssignedExercise", back_populates="exercise", cascade="all, delete-orphan", lazy=LAZY_LOADING)
 
     @property
     def image_url(self):
@@ -65,26 +82,29 @@ class Exercise(Base):
 class WorkoutPlan(Base):
     __tablename__ = "workout_plans"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID, primary_key=True, default=new_id)
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     is_active = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Sort key of the paginated plan listing (see migration 0017)
+    __table_args__ = (Index("ix_workout_plans_user_created", user_id, created_at, id),)
+
     # Relationships
-    user = relationship("User", back_populates="workout_plans")
-    plan_exercises = relationship("PlanExercise", back_populates="workout_plan", cascade="all, delete-orphan", order_by="PlanExercise.order")
-    workout_sessions = relationship("WorkoutSession", back_populates="workout_plan")
+    user = relationship("User", back_populates="workout_plans", lazy=LAZY_LOADING)
+    plan_exercises = relationship("PlanExercise", back_populates="workout_plan", cascade="all, delete-orphan", order_by="PlanExercise.order", lazy=LAZY_LOADING)
+    workout_sessions = relationship("WorkoutSession", back_populates="workout_plan", lazy=LAZY_LOADING)
 
 
 class PlanExercise(Base):
     __tablename__ = "plan_exercises"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    workout_plan_id = Column(String, ForeignKey("workout_plans.id", ondelete="CASCADE"), nullable=False)
-    exercise_id = Column(String, ForeignKey("exercises.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID, primary_key=True, default=new_id)
+    workout_plan_id = Column(GUID, ForeignKey("workout_plans.id", ondelete="CASCADE"), nullable=False)
+    exercise_id = Column(GUID, ForeignKey("exercises.id", ondelete="CASCADE"), nullable=False)
     sets = Column(String, nullable=False)  # Changed to String to allow values like "Max", "3-4", etc.
     reps = Column(String, nullable=False)  # Changed to String to allow values like "10-12", "Max", etc.
     rest_time = Column(String, nullable=False)  # Changed to String to allow values like "60", "90s", "5'", etc.
@@ -94,32 +114,43 @@ class PlanExercise(Base):
     order = Column(Integer, nullable=False, default=0)
 
     # Relationships
-    workout_plan = relationship("WorkoutPlan", back_populates="plan_exercises")
-    exercise = relationship("Exercise", back_populates="plan_exercises")
+    workout_plan = relationship("WorkoutPlan", back_populates="plan_exercises", lazy=LAZY_LOADING)
+    exercise = relationship("Exercise", back_populates="plan_exercises", lazy=LAZY_LOADING)
 
 
 class WorkoutSession(Base):
     __tablename__ = "workout_sessions"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    workout_plan_id = Column(String, ForeignKey("workout_plans.id", ondelete="SET NULL"), nullable=True)
+    id = Column(GUID, primary_key=True, default=new_id)
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    workout_plan_id = Column(GUID, ForeignKey("workout_plans.id", ondelete="SET NULL"), nullable=True)
     start_time = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     end_time = Column(DateTime(timezone=True), nullable=True)
     notes = Column(Text, nullable=True)
 
+    # Composite/partial indexes matching the hot queries (see migration 0013)
+    __table_args__ = (
+        Index("ix_workout_sessions_user_start", user_id, start_time.desc()),
+        Index(
+            "ix_workout_sessions_user_completed_start", user_id, start_time.desc(),
+            postgresql_include=["end_time"],
+            postgresql_where=end_time.isnot(None),
+            sqlite_where=end_time.isnot(None)
+        ),
+    )
+
     # Relationships
-    user = relationship("User", back_populates="workout_sessions")
-    workout_plan = relationship("WorkoutPlan", back_populates="workout_sessions")
-    exercise_logs = relationship("ExerciseLog", back_populates="session", cascade="all, delete-orphan")
+    user = relationship("User", back_populates="workout_sessions", lazy=LAZY_LOADING)
+    workout_plan = relationship("WorkoutPlan", back_populates="workout_sessions", lazy=LAZY_LOADING)
+    exercise_logs = relationship("ExerciseLog", back_populates="session", cascade="all, delete-orphan", lazy=LAZY_LOADING)
 
 
 class ExerciseLog(Base):
     __tablename__ = "exercise_logs"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    session_id = Column(String, ForeignKey("workout_sessions.id", ondelete="CASCADE"), nullable=False)
-    exercise_id = Column(String, ForeignKey("exercises.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID, primary_key=True, default=new_id)
+    session_id = Column(GUID, ForeignKey("workout_sessions.id", ondelete="CASCADE"), nullable=False)
+    exercise_id = Column(GUID, ForeignKey("exercises.id", ondelete="CASCADE"), nullable=False)
     sets_completed = Column(String, nullable=False)  # Changed to String to allow values like "Max", "3-4", etc.
     reps_completed = Column(String, nullable=False)  # Changed to String to allow values like "10-12", "Max", etc.
     weight_used = Column(Float, nullable=True)  # kg
@@ -127,16 +158,65 @@ class ExerciseLog(Base):
     notes = Column(Text, nullable=True)
     completed_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (Index("ix_exercise_logs_exercise_completed", exercise_id, completed_at.desc()),)
+
     # Relationships
-    session = relationship("WorkoutSession", back_populates="exercise_logs")
-    exercise = relationship("Exercise", back_populates="exercise_logs")
+    session = relationship("WorkoutSession", back_populates="exercise_logs", lazy=LAZY_LOADING)
+    exercise = relationship("Exercise", back_populates="exercise_logs", lazy=LAZY_LOADING)
+
+
+class UserExerciseLast(Base):
+    """
+    Denormalized last performance of each exercise per user
+    Maintained when workout sessions close so plan pages never scan exercise_logs
+    """
+    __tablename__ = "user_exercise_last"
+
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    exercise_id = Column(GUID, ForeignKey("exercises.id", ondelete="CASCADE"), primary_key=True)
+    session_id = Column(GUID, ForeignKey("workout_sessions.id", ondelete="SET NULL"), nullable=True)
+    weight_used = Column(Float, nullable=True)  # kg
+    sets_completed = Column(String, nullable=True)
+    reps_completed = Column(String, nullable=True)
+    performed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class UserActivityDay(Base):
+    """
+    One row per calendar day a user trained (workout or cardio)
+    Lets total_training_days grow incrementally instead of rescanning all sessions
+    """
+    __tablename__ = "user_activity_days"
+
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+
+class DailyUserActivity(Base):
+    """
+    Per user per day rollup of workouts and cardio for time-series views
+    Rebuilt for a single day whenever a session of that day closes, changes or is deleted
+    """
+    __tablename__ = "daily_user_activity"
+
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    workout_count = Column(Integer, nullable=False, default=0)  # Completed workout sessions
+    training_minutes = Column(Float, nullable=False, default=0.0)  # Workout session time
+    sets_completed = Column(Integer, nullable=False, default=0)
+    reps_completed = Column(Integer, nullable=False, default=0)
+    total_volume = Column(Float, nullable=False, default=0.0)  # kg - sets x reps x weight
+    cardio_sessions = Column(Integer, nullable=False, default=0)
+    cardio_minutes = Column(Integer, nullable=False, default=0)
+    distance = Column(Float, nullable=False, default=0.0)  # km
+    calories_burned = Column(Integer, nullable=False, default=0)
 
 
 class CardioSession(Base):
     __tablename__ = "cardio_sessions"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID, primary_key=True, default=new_id)
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     activity_type = Column(String, nullable=False)  # running, cycling, swimming, etc.
     location = Column(String, nullable=True)
     duration = Column(Integer, nullable=False)  # minutes
@@ -145,8 +225,10 @@ class CardioSession(Base):
     start_time = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     notes = Column(Text, nullable=True)
 
+    __table_args__ = (Index("ix_cardio_sessions_user_start", user_id, start_time.desc()),)
+
     # Relationships
-    user = relationship("User", back_populates="cardio_sessions")
+    user = relationship("User", back_populates="cardio_sessions", lazy=LAZY_LOADING)
 
 
 class AssignedExercise(Base):
@@ -156,17 +238,17 @@ class AssignedExercise(Base):
     """
     __tablename__ = "assigned_exercises"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    exercise_id = Column(String, ForeignKey("exercises.id", ondelete="CASCADE"), nullable=False)
-    client_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    personal_trainer_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID, primary_key=True, default=new_id)
+    exercise_id = Column(GUID, ForeignKey("exercises.id", ondelete="CASCADE"), nullable=False)
+    client_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    personal_trainer_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     assigned_at = Column(DateTime(timezone=True), server_default=func.now())
     notes = Column(Text, nullable=True)  # PT can add notes for the client
 
     # Relationships
-    exercise = relationship("Exercise", back_populates="assigned_exercises")
-    client = relationship("User", foreign_keys=[client_id])
-    personal_trainer = relationship("User", foreign_keys=[personal_trainer_id])
+    exercise = relationship("Exercise", back_populates="assigned_exercises", lazy=LAZY_LOADING)
+    client = relationship("User", foreign_keys=[client_id], lazy=LAZY_LOADING)
+    personal_trainer = relationship("User", foreign_keys=[personal_trainer_id], lazy=LAZY_LOADING)
 
 
 class WeightHistory(Base):
@@ -176,16 +258,19 @@ class WeightHistory(Base):
     """
     __tablename__ = "weight_history"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID, primary_key=True, default=new_id)
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     weight = Column(Float, nullable=False)  # kg
     previous_weight = Column(Float, nullable=True)  # kg - previous weight for calculating difference
     days_since_last_change = Column(Integer, nullable=True)  # days since last weight update
     recorded_at = Column(DateTime(timezone=True), server_default=func.now())
     notes = Column(Text, nullable=True)
 
+    # Sort key of the paginated weight history, newest first (see migration 0017)
+    __table_args__ = (Index("ix_weight_history_user_recorded", user_id, recorded_at.desc(), id.desc()),)
+
     # Relationships
-    user = relationship("User", foreign_keys=[user_id])
+    user = relationship("User", foreign_keys=[user_id], lazy=LAZY_LOADING)
 
 
 class ClientMetrics(Base):
@@ -195,9 +280,9 @@ class ClientMetrics(Base):
     """
     __tablename__ = "client_metrics"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    client_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
-    personal_trainer_id = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    id = Column(GUID, primary_key=True, default=new_id)
+    client_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
+    personal_trainer_id = Column(GUID, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
 
     # Workout metrics (cumulative, never reset)
     total_workouts_completed = Column(Integer, default=0)  # Total workouts ever completed
@@ -232,8 +317,8 @@ class ClientMetrics(Base):
     last_updated = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
-    client = relationship("User", foreign_keys=[client_id])
-    personal_trainer = relationship("User", foreign_keys=[personal_trainer_id])
+    client = relationship("User", foreign_keys=[client_id], lazy=LAZY_LOADING)
+    personal_trainer = relationship("User", foreign_keys=[personal_trainer_id], lazy=LAZY_LOADING)
 
 
 class PasswordResetToken(Base):
@@ -243,15 +328,37 @@ class PasswordResetToken(Base):
     """
     __tablename__ = "password_reset_tokens"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(GUID, primary_key=True, default=new_id)
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     token = Column(String, nullable=False, unique=True, index=True)
     expires_at = Column(DateTime(timezone=True), nullable=False)
     used = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
-    user = relationship("User", foreign_keys=[user_id])
+    user = relationship("User", foreign_keys=[user_id], lazy=LAZY_LOADING)
+
+
+class RefreshToken(Base):
+    """
+    Long-lived refresh tokens, one family per signed-in device
+    Only a SHA-256 hash of the token is stored; each use rotates it (the row is revoked and
+    replaced by a new one in the same family) and presenting a rotated token revokes the family
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(GUID, primary_key=True, default=new_id)
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(GUID, nullable=False, index=True)  # Shared by every rotation of one sign-in
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
+    device_name = Column(String(200), nullable=True)  # Given at login, or the User-Agent
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    replaced_by_id = Column(GUID, nullable=True)  # Set when rotated, as opposed to signed out
+
+    # Relationships
+    user = relationship("User", foreign_keys=[user_id], lazy=LAZY_LOADING)
 
 
 class LoginAttempt(Base):
@@ -260,12 +367,39 @@ class LoginAttempt(Base):
     """
     __tablename__ = "login_attempts"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID, primary_key=True, default=new_id)
     identifier = Column(String, nullable=False, index=True)  # Email or username attempted
     ip_address = Column(String, nullable=True)
     success = Column(Boolean, default=False)
     attempted_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
-    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)  # Null if user not found
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)  # Null if user not found
+
+    # Audit lookups: failed attempts of one identifier over time (the lockout itself is counted in memory)
+    __table_args__ = (
+        Index(
+            "ix_login_attempts_identifier_failed", identifier, attempted_at,
+            postgresql_where=success == False,  # noqa: E712
+            sqlite_where=success == False  # noqa: E712
+        ),
+    )
 
     # Relationships
-    user = relationship("User", foreign_keys=[user_id])
+    user = relationship("User", foreign_keys=[user_id], lazy=LAZY_LOADING)
+
+
+class MetricsEvent(Base):
+    """
+    Outbox of activity events (workout ended, cardio logged) whose ClientMetrics
+    updates are applied outside the request, by metrics_worker.py or in the background
+    """
+    __tablename__ = "metrics_events"
+    __table_args__ = (UniqueConstraint("event_type", "entity_id", name="uq_metrics_events_type_entity"),)
+
+    id = Column(GUID, primary_key=True, default=new_id)
+    event_type = Column(String, nullable=False)  # session_ended or cardio_logged
+    entity_id = Column(GUID, nullable=False)  # Workout session or cardio session id
+    user_id = Column(GUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
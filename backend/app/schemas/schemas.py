@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from app.models.models import UserRole
 
 
@@ -83,6 +83,7 @@ class ClientListResponse(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 
 class TokenData(BaseModel):
@@ -92,6 +93,19 @@ class TokenData(BaseModel):
 class LoginRequest(BaseModel):
     email: str  # Changed from EmailStr to str to allow username
     password: str
+    device_name: Optional[str] = None  # Shown in the device list; defaults to the User-Agent
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class DeviceSessionResponse(BaseModel):
+    """A device the user is signed in on (one refresh token family)"""
+    id: str  # Family id, used to sign the device out
+    device_name: Optional[str] = None
+    last_refreshed_at: Optional[datetime] = None
+    expires_at: datetime
 
 
 # Exercise Schemas
@@ -144,6 +158,9 @@ class PlanExerciseResponse(PlanExerciseBase):
     workout_plan_id: str
     exercise: Optional[ExerciseResponse] = None
     last_weight_used: Optional[float] = None  # Last weight used by user for this exercise
+    last_sets_completed: Optional[str] = None
+    last_reps_completed: Optional[str] = None
+    last_performed_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -190,6 +207,11 @@ class ExerciseLogCreate(ExerciseLogBase):
     pass
 
 
+class ExerciseLogBulkCreate(BaseModel):
+    exercise_logs: List[ExerciseLogCreate] = Field(min_length=1, max_length=200)
+    end_session: bool = False  # End the session in the same transaction
+
+
 class ExerciseLogResponse(ExerciseLogBase):
     id: str
     session_id: str
@@ -283,6 +305,17 @@ class DashboardStats(BaseModel):
     total_exercises: int
 
 
+# Activity Calendar (year heatmap)
+class ActivityCalendar(BaseModel):
+    year: int
+    start_date: date
+    levels: List[int]  # One intensity level (0-4) per day, levels[0] = start_date
+    active_days: int
+    total_workouts: int
+    total_cardio_sessions: int
+    total_active_minutes: float
+
+
 # Assigned Exercise Schemas
 class AssignedExerciseBase(BaseModel):
     exercise_id: str
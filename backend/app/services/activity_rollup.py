@@ -0,0 +1,191 @@
+"""
+Service maintaining the daily_user_activity rollup
+One compact row per user per active day (workouts, volume, cardio) so calendars,
+streaks and trends read at most 365 rows per user per year instead of raw sessions
+"""
+
+from datetime import date
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+from app.db.expressions import activity_day, duration_seconds
+from app.models.models import DailyUserActivity, WorkoutSession, CardioSession, ExerciseLog
+from app.services.metrics_service import parse_count
+
+ROLLUP_DEFAULTS = {
+    "workout_count": 0,
+    "training_minutes": 0.0,
+    "sets_completed": 0,
+    "reps_completed": 0,
+    "total_volume": 0.0,
+    "cardio_sessions": 0,
+    "cardio_minutes": 0,
+    "distance": 0.0,
+    "calories_burned": 0,
+}
+
+
+def compute_daily_activity(
+    db: Session,
+    user_id: Optional[str] = None,
+    day: Optional[date] = None
+) -> Dict[Tuple[str, date], dict]:
+    """
+    Aggregate raw sessions into rollup values keyed by (user_id, day)
+    Optionally limited to one user and/or one day; three grouped queries in every case
+    """
+    workout_day = activity_day(db, WorkoutSession.start_time)
+    cardio_day = activity_day(db, CardioSession.start_time)
+
+    workout_filters = [WorkoutSession.end_time.isnot(None)]  # Only completed sessions
+    cardio_filters = []
+    if user_id is not None:
+        workout_filters.append(WorkoutSession.user_id == user_id)
+        cardio_filters.append(CardioSession.user_id == user_id)
+    if day is not None:
+        workout_filters.append(workout_day == day)
+        cardio_filters.append(cardio_day == day)
+
+    rollup = {}
+
+    def row_for(key):
+        if key not in rollup:
+            rollup[key] = dict(ROLLUP_DEFAULTS)
+        return rollup[key]
+
+    workouts = db.execute(
+        select(
+            WorkoutSession.user_id,
+            workout_day,
+            func.count(),
+            func.sum(duration_seconds(db, WorkoutSession.start_time, WorkoutSession.end_time))
+        ).where(*workout_filters).group_by(WorkoutSession.user_id, workout_day)
+    )
+    for row_user_id, row_day, workout_count, seconds in workouts:
+        values = row_for((row_user_id, row_day))
+        values["workout_count"] = workout_count
+        values["training_minutes"] = (seconds or 0) / 60
+
+    # Sets/reps are free text: group by the distinct values and parse those in Python
+    logs = db.execute(
+        select(
+            WorkoutSession.user_id,
+            workout_day,
+            ExerciseLog.sets_completed,
+            ExerciseLog.reps_completed,
+            ExerciseLog.weight_used,
+            func.count()
+        ).join(WorkoutSession, ExerciseLog.session_id == WorkoutSession.id).where(*workout_filters).group_by(
+            WorkoutSession.user_id, workout_day,
+            ExerciseLog.sets_completed, ExerciseLog.reps_completed, ExerciseLog.weight_used
+        )
+    )
+    for row_user_id, row_day, sets_value, reps_value, weight, log_count in logs:
+        values = row_for((row_user_id, row_day))
+        sets, reps = parse_count(sets_value), parse_count(reps_value)
+        values["sets_completed"] += sets * log_count
+        values["reps_completed"] += reps * log_count
+        values["total_volume"] += sets * reps * (weight or 0) * log_count
+
+    cardio = db.execute(
+        select(
+            CardioSession.user_id,
+            cardio_day,
+            func.count(),
+            func.sum(CardioSession.duration),
+            func.sum(CardioSession.distance),
+            func.sum(CardioSession.calories_burned)
+        ).where(*cardio_filters).group_by(CardioSession.user_id, cardio_day)
+    )
+    for row_user_id, row_day, sessions, minutes, distance, calories in cardio:
+        values = row_for((row_user_id, row_day))
+        values["cardio_sessions"] = sessions
+        values["cardio_minutes"] = minutes or 0
+        values["distance"] = distance or 0.0
+        values["calories_burned"] = calories or 0
+
+    return rollup
+
+
+def _replace_rollup(db: Session, user_id: Optional[str], day: Optional[date]) -> int:
+    """Delete the rollup rows in scope and write them again from the raw sessions"""
+    delete_filters = []
+    if user_id is not None:
+        delete_filters.append(DailyUserActivity.user_id == user_id)
+    if day is not None:
+        delete_filters.append(DailyUserActivity.day == day)
+    db.execute(delete(DailyUserActivity).where(*delete_filters))
+
+    rollup = compute_daily_activity(db, user_id=user_id, day=day)
+    if rollup:
+        db.execute(
+            DailyUserActivity.__table__.insert(),
+            [{"user_id": key[0], "day": key[1], **values} for key, values in rollup.items()]
+        )
+    return len(rollup)
+
+
+def get_session_day(db: Session, model, entity_id: str) -> Optional[date]:
+    """Rollup day of a workout or cardio session (computed the same way the rollup groups it)"""
+    return db.scalar(select(activity_day(db, model.start_time)).where(model.id == entity_id))
+
+
+def refresh_daily_activity(db: Session, user_id: str, day: Optional[date]) -> None:
+    """
+    Rebuild one user's rollup row for one day after a session of that day changed
+    Only that day's sessions are read, whatever the user's history. Does not commit.
+    """
+    if day is not None:
+        _replace_rollup(db, user_id, day)
+
+
+def rebuild_daily_activity(db: Session, user_id: Optional[str] = None) -> int:
+    """
+    Rebuild the rollup from all history (one user or everyone), returns rows written
+    Used by the rebuild command. Does not commit.
+    """
+    return _replace_rollup(db, user_id, None)
+
+
+# Active minutes (training + cardio) at which a day reaches each calendar intensity level 1-4
+CALENDAR_LEVEL_MINUTES = (1, 30, 60, 90)
+
+
+def calendar_level(workouts: int, cardio_sessions: int, active_minutes: float) -> int:
+    """Heatmap intensity 0-4 of one day; any logged session makes a day at least level 1"""
+    if not workouts and not cardio_sessions:
+        return 0
+    return max(1, sum(1 for minutes in CALENDAR_LEVEL_MINUTES if active_minutes >= minutes))
+
+
+def get_activity_calendar(db: Session, user_id: str, year: int) -> dict:
+    """
+    Year-at-a-glance activity: one intensity level per day of the year (levels[0] = Jan 1)
+    Reads at most 366 rollup rows through the (user_id, day) primary key in one query
+    """
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    levels = [0] * ((end - start).days + 1)
+    totals = {"active_days": 0, "total_workouts": 0, "total_cardio_sessions": 0, "total_active_minutes": 0.0}
+
+    rows = db.execute(
+        select(
+            DailyUserActivity.day,
+            DailyUserActivity.workout_count,
+            DailyUserActivity.cardio_sessions,
+            DailyUserActivity.training_minutes + DailyUserActivity.cardio_minutes
+        ).where(
+            DailyUserActivity.user_id == user_id,
+            DailyUserActivity.day.between(start, end)
+        )
+    )
+    for day, workouts, cardio_sessions, active_minutes in rows:
+        level = calendar_level(workouts, cardio_sessions, active_minutes or 0)
+        levels[(day - start).days] = level
+        if level:
+            totals["active_days"] += 1
+        totals["total_workouts"] += workouts
+        totals["total_cardio_sessions"] += cardio_sessions
+        totals["total_active_minutes"] += active_minutes or 0
+
+    totals["total_active_minutes"] = round(totals["total_active_minutes"], 1)
+    return {"year": year, "start_date": start, "levels": levels, **totals}
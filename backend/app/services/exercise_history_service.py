@@ -0,0 +1,93 @@
+"""
+Service maintaining the user_exercise_last table
+Keeps one row per (user, exercise) with the most recent weight, sets and reps,
+so plan pages and progression hints read a single indexed row per exercise
+"""
+
+from typing import Iterable, Optional
+from sqlalchemy import select, delete, func, desc
+from sqlalchemy.orm import Session
+from app.db.database import dialect_insert
+from app.models.models import UserExerciseLast, ExerciseLog, WorkoutSession
+
+LAST_PERFORMANCE_COLUMNS = [
+    "user_id", "exercise_id", "session_id", "weight_used",
+    "sets_completed", "reps_completed", "performed_at"
+]
+
+
+def _latest_logs_query(*criteria):
+    """Newest completed log per (user, exercise) among the logs matching criteria"""
+    ranked_logs = select(
+        WorkoutSession.user_id,
+        ExerciseLog.exercise_id,
+        ExerciseLog.session_id,
+        ExerciseLog.weight_used,
+        ExerciseLog.sets_completed,
+        ExerciseLog.reps_completed,
+        ExerciseLog.completed_at.label("performed_at"),
+        func.row_number().over(
+            partition_by=(WorkoutSession.user_id, ExerciseLog.exercise_id),
+            order_by=desc(ExerciseLog.completed_at)
+        ).label("recency")
+    ).join(WorkoutSession, ExerciseLog.session_id == WorkoutSession.id).where(
+        WorkoutSession.end_time.isnot(None),  # Only completed sessions
+        ExerciseLog.completed_at.isnot(None),
+        *criteria
+    ).subquery()
+
+    return select(*[ranked_logs.c[name] for name in LAST_PERFORMANCE_COLUMNS]).where(
+        ranked_logs.c.recency == 1
+    )
+
+
+def record_session_performance(db: Session, session_id: str) -> None:
+    """
+    Upsert last performance rows from a closed workout session
+    Rows only move forward in time, so closing an older session never overwrites newer data
+    Does not commit - runs in the same transaction that closes the session
+    """
+    insert_stmt = dialect_insert(db, UserExerciseLast).from_select(
+        LAST_PERFORMANCE_COLUMNS,
+        _latest_logs_query(WorkoutSession.id == session_id)
+    )
+    excluded = insert_stmt.excluded
+    db.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=[UserExerciseLast.user_id, UserExerciseLast.exercise_id],
+            set_={name: excluded[name] for name in LAST_PERFORMANCE_COLUMNS[2:]},
+            where=UserExerciseLast.performed_at <= excluded.performed_at
+        )
+    )
+
+
+def rebuild_last_performance(
+    db: Session,
+    user_id: Optional[str] = None,
+    exercise_ids: Optional[Iterable[str]] = None
+) -> int:
+    """
+    Rebuild last performance rows from exercise_logs
+    Scoped to one user and/or a set of exercises when given, otherwise the whole table
+    Used by the backfill command and when a session is deleted. Does not commit.
+    """
+    delete_criteria = []
+    log_criteria = []
+    if user_id is not None:
+        delete_criteria.append(UserExerciseLast.user_id == user_id)
+        log_criteria.append(WorkoutSession.user_id == user_id)
+    if exercise_ids is not None:
+        exercise_ids = list(exercise_ids)
+        if not exercise_ids:
+            return 0
+        delete_criteria.append(UserExerciseLast.exercise_id.in_(exercise_ids))
+        log_criteria.append(ExerciseLog.exercise_id.in_(exercise_ids))
+
+    db.execute(delete(UserExerciseLast).where(*delete_criteria))
+    result = db.execute(
+        dialect_insert(db, UserExerciseLast).from_select(
+            LAST_PERFORMANCE_COLUMNS,
+            _latest_logs_query(*log_criteria)
+        )
+    )
+    return result.rowcount
@@ -0,0 +1,116 @@
+"""
+Queue of metrics events (transactional outbox)
+Routers enqueue an event in the same transaction as the activity it describes;
+the ClientMetrics update is applied later by metrics_worker.py or, when no worker
+runs, by the API in the background after the response has been sent
+"""
+
+import time
+from datetime import datetime, timedelta
+from fastapi import BackgroundTasks
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import dialect_insert, AsyncSessionLocal
+from app.models.models import MetricsEvent
+from app.services.metrics_service import update_metrics_after_workout, update_metrics_after_cardio
+
+SESSION_ENDED = "session_ended"
+CARDIO_LOGGED = "cardio_logged"
+
+EVENT_HANDLERS = {
+    SESSION_ENDED: update_metrics_after_workout,
+    CARDIO_LOGGED: update_metrics_after_cardio,
+}
+
+PURGE_INTERVAL_SECONDS = 3600
+_last_purge = None
+
+
+def enqueue_metrics_event(db: Session, event_type: str, entity_id: str, user_id: str) -> None:
+    """
+    Add an event to the queue; enqueueing the same event twice is a no-op
+    Does not commit - it must be committed with the activity change itself
+    """
+    db.execute(
+        dialect_insert(db, MetricsEvent).values(
+            event_type=event_type,
+            entity_id=entity_id,
+            user_id=user_id
+        ).on_conflict_do_nothing(
+            index_elements=[MetricsEvent.event_type, MetricsEvent.entity_id]
+        )
+    )
+
+
+def process_pending_events(db: Session, limit: int = 100) -> int:
+    """
+    Apply pending events oldest first, one transaction per event
+    The metrics update and the processed_at mark commit together, so every event is
+    applied exactly once; rows are claimed with SKIP LOCKED so several processors can run.
+    Returns the number of events applied.
+    """
+    processed = 0
+    failed_ids = set()
+
+    while processed + len(failed_ids) < limit:
+        event = db.query(MetricsEvent).filter(
+            MetricsEvent.processed_at.is_(None),
+            MetricsEvent.attempts < settings.METRICS_EVENT_MAX_ATTEMPTS,
+            MetricsEvent.id.notin_(failed_ids)
+        ).order_by(MetricsEvent.created_at).with_for_update(skip_locked=True).first()
+
+        if not event:
+            break
+
+        event_id = event.id
+        try:
+            handler = EVENT_HANDLERS[event.event_type]
+            handler(db, event.entity_id)
+            event.processed_at = datetime.now()
+            db.commit()
+            processed += 1
+        except Exception as e:
+            db.rollback()
+            failed_ids.add(event_id)
+            db.query(MetricsEvent).filter(MetricsEvent.id == event_id).update({
+                MetricsEvent.attempts: MetricsEvent.attempts + 1,
+                MetricsEvent.last_error: str(e)
+            })
+            db.commit()
+            print(f"❌ Error applying metrics event {event_id}: {str(e)}")
+
+    return processed
+
+
+def purge_processed_events(db: Session) -> int:
+    """
+    Delete events processed more than METRICS_EVENT_RETENTION_DAYS ago (0 keeps them)
+    Runs at most once per PURGE_INTERVAL_SECONDS per process; returns the number deleted
+    """
+    global _last_purge
+    if settings.METRICS_EVENT_RETENTION_DAYS <= 0:
+        return 0
+    if _last_purge is not None and time.monotonic() - _last_purge < PURGE_INTERVAL_SECONDS:
+        return 0
+    _last_purge = time.monotonic()
+
+    cutoff = datetime.now() - timedelta(days=settings.METRICS_EVENT_RETENTION_DAYS)
+    deleted = db.query(MetricsEvent).filter(
+        MetricsEvent.processed_at.isnot(None),
+        MetricsEvent.processed_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+async def process_events_in_background() -> None:
+    """In-process fallback used when no external worker drains the queue"""
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(process_pending_events)
+        await db.run_sync(purge_processed_events)
+
+
+def schedule_event_processing(background_tasks: BackgroundTasks) -> None:
+    """Drain the queue after the response is sent, unless an external worker does it"""
+    if not settings.METRICS_EXTERNAL_WORKER:
+        background_tasks.add_task(process_events_in_background)
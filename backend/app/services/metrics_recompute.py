@@ -0,0 +1,231 @@
+"""
+Service for recomputing ClientMetrics from the source tables
+Incremental updates drift when sessions are deleted or the metrics logic changes;
+this rebuilds the derived fields with grouped SQL aggregates for a batch of clients
+"""
+
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import select, union, delete, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.db.database import dialect_insert
+from app.db.expressions import activity_day, duration_seconds
+from app.models.models import (
+    ClientMetrics, WeightHistory, User, WorkoutSession,
+    CardioSession, ExerciseLog, UserActivityDay, MetricsEvent
+)
+from app.services.metrics_service import parse_count, days_since
+
+RECOMPUTED_FIELDS = [
+    "total_workouts_completed", "total_cardio_sessions", "total_training_hours",
+    "total_training_days", "total_sets_completed", "total_reps_completed",
+    "average_workout_duration_minutes", "last_activity_date", "consistency_percentage",
+    "current_weight", "lowest_weight", "highest_weight", "total_weight_changes",
+    "average_days_between_weight_changes"
+]
+
+
+def _grouped(db: Session, query) -> Dict[str, tuple]:
+    """Run a query whose first column is the client id, keyed by that id"""
+    return {row[0]: tuple(row[1:]) for row in db.execute(query)}
+
+
+def _is_changed(old, new) -> bool:
+    if isinstance(old, float) or isinstance(new, float):
+        if old is None or new is None:
+            return old is not new
+        return round(old, 4) != round(new, 4)
+    return old != new
+
+
+def compute_client_metrics(db: Session, client_ids: List[str]) -> Dict[str, dict]:
+    """
+    Recomputed values of RECOMPUTED_FIELDS for the given clients
+    A fixed number of GROUP BY queries per batch, whatever the batch size or history length
+    """
+    completed = WorkoutSession.end_time.isnot(None)
+
+    workouts = _grouped(db, select(
+        WorkoutSession.user_id,
+        func.count(),
+        func.sum(duration_seconds(db, WorkoutSession.start_time, WorkoutSession.end_time)),
+        func.max(WorkoutSession.end_time)
+    ).where(WorkoutSession.user_id.in_(client_ids), completed).group_by(WorkoutSession.user_id))
+
+    cardio = _grouped(db, select(
+        CardioSession.user_id,
+        func.count(),
+        func.sum(CardioSession.duration),
+        func.max(CardioSession.start_time)
+    ).where(CardioSession.user_id.in_(client_ids)).group_by(CardioSession.user_id))
+
+    activity_days = union(
+        select(WorkoutSession.user_id, activity_day(db, WorkoutSession.start_time).label("day")).where(
+            WorkoutSession.user_id.in_(client_ids), completed
+        ),
+        select(CardioSession.user_id, activity_day(db, CardioSession.start_time).label("day")).where(
+            CardioSession.user_id.in_(client_ids)
+        )
+    ).subquery()
+    training_days = _grouped(db, select(activity_days.c.user_id, func.count()).group_by(activity_days.c.user_id))
+
+    # Sets/reps are free text: aggregate per distinct value, then parse the (few) distinct values
+    sets_reps = {}
+    log_values = db.execute(
+        select(
+            WorkoutSession.user_id,
+            ExerciseLog.sets_completed,
+            ExerciseLog.reps_completed,
+            func.count()
+        ).join(WorkoutSession, ExerciseLog.session_id == WorkoutSession.id).where(
+            WorkoutSession.user_id.in_(client_ids), completed
+        ).group_by(WorkoutSession.user_id, ExerciseLog.sets_completed, ExerciseLog.reps_completed)
+    )
+    for user_id, sets_value, reps_value, log_count in log_values:
+        total_sets, total_reps = sets_reps.get(user_id, (0, 0))
+        sets_reps[user_id] = (
+            total_sets + parse_count(sets_value) * log_count,
+            total_reps + parse_count(reps_value) * log_count
+        )
+
+    weights = _grouped(db, select(
+        WeightHistory.user_id,
+        func.count(),
+        func.min(WeightHistory.weight),
+        func.max(WeightHistory.weight),
+        func.sum(WeightHistory.days_since_last_change),
+        func.count(WeightHistory.days_since_last_change)
+    ).where(WeightHistory.user_id.in_(client_ids)).group_by(WeightHistory.user_id))
+
+    rows = db.execute(
+        select(ClientMetrics, User.weight).join(User, User.id == ClientMetrics.client_id).where(
+            ClientMetrics.client_id.in_(client_ids)
+        )
+    ).all()
+
+    results = {}
+    for metrics, user_weight in rows:
+        client_id = metrics.client_id
+        workout_count, workout_seconds, last_workout = workouts.get(client_id, (0, None, None))
+        cardio_count, cardio_minutes, last_cardio = cardio.get(client_id, (0, None, None))
+        (days,) = training_days.get(client_id, (0,))
+        total_sets, total_reps = sets_reps.get(client_id, (0, 0))
+        weight_changes, min_weight, max_weight, days_between_sum, days_between_count = weights.get(
+            client_id, (0, None, None, None, 0)
+        )
+
+        training_hours = (workout_seconds or 0) / 3600 + (cardio_minutes or 0) / 60.0
+        known_weights = [w for w in (metrics.initial_weight, user_weight, min_weight, max_weight) if w is not None]
+        activity_dates = [d for d in (last_workout, last_cardio) if d is not None]
+
+        consistency = metrics.consistency_percentage
+        if metrics.client_since:
+            days_since_start = days_since(metrics.client_since)
+            consistency = (days / days_since_start) * 100 if days_since_start > 0 else 0.0
+
+        results[client_id] = {
+            "total_workouts_completed": workout_count,
+            "total_cardio_sessions": cardio_count,
+            "total_training_hours": training_hours,
+            "total_training_days": days,
+            "total_sets_completed": total_sets,
+            "total_reps_completed": total_reps,
+            "average_workout_duration_minutes": (workout_seconds or 0) / 60 / workout_count if workout_count else None,
+            "last_activity_date": max(activity_dates) if activity_dates else None,
+            "consistency_percentage": consistency,
+            "current_weight": user_weight,
+            "lowest_weight": min(known_weights) if known_weights else None,
+            "highest_weight": max(known_weights) if known_weights else None,
+            "total_weight_changes": weight_changes,
+            "average_days_between_weight_changes": (
+                (days_between_sum or 0) / days_between_count if days_between_count else None
+            )
+        }
+
+    return results
+
+
+def recompute_client_metrics(
+    db: Session, client_ids: List[str], dry_run: bool = False, max_attempts: int = 3
+) -> Dict[str, dict]:
+    """
+    Recompute ClientMetrics for a batch of clients and return the differences
+    as {client_id: {field: (old, new)}} for clients whose metrics changed.
+    Unless dry_run, writes the new values, rebuilds the clients' user_activity_days and
+    marks their pending metrics events processed, then commits.
+    Retried when PostgreSQL reports a conflict with a concurrent metrics event update.
+    Call it with no transaction open on db (e.g. a fresh session), so it can pick the isolation level.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return _recompute_client_metrics(db, client_ids, dry_run)
+        except OperationalError as e:
+            db.rollback()
+            if attempt == max_attempts or getattr(e.orig, "pgcode", None) != "40001":  # serialization_failure
+                raise
+
+
+def _recompute_client_metrics(db: Session, client_ids: List[str], dry_run: bool) -> Dict[str, dict]:
+    pending_events = []
+    if not dry_run:
+        # The totals below already include the activity of every pending event, which must
+        # therefore not be applied again. One snapshot for the whole transaction makes the
+        # pending events and the activity rows the aggregates see the same set; events
+        # committed later are not in either and are applied on top as usual.
+        if db.get_bind().dialect.name == "postgresql":
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        # Not SKIP LOCKED: an event being applied right now must finish first (then this
+        # transaction fails with a serialization error and is retried)
+        pending_events = db.execute(
+            select(MetricsEvent.id, MetricsEvent.user_id).where(
+                MetricsEvent.user_id.in_(client_ids),
+                MetricsEvent.processed_at.is_(None)
+            ).with_for_update()
+        ).all()
+
+    recomputed = compute_client_metrics(db, client_ids)
+    metrics_rows = db.query(ClientMetrics).filter(ClientMetrics.client_id.in_(list(recomputed))).all()
+
+    differences = {}
+    for metrics in metrics_rows:
+        new_values = recomputed[metrics.client_id]
+        changed = {
+            field: (getattr(metrics, field), new_values[field])
+            for field in RECOMPUTED_FIELDS
+            if _is_changed(getattr(metrics, field), new_values[field])
+        }
+        if changed:
+            differences[metrics.client_id] = changed
+            if not dry_run:
+                for field, (_, value) in changed.items():
+                    setattr(metrics, field, value)
+
+    if dry_run:
+        db.rollback()
+        return differences
+
+    # Keep the incremental training-day counter in step with the recomputed total
+    db.execute(delete(UserActivityDay).where(UserActivityDay.user_id.in_(client_ids)))
+    db.execute(
+        dialect_insert(db, UserActivityDay).from_select(
+            ["user_id", "day"],
+            union(
+                select(WorkoutSession.user_id, activity_day(db, WorkoutSession.start_time)).where(
+                    WorkoutSession.user_id.in_(client_ids), WorkoutSession.end_time.isnot(None)
+                ),
+                select(CardioSession.user_id, activity_day(db, CardioSession.start_time)).where(
+                    CardioSession.user_id.in_(client_ids)
+                )
+            )
+        )
+    )
+    # Only clients with a metrics row were recomputed; others keep their events
+    pending_event_ids = [event_id for event_id, user_id in pending_events if user_id in recomputed]
+    if pending_event_ids:
+        db.query(MetricsEvent).filter(MetricsEvent.id.in_(pending_event_ids)).update(
+            {MetricsEvent.processed_at: datetime.now()}, synchronize_session=False
+        )
+    db.commit()
+
+    return differences
@@ -3,19 +3,43 @@ Service for managing client metrics and tracking progress
 This service automatically updates metrics when workouts are completed or weight is changed
 """
 
+import re
+from sqlalchemy import select, func, and_
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from datetime import datetime, timedelta
+from app.db.database import dialect_insert
 from app.models.models import (
     ClientMetrics, WeightHistory, User, WorkoutSession,
-    CardioSession, ExerciseLog
+    CardioSession, ExerciseLog, UserActivityDay
 )
-from typing import Optional
+from typing import Optional, Sequence, Tuple
+# Registers the hooks that invalidate trainer summaries on ClientMetrics commits, also in
+# processes that never serve the summary (metrics_worker.py, recompute_metrics.py)
+from app.services import trainer_summary  # noqa: F401
+
+# Trend windows (days) reported by calculate_client_progress when none are requested
+DEFAULT_PROGRESS_WINDOWS = (30,)
+
+
+def parse_count(value: Optional[str]) -> int:
+    """
+    Leading number of a free-text sets/reps value ("10", "10-12" -> 10)
+    Values without a number ("Max") count as 0
+    """
+    match = re.match(r"\s*(\d+)", value or "")
+    return int(match.group(1)) if match else 0
+
+
+def days_since(moment: datetime) -> int:
+    """Whole days from moment until now (works for naive and timezone-aware values)"""
+    now = datetime.now(moment.tzinfo) if moment.tzinfo else datetime.now()
+    return (now - moment).days
 
 
 def get_or_create_client_metrics(db: Session, client_id: str, personal_trainer_id: Optional[str] = None) -> ClientMetrics:
     """
     Get existing metrics or create new ones for a client
+    Does not commit - the caller commits together with its own changes
     """
     metrics = db.query(ClientMetrics).filter(ClientMetrics.client_id == client_id).first()
 
@@ -32,7 +56,7 @@ def get_or_create_client_metrics(db: Session, client_id: str, personal_trainer_i
             highest_weight=client.weight if client else None
         )
         db.add(metrics)
-        db.commit()
+        db.flush()
         db.refresh(metrics)
 
     return metrics
@@ -41,7 +65,7 @@ def get_or_create_client_metrics(db: Session, client_id: str, personal_trainer_i
 def update_metrics_after_workout(db: Session, workout_session_id: str) -> None:
     """
     Update client metrics after a workout session is completed
-    Called when a workout session is marked as complete (end_time is set)
+    Applied by the metrics event queue for each "session_ended" event; does not commit
     """
     session = db.query(WorkoutSession).filter(WorkoutSession.id == workout_session_id).first()
 
@@ -62,8 +86,11 @@ def update_metrics_after_workout(db: Session, workout_session_id: str) -> None:
     metrics.total_training_hours += duration_hours
     metrics.last_activity_date = session.end_time
 
-    # Calculate average workout duration
-    metrics.average_workout_duration_minutes = (metrics.total_training_hours * 60) / metrics.total_workouts_completed
+    # Running average of workout durations (cardio time is not part of it)
+    previous_average = metrics.average_workout_duration_minutes or 0.0
+    metrics.average_workout_duration_minutes = previous_average + (
+        duration_seconds / 60 - previous_average
+    ) / metrics.total_workouts_completed
 
     # Count sets and reps from exercise logs
     exercise_logs = db.query(ExerciseLog).filter(ExerciseLog.session_id == workout_session_id).all()
@@ -72,21 +99,20 @@ def update_metrics_after_workout(db: Session, workout_session_id: str) -> None:
             metrics.total_sets_completed = 0
         if metrics.total_reps_completed is None:
             metrics.total_reps_completed = 0
-        metrics.total_sets_completed += log.sets_completed
-        metrics.total_reps_completed += log.reps_completed
+        metrics.total_sets_completed += parse_count(log.sets_completed)
+        metrics.total_reps_completed += parse_count(log.reps_completed)
 
     # Update unique training days
-    update_training_days(db, metrics, session.user_id)
+    update_training_days(db, metrics, session.user_id, session.start_time)
 
     # Update consistency percentage
     update_consistency_percentage(db, metrics)
 
-    db.commit()
-
 
 def update_metrics_after_cardio(db: Session, cardio_session_id: str) -> None:
     """
     Update client metrics after a cardio session is completed
+    Applied by the metrics event queue for each "cardio_logged" event; does not commit
     """
     from app.models.models import CardioSession
 
@@ -109,36 +135,29 @@ def update_metrics_after_cardio(db: Session, cardio_session_id: str) -> None:
     metrics.total_training_hours += cardio_hours
 
     # Update unique training days
-    update_training_days(db, metrics, cardio.user_id)
+    update_training_days(db, metrics, cardio.user_id, cardio.start_time)
 
     # Update consistency percentage
     update_consistency_percentage(db, metrics)
 
-    db.commit()
-
 
-def update_training_days(db: Session, metrics: ClientMetrics, user_id: str) -> None:
+def update_training_days(db: Session, metrics: ClientMetrics, user_id: str, activity_time: datetime) -> None:
     """
-    Calculate total unique days with training activity
+    Record the day of a training activity and count it if it is a new day
+    A single INSERT ... ON CONFLICT DO NOTHING against user_activity_days, so the
+    cost does not depend on how much history the user has
     """
-    # Get all unique dates with workout sessions
-    workout_dates = db.query(
-        func.date(WorkoutSession.start_time).label('date')
-    ).filter(
-        WorkoutSession.user_id == user_id,
-        WorkoutSession.end_time.isnot(None)
-    ).distinct().all()
-
-    # Get all unique dates with cardio sessions
-    cardio_dates = db.query(
-        func.date(CardioSession.start_time).label('date')
-    ).filter(
-        CardioSession.user_id == user_id
-    ).distinct().all()
+    result = db.execute(
+        dialect_insert(db, UserActivityDay).values(
+            user_id=user_id,
+            day=activity_time.date()
+        ).on_conflict_do_nothing(
+            index_elements=[UserActivityDay.user_id, UserActivityDay.day]
+        )
+    )
 
-    # Combine and count unique dates
-    all_dates = set([d.date for d in workout_dates] + [d.date for d in cardio_dates])
-    metrics.total_training_days = len(all_dates)
+    if result.rowcount:
+        metrics.total_training_days = (metrics.total_training_days or 0) + 1
 
 
 def update_consistency_percentage(db: Session, metrics: ClientMetrics) -> None:
@@ -148,7 +167,7 @@ def update_consistency_percentage(db: Session, metrics: ClientMetrics) -> None:
     if not metrics.client_since:
         return
 
-    days_since_start = (datetime.now() - metrics.client_since).days
+    days_since_start = days_since(metrics.client_since)
 
     if days_since_start > 0:
         metrics.consistency_percentage = (metrics.total_training_days / days_since_start) * 100
@@ -174,7 +193,7 @@ def track_weight_change(db: Session, user_id: str, new_weight: float, notes: Opt
     # Calculate days since last change
     days_since_last = None
     if last_record:
-        days_since_last = (datetime.now() - last_record.recorded_at).days
+        days_since_last = days_since(last_record.recorded_at)
 
     # Create new weight history record
     weight_history = WeightHistory(
@@ -248,14 +267,63 @@ def reset_client_workouts(db: Session, client_id: str) -> dict:
     }
 
 
-def calculate_client_progress(db: Session, client_id: str) -> dict:
+def workout_trend(recent: int, previous: int) -> str:
+    """Compare workout counts of two consecutive windows"""
+    if recent > previous:
+        return "improving"
+    if recent < previous:
+        return "declining"
+    return "stable"
+
+
+def calculate_client_progress(
+    db: Session,
+    client_id: str,
+    windows: Sequence[int] = DEFAULT_PROGRESS_WINDOWS
+) -> Tuple[Optional[User], Optional[dict]]:
     """
     Calculate comprehensive progress metrics for a client
+    Loads the client, their metrics and the workout counts of every trend window
+    (last N days vs the N days before) in a single query using COUNT(*) FILTER.
+    Returns (client, progress); client is None if the user does not exist and
+    progress is None if they have no metrics yet.
     """
-    metrics = db.query(ClientMetrics).filter(ClientMetrics.client_id == client_id).first()
+    # The 30-day window always backs the original recent/previous_workouts_30_days fields
+    all_windows = sorted(set(windows) | {30})
+    now = datetime.now()
+
+    window_counts = []
+    for days in all_windows:
+        window_start = now - timedelta(days=days)
+        previous_start = now - timedelta(days=2 * days)
+        window_counts.append(
+            func.count(WorkoutSession.id).filter(WorkoutSession.start_time >= window_start).label(f"recent_{days}")
+        )
+        window_counts.append(
+            func.count(WorkoutSession.id).filter(
+                WorkoutSession.start_time >= previous_start,
+                WorkoutSession.start_time < window_start
+            ).label(f"previous_{days}")
+        )
 
+    row = db.execute(
+        select(User, ClientMetrics, *window_counts).outerjoin(
+            ClientMetrics, ClientMetrics.client_id == User.id
+        ).outerjoin(
+            WorkoutSession, and_(
+                WorkoutSession.user_id == User.id,
+                WorkoutSession.end_time.isnot(None),
+                WorkoutSession.start_time >= now - timedelta(days=2 * all_windows[-1])
+            )
+        ).where(User.id == client_id).group_by(User.id, ClientMetrics.id)
+    ).first()
+
+    if row is None:
+        return None, None
+
+    client, metrics = row[0], row[1]
     if not metrics:
-        return None
+        return client, None
 
     # Calculate weight change since start
     weight_change = None
@@ -264,43 +332,31 @@ def calculate_client_progress(db: Session, client_id: str) -> dict:
         weight_change = metrics.current_weight - metrics.initial_weight
         weight_change_percentage = (weight_change / metrics.initial_weight) * 100
 
-    # Get recent workout trend (last 30 days vs previous 30 days)
-    today = datetime.now()
-    last_30_days = today - timedelta(days=30)
-    previous_60_to_30_days = today - timedelta(days=60)
-
-    recent_workouts = db.query(WorkoutSession).filter(
-        WorkoutSession.user_id == client_id,
-        WorkoutSession.start_time >= last_30_days,
-        WorkoutSession.end_time.isnot(None)
-    ).count()
-
-    previous_workouts = db.query(WorkoutSession).filter(
-        WorkoutSession.user_id == client_id,
-        WorkoutSession.start_time >= previous_60_to_30_days,
-        WorkoutSession.start_time < last_30_days,
-        WorkoutSession.end_time.isnot(None)
-    ).count()
-
-    trend = "stable"
-    if recent_workouts > previous_workouts:
-        trend = "improving"
-    elif recent_workouts < previous_workouts:
-        trend = "declining"
-
-    return {
+    counts = row._mapping
+    workout_trends = [
+        {
+            "window_days": days,
+            "recent_workouts": counts[f"recent_{days}"],
+            "previous_workouts": counts[f"previous_{days}"],
+            "trend": workout_trend(counts[f"recent_{days}"], counts[f"previous_{days}"])
+        }
+        for days in dict.fromkeys(windows)
+    ]
+
+    return client, {
         "total_workouts": metrics.total_workouts_completed,
-        "total_training_hours": round(metrics.total_training_hours, 2),
+        "total_training_hours": round(metrics.total_training_hours or 0, 2),
         "total_training_days": metrics.total_training_days,
         "consistency_percentage": round(metrics.consistency_percentage, 1) if metrics.consistency_percentage else 0,
         "average_workout_duration": round(metrics.average_workout_duration_minutes, 1) if metrics.average_workout_duration_minutes else 0,
         "weight_change_kg": round(weight_change, 2) if weight_change else None,
         "weight_change_percentage": round(weight_change_percentage, 1) if weight_change_percentage else None,
-        "recent_workout_trend": trend,
-        "recent_workouts_30_days": recent_workouts,
-        "previous_workouts_30_days": previous_workouts,
+        "recent_workout_trend": workout_trend(counts["recent_30"], counts["previous_30"]),
+        "recent_workouts_30_days": counts["recent_30"],
+        "previous_workouts_30_days": counts["previous_30"],
+        "workout_trends": workout_trends,
         "total_sets": metrics.total_sets_completed,
         "total_reps": metrics.total_reps_completed,
         "times_reset": metrics.times_workouts_reset,
-        "days_since_start": (datetime.now() - metrics.client_since).days if metrics.client_since else 0
+        "days_since_start": days_since(metrics.client_since) if metrics.client_since else 0
     }
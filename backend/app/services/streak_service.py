@@ -0,0 +1,60 @@
+"""
+Service for the activity streak (consecutive days with a workout or cardio session)
+The streak is recomputed with one gaps-and-islands query over the daily_user_activity
+rollup whenever activity is written and stored on the user, so reading it (dashboard)
+never touches session history
+"""
+
+from datetime import date
+from typing import Optional, Tuple
+from sqlalchemy import select, func, desc
+from sqlalchemy.orm import Session
+from app.core.user_cache import publish_user_change
+from app.db.expressions import day_number
+from app.models.models import User, DailyUserActivity
+
+
+def calculate_latest_streak(db: Session, user_id: str) -> Tuple[int, Optional[date]]:
+    """
+    Length and last day of the user's most recent run of consecutive active days
+    Days minus their row number are constant within a run (gaps-and-islands)
+    """
+    numbered_days = select(
+        DailyUserActivity.day,
+        (
+            day_number(db, DailyUserActivity.day) - func.row_number().over(order_by=DailyUserActivity.day)
+        ).label("island")
+    ).where(DailyUserActivity.user_id == user_id).subquery()
+
+    latest_island = db.execute(
+        select(
+            func.max(numbered_days.c.day).label("last_day"),
+            func.count().label("length")
+        ).group_by(numbered_days.c.island).order_by(desc("last_day")).limit(1)
+    ).first()
+
+    if latest_island is None:
+        return 0, None
+    return latest_island.length, latest_island.last_day
+
+
+def update_user_streak(db: Session, user_id: str) -> None:
+    """
+    Recompute and store the user's streak after activity was added or removed
+    Run after the day's rollup row is refreshed. Does not commit - runs in the same
+    transaction as the activity change
+    """
+    user = db.get(User, user_id)
+    if not user:
+        return
+
+    user.current_streak, user.last_active_date = calculate_latest_streak(db, user_id)
+    publish_user_change(db, user_id)
+
+
+def get_active_streak(user: User, today: Optional[date] = None) -> int:
+    """Active streak as shown on the dashboard: the stored run, if it includes today"""
+    today = today or date.today()
+    if user.last_active_date != today:
+        return 0
+    return user.current_streak or 0
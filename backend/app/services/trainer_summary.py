@@ -0,0 +1,120 @@
+"""
+Service for the Personal Trainer dashboard summary
+Aggregates all of a trainer's client metrics in one query and caches the result per trainer;
+the cache entry is dropped whenever a commit touches one of that trainer's ClientMetrics rows,
+in every process: the change is published like a user change (see app/core/user_cache.py),
+so API workers also drop summaries updated by metrics_worker.py or another worker
+"""
+
+from sqlalchemy import select, func, desc, or_, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.user_cache import publish_user_change, register_user_keyed_cache
+from app.models.models import ClientMetrics, User
+
+summary_cache = TTLCache(settings.TRAINER_SUMMARY_CACHE_SECONDS)
+register_user_keyed_cache(summary_cache)
+
+EMPTY_SUMMARY = {
+    "total_clients": 0,
+    "total_workouts_all_clients": 0,
+    "total_training_hours_all_clients": 0,
+    "average_client_consistency": 0,
+    "most_active_client": None,
+    "most_consistent_client": None
+}
+
+
+async def calculate_trainer_summary(db: AsyncSession, trainer_id: str) -> dict:
+    """
+    Totals, average consistency and the top clients of a trainer in a single query
+    Window functions compute the totals and rank clients; only the top-ranked rows are returned
+    """
+    workouts = func.coalesce(ClientMetrics.total_workouts_completed, 0)
+    consistency = func.coalesce(ClientMetrics.consistency_percentage, 0.0)
+
+    ranked_clients = select(
+        User.name,
+        workouts.label("workouts"),
+        consistency.label("consistency"),
+        func.count().over().label("total_clients"),
+        func.sum(workouts).over().label("total_workouts"),
+        func.sum(func.coalesce(ClientMetrics.total_training_hours, 0.0)).over().label("total_hours"),
+        func.avg(consistency).over().label("average_consistency"),
+        func.row_number().over(order_by=desc(workouts)).label("activity_rank"),
+        func.row_number().over(order_by=desc(consistency)).label("consistency_rank")
+    ).join(User, User.id == ClientMetrics.client_id).where(
+        ClientMetrics.personal_trainer_id == trainer_id
+    ).subquery()
+
+    rows = (await db.execute(
+        select(ranked_clients).where(
+            or_(ranked_clients.c.activity_rank == 1, ranked_clients.c.consistency_rank == 1)
+        )
+    )).all()
+
+    if not rows:
+        return dict(EMPTY_SUMMARY)
+
+    most_active = next(row for row in rows if row.activity_rank == 1)
+    most_consistent = next(row for row in rows if row.consistency_rank == 1)
+
+    return {
+        "total_clients": rows[0].total_clients,
+        "total_workouts_all_clients": rows[0].total_workouts,
+        "total_training_hours_all_clients": round(rows[0].total_hours, 2),
+        "average_client_consistency": round(rows[0].average_consistency, 1),
+        "most_active_client": {
+            "name": most_active.name,
+            "workouts": most_active.workouts
+        },
+        "most_consistent_client": {
+            "name": most_consistent.name,
+            "consistency": round(most_consistent.consistency, 1)
+        }
+    }
+
+
+async def get_trainer_summary(db: AsyncSession, trainer_id: str) -> dict:
+    """
+    Dashboard summary for a trainer, served from the cache when possible
+    db must be a primary session: a summary read from a replica that has not caught up with
+    the commit that invalidated the cache would be cached for the whole TTL
+    """
+    summary = summary_cache.get(trainer_id)
+    if summary is None:
+        summary = await calculate_trainer_summary(db, trainer_id)
+        summary_cache.set(trainer_id, summary)
+    return summary
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_trainers(session: Session, flush_context) -> None:
+    """
+    Remember which trainers' summaries a pending transaction changes, and notify the other
+    processes (the notification is delivered when the transaction commits)
+    """
+    changed = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, ClientMetrics):
+            trainer_history = inspect(obj).attrs.personal_trainer_id.history
+            changed.update(t for t in (*trainer_history.sum(), obj.personal_trainer_id) if t)
+
+    trainers = session.info.setdefault("summary_trainer_ids", set())
+    unpublished = changed - trainers
+    if unpublished:
+        trainers.update(unpublished)
+        publish_user_change(session, *unpublished)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_trainers(session: Session) -> None:
+    for trainer_id in session.info.pop("summary_trainer_ids", ()):
+        summary_cache.invalidate(trainer_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_trainers(session: Session) -> None:
+    session.info.pop("summary_trainer_ids", None)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Script to (re)build the last performance table (user_exercise_last) from workout history
+Usage:
+    python backfill_exercise_last.py                 # Rebuild for all users
+    python backfill_exercise_last.py --email user@example.com
+    python backfill_exercise_last.py --username john_doe
+"""
+
+import sys
+import os
+import argparse
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.database import SessionLocal
+from app.models.models import User
+from app.services.exercise_history_service import rebuild_last_performance
+
+
+def find_user(db, email=None, username=None):
+    """Find user by email or username"""
+    if email:
+        return db.query(User).filter(User.email == email).first()
+    return db.query(User).filter(User.username == username).first()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild last weight/sets/reps per user and exercise')
+    parser.add_argument('--email', type=str, help='Rebuild only for user with this email')
+    parser.add_argument('--username', type=str, help='Rebuild only for user with this username')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+
+    try:
+        print("=" * 80)
+        print("BACKFILL EXERCISE HISTORY (LAST PERFORMANCE)")
+        print("=" * 80)
+        print()
+
+        user_id = None
+        if args.email or args.username:
+            user = find_user(db, args.email, args.username)
+            if not user:
+                print(f"❌ User not found: {args.email or args.username}")
+                return
+            user_id = user.id
+            print(f"Rebuilding for: {user.name} ({user.email})")
+        else:
+            print("Rebuilding for all users...")
+
+        rows = rebuild_last_performance(db, user_id=user_id)
+        db.commit()
+
+        print(f"\n✅ Stored last performance for {rows} user/exercise pairs!")
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.db.database import SessionLocal
 from app.models.models import User
+from app.core.user_cache import publish_user_change
 
 
 def delete_user(db, user):
@@ -47,6 +48,7 @@ def delete_user(db, user):
 
         # Delete user (cascade will handle related records)
         db.delete(user)
+        publish_user_change(db, user.id)
         db.commit()
 
         print(f"✅ Successfully deleted user: {user_info}")
@@ -144,6 +146,7 @@ def interactive_mode(db):
                 # Delete without additional confirmation since we already confirmed
                 try:
                     db.delete(user)
+                    publish_user_change(db, user.id)
                     db.commit()
                     print(f"✅ Deleted: {user.name} ({user.email})")
                     success_count += 1
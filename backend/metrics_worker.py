@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Worker that applies queued metrics events (workout ended, cardio logged) to ClientMetrics
+Set METRICS_EXTERNAL_WORKER=true on the API when this worker runs
+Usage:
+    python metrics_worker.py                 # Poll forever
+    python metrics_worker.py --once          # Drain the queue once and exit
+    python metrics_worker.py --interval 2    # Poll every 2 seconds
+"""
+
+import sys
+import os
+import time
+import argparse
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.services.metrics_events import process_pending_events, purge_processed_events
+
+
+def drain_queue():
+    """Apply every pending event, returns the number applied"""
+    db = SessionLocal()
+    try:
+        total = 0
+        while True:
+            processed = process_pending_events(db)
+            total += processed
+            if processed == 0:
+                purged = purge_processed_events(db)
+                if purged:
+                    print(f"✓ Deleted {purged} processed metrics event(s)")
+                return total
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply queued metrics events to ClientMetrics')
+    parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+    parser.add_argument('--interval', type=int, default=settings.METRICS_WORKER_POLL_SECONDS,
+                        help='Seconds between polls')
+
+    args = parser.parse_args()
+
+    if args.once:
+        print(f"✅ Applied {drain_queue()} metrics event(s)")
+        return
+
+    print(f"Metrics worker started (polling every {args.interval}s)")
+    while True:
+        processed = drain_queue()
+        if processed:
+            print(f"✓ Applied {processed} metrics event(s)")
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n👋 Metrics worker stopped")
+        sys.exit(0)
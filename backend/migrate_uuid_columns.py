@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Script to convert the id / foreign key columns to native UUID on a populated database (PostgreSQL)
+Online alternative to migration 0014, which rewrites every table under an exclusive lock.
+
+1. Prepare, backfill and index (old API version keeps running, resumable):
+   - adds a shadow <column>__uuid column per id column, kept in sync by a trigger
+   - backfills it in small batches, one transaction per batch
+   - validates NOT NULL checks and builds every affected index with CREATE INDEX CONCURRENTLY
+2. Swap (stop the API first, start the new version right after):
+   - one short transaction drops the old columns, renames the shadow columns and attaches
+     the prebuilt indexes as primary keys / unique constraints; no table is rewritten or scanned
+   - foreign keys are restored NOT VALID and validated afterwards without blocking writes
+Migration 0014 then finds nothing left to convert.
+
+Usage:
+    python migrate_uuid_columns.py                  # Steps 1 (run again to resume)
+    python migrate_uuid_columns.py --batch-size 2000
+    python migrate_uuid_columns.py --swap           # Step 2
+"""
+
+import sys
+import os
+import re
+import argparse
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from app.db.database import Base, engine
+from app.db.types import GUID
+import app.models.models  # noqa: F401 - registers the tables on Base.metadata
+
+SHADOW = "__uuid"
+UUID_PATTERN = "^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$"
+SWAP_LOCK_TIMEOUT = "5s"  # Give up instead of queueing every request behind a long transaction
+
+
+def pending_columns(conn):
+    """{table: [(column, nullable)]} for GUID model columns that are still VARCHAR in the database"""
+    pending = {}
+    for table in Base.metadata.sorted_tables:
+        guid_columns = [column.name for column in table.columns if isinstance(column.type, GUID)]
+        if not guid_columns:
+            continue
+        rows = conn.execute(text(
+            "SELECT column_name, is_nullable = 'YES' FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table "
+            "AND data_type = 'character varying' AND column_name = ANY(:columns)"
+        ), {"table": table.name, "columns": guid_columns}).all()
+        if rows:
+            nullable = dict(rows)
+            pending[table.name] = [(column, nullable[column]) for column in guid_columns if column in nullable]
+    return pending
+
+
+def to_uuid(column):
+    """Same cast as migration 0014: legacy ids that are not UUIDs map to md5(id) on every table"""
+    return f"CASE WHEN {column} ~ '{UUID_PATTERN}' THEN {column}::uuid ELSE md5({column})::uuid END"
+
+
+def not_null_check(table, column):
+    return f"{table}_{column}{SHADOW}_not_null"
+
+
+def shadow_index_name(name):
+    return f"{name[:63 - len(SHADOW)]}{SHADOW}"
+
+
+def affected_indexes(conn, table, columns):
+    """Indexes of a table that involve converted columns: (name, definition, constraint name, constraint type)"""
+    rows = conn.execute(text(
+        "SELECT ic.relname, pg_get_indexdef(i.indexrelid), con.conname, con.contype "
+        "FROM pg_index i "
+        "JOIN pg_class ic ON ic.oid = i.indexrelid "
+        "LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.contype IN ('p', 'u') "
+        "WHERE i.indrelid = CAST(:table AS regclass)"
+    ), {"table": table}).all()
+    return [
+        row for row in rows
+        if not row[0].endswith(SHADOW)
+        and any(re.search(rf"\b{column}\b", row[1].split(" USING ", 1)[1]) for column in columns)
+    ]
+
+
+def prepare(conn, pending):
+    """Shadow columns, NOT NULL checks (NOT VALID) and sync triggers - each table in its own short transaction"""
+    for table, columns in pending.items():
+        with conn.begin():
+            conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+            for column, nullable in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}{SHADOW} uuid"))
+                check = not_null_check(table, column)
+                exists = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": check}).first()
+                if not nullable and not exists:
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({column}{SHADOW} IS NOT NULL) NOT VALID"
+                    ))
+
+            assignments = " ".join(f"NEW.{column}{SHADOW} := {to_uuid('NEW.' + column)};" for column, _ in columns)
+            conn.execute(text(
+                f"CREATE OR REPLACE FUNCTION {table}{SHADOW}_sync() RETURNS trigger AS $$ "
+                f"BEGIN {assignments} RETURN NEW; END $$ LANGUAGE plpgsql"
+            ))
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {table}{SHADOW}_sync ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER {table}{SHADOW}_sync BEFORE INSERT OR UPDATE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION {table}{SHADOW}_sync()"
+            ))
+        print(f"✓ Prepared {table}")
+
+
+def backfill(conn, pending, batch_size):
+    """Fill the shadow columns of existing rows, walking the primary key in batches"""
+    for table, columns in pending.items():
+        key = ", ".join(column.name for column in Base.metadata.tables[table].primary_key.columns)
+        key_params = ", ".join(f":k{i}" for i in range(len(key.split(", "))))
+        assignments = ", ".join(f"{column}{SHADOW} = {to_uuid(column)}" for column, _ in columns)
+        missing = " OR ".join(f"({column} IS NOT NULL AND {column}{SHADOW} IS NULL)" for column, _ in columns)
+
+        last, updated = None, 0
+        while True:
+            after = f"WHERE ({key}) > ({key_params})" if last else ""
+            params = {f"k{i}": value for i, value in enumerate(last or ())}
+
+            with conn.begin():
+                upper = conn.execute(
+                    text(f"SELECT {key} FROM {table} {after} ORDER BY {key} OFFSET :offset LIMIT 1"),
+                    {**params, "offset": batch_size - 1}
+                ).first()
+
+                bounds = [f"({key}) > ({key_params})"] if last else []
+                if upper:
+                    bounds.append(f"({key}) <= ({key_params.replace(':k', ':u')})")
+                    params.update({f"u{i}": value for i, value in enumerate(upper)})
+                where = " AND ".join(bounds + [f"({missing})"])
+
+                updated += conn.execute(text(f"UPDATE {table} SET {assignments} WHERE {where}"), params).rowcount
+
+            if not upper:
+                break
+            last = tuple(upper)
+
+        print(f"✓ Backfilled {table} ({updated} row(s))")
+
+
+def build_indexes(conn, pending):
+    """Validate the NOT NULL checks and build the shadow indexes without blocking writes (autocommit)"""
+    conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+    for table, columns in pending.items():
+        for column, nullable in columns:
+            if not nullable:
+                conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {not_null_check(table, column)}"))
+
+        names = [column for column, _ in columns]
+        for name, definition, _, _ in affected_indexes(conn, table, names):
+            shadow = shadow_index_name(name)
+            invalid = conn.execute(text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": shadow}).first()
+            if invalid:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {shadow}"))
+
+            head, tail = definition.split(" USING ", 1)
+            for column in names:
+                tail = re.sub(rf"\b{column}\b", f"{column}{SHADOW}", tail)
+            head = re.sub(r"INDEX \S+ ON", f"INDEX CONCURRENTLY IF NOT EXISTS {shadow} ON", head, count=1)
+            conn.execute(text(f"{head} USING {tail}"))
+        print(f"✓ Indexed {table}")
+
+
+def verify(conn, pending):
+    """Every shadow value must match its source before the swap"""
+    for table, columns in pending.items():
+        missing = [
+            column for column, _ in columns
+            if not conn.execute(text(
+                "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+                "AND table_name = :table AND column_name = :column"
+            ), {"table": table, "column": f"{column}{SHADOW}"}).first()
+        ]
+        if missing:
+            raise Exception(f"{table} is not prepared ({', '.join(missing)}) - run without --swap first")
+
+        mismatch = " OR ".join(f"{column}{SHADOW} IS DISTINCT FROM {to_uuid(column)}" for column, _ in columns)
+        count = conn.execute(text(f"SELECT count(*) FROM {table} WHERE {mismatch}")).scalar()
+        if count:
+            raise Exception(f"{table} has {count} row(s) not backfilled - run without --swap first")
+
+
+def swap(conn, pending):
+    """Replace the VARCHAR columns by their shadow columns in one short transaction"""
+    tables = list(pending)
+    with conn.begin():
+        conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+
+        foreign_keys = conn.execute(text(
+            "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE contype = 'f' AND (conrelid::regclass::text = ANY(:tables) OR confrelid::regclass::text = ANY(:tables))"
+        ), {"tables": tables}).all()
+        for table, name, _ in foreign_keys:
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+
+        for table, columns in pending.items():
+            names = [column for column, _ in columns]
+            indexes = affected_indexes(conn, table, names)
+
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {table}{SHADOW}_sync ON {table}"))
+            conn.execute(text(f"DROP FUNCTION IF EXISTS {table}{SHADOW}_sync()"))
+
+            for column, nullable in columns:
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))  # Drops its old indexes too
+                conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column}{SHADOW} TO {column}"))
+                if not nullable:
+                    # Instant: the validated CHECK constraint proves there are no NULLs
+                    conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+                    conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {not_null_check(table, column)}"))
+
+            for name, _, constraint, constraint_type in indexes:
+                shadow = shadow_index_name(name)
+                if constraint_type == "p":
+                    conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT "{constraint}" PRIMARY KEY USING INDEX {shadow}'))
+                elif constraint_type == "u":
+                    conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT "{constraint}" UNIQUE USING INDEX {shadow}'))
+                else:
+                    conn.execute(text(f"ALTER INDEX {shadow} RENAME TO {name}"))
+
+        for table, name, definition in foreign_keys:
+            conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition} NOT VALID'))
+    print(f"✓ Swapped {len(tables)} table(s)")
+
+    # Validation scans the tables but only takes a SHARE UPDATE EXCLUSIVE lock
+    conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+    for table, name, _ in foreign_keys:
+        conn.execute(text(f'ALTER TABLE {table} VALIDATE CONSTRAINT "{name}"'))
+    print(f"✓ Validated {len(foreign_keys)} foreign key(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert id columns to native UUID without long locks')
+    parser.add_argument('--swap', action='store_true', help='Final cut-over (stop the API first)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per backfill transaction')
+
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("CONVERT ID COLUMNS TO UUID" + (" (SWAP)" if args.swap else ""))
+    print("=" * 80)
+    print()
+
+    if engine.dialect.name != "postgresql":
+        print("❌ Native UUID columns are only used on PostgreSQL.")
+        sys.exit(1)
+
+    with engine.connect() as conn:
+        with conn.begin():
+            pending = pending_columns(conn)
+
+        if not pending:
+            print("✅ Every id column is already UUID. Nothing to do.")
+            return
+
+        print(f"{sum(len(columns) for columns in pending.values())} column(s) in {len(pending)} table(s) to convert\n")
+
+        if args.swap:
+            with conn.begin():
+                verify(conn, pending)
+            swap(conn, pending)
+            print("\n✅ Columns converted! Start the new API version now (migration 0014 will be a no-op).")
+        else:
+            prepare(conn, pending)
+            backfill(conn, pending, args.batch_size)
+            build_indexes(conn, pending)
+            print("\n✅ Ready to swap. Stop the API, run with --swap, then start the new version.")
+
+
+if __name__ == "__main__":
+    main()
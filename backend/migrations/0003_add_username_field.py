@@ -18,7 +18,7 @@ steps = [
     step(
         """
         UPDATE users
-        SET username = SPLIT_PART(email, '@', 1) || '_' || SUBSTRING(id FROM 1 FOR 8)
+        SET username = SPLIT_PART(email, '@', 1) || '_' || SUBSTRING(id::text FROM 1 FOR 8)
         WHERE username IS NULL;
         """,
         ""
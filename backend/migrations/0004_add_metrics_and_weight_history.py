@@ -127,7 +127,7 @@ steps = [
         """
         INSERT INTO weight_history (id, user_id, weight, previous_weight, days_since_last_change, recorded_at)
         SELECT
-            CONCAT(id, '-initial') as id,
+            md5(CONCAT(id, '-initial'))::uuid as id,
             id as user_id,
             weight,
             NULL as previous_weight,
@@ -157,7 +157,7 @@ steps = [
             client_since
         )
         SELECT
-            CONCAT(u.id, '-metrics') as id,
+            md5(CONCAT(u.id, '-metrics'))::uuid as id,
             u.id as client_id,
             u.personal_trainer_id,
             u.weight as initial_weight,
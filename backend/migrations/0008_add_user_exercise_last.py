@@ -0,0 +1,47 @@
+"""
+Add user_exercise_last table - denormalized last weight/sets/reps per user and exercise
+Backfilled from completed workout sessions; maintained by the API when sessions close
+"""
+
+from yoyo import step
+
+__depends__ = {'0007_add_equipment_and_notes'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS user_exercise_last (
+            user_id VARCHAR NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            exercise_id VARCHAR NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
+            session_id VARCHAR REFERENCES workout_sessions(id) ON DELETE SET NULL,
+            weight_used FLOAT,
+            sets_completed VARCHAR,
+            reps_completed VARCHAR,
+            performed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (user_id, exercise_id)
+        );
+        """,
+        """
+        DROP TABLE IF EXISTS user_exercise_last;
+        """
+    ),
+
+    # Backfill from existing history (latest completed log per user and exercise)
+    step(
+        """
+        INSERT INTO user_exercise_last
+            (user_id, exercise_id, session_id, weight_used, sets_completed, reps_completed, performed_at)
+        SELECT DISTINCT ON (ws.user_id, el.exercise_id)
+            ws.user_id, el.exercise_id, el.session_id, el.weight_used,
+            el.sets_completed, el.reps_completed, el.completed_at
+        FROM exercise_logs el
+        JOIN workout_sessions ws ON ws.id = el.session_id
+        WHERE ws.end_time IS NOT NULL AND el.completed_at IS NOT NULL
+        ORDER BY ws.user_id, el.exercise_id, el.completed_at DESC
+        ON CONFLICT (user_id, exercise_id) DO NOTHING;
+        """,
+        """
+        DELETE FROM user_exercise_last;
+        """
+    ),
+]
@@ -0,0 +1,50 @@
+"""
+Add current_streak / last_active_date to users - activity streak maintained on write
+Backfilled with a gaps-and-islands query over completed workouts and cardio sessions
+"""
+
+from yoyo import step
+
+__depends__ = {'0008_add_user_exercise_last'}
+
+steps = [
+    step(
+        """
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS current_streak INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_date DATE;
+        """,
+        """
+        ALTER TABLE users DROP COLUMN IF EXISTS last_active_date;
+        ALTER TABLE users DROP COLUMN IF EXISTS current_streak;
+        """
+    ),
+
+    # Backfill: length and last day of each user's most recent run of consecutive active days
+    step(
+        """
+        WITH activity_days AS (
+            SELECT user_id, start_time::date AS day FROM workout_sessions WHERE end_time IS NOT NULL
+            UNION
+            SELECT user_id, start_time::date AS day FROM cardio_sessions
+        ),
+        numbered_days AS (
+            SELECT user_id, day,
+                   day - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day))::int AS island
+            FROM activity_days
+        ),
+        latest_runs AS (
+            SELECT DISTINCT ON (user_id) user_id, MAX(day) AS last_day, COUNT(*) AS length
+            FROM numbered_days
+            GROUP BY user_id, island
+            ORDER BY user_id, MAX(day) DESC
+        )
+        UPDATE users
+        SET current_streak = latest_runs.length, last_active_date = latest_runs.last_day
+        FROM latest_runs
+        WHERE users.id = latest_runs.user_id;
+        """,
+        """
+        UPDATE users SET current_streak = 0, last_active_date = NULL;
+        """
+    ),
+]
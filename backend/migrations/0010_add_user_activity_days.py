@@ -0,0 +1,44 @@
+"""
+Add user_activity_days table - one row per user and training day
+Backfilled from completed workouts and cardio sessions; total_training_days is
+re-synced from it so later increments start from the right count
+"""
+
+from yoyo import step
+
+__depends__ = {'0009_add_user_streak'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS user_activity_days (
+            user_id VARCHAR NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            PRIMARY KEY (user_id, day)
+        );
+        """,
+        """
+        DROP TABLE IF EXISTS user_activity_days;
+        """
+    ),
+
+    # Backfill from existing history
+    step(
+        """
+        INSERT INTO user_activity_days (user_id, day)
+        SELECT user_id, start_time::date FROM workout_sessions WHERE end_time IS NOT NULL
+        UNION
+        SELECT user_id, start_time::date FROM cardio_sessions
+        ON CONFLICT (user_id, day) DO NOTHING;
+
+        UPDATE client_metrics
+        SET total_training_days = (
+            SELECT COUNT(*) FROM user_activity_days
+            WHERE user_activity_days.user_id = client_metrics.client_id
+        );
+        """,
+        """
+        DELETE FROM user_activity_days;
+        """
+    ),
+]
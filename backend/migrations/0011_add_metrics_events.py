@@ -0,0 +1,40 @@
+"""
+Add metrics_events table - outbox of workout/cardio events whose ClientMetrics
+updates are applied outside the request by metrics_worker.py or the API in the background
+"""
+
+from yoyo import step
+
+__depends__ = {'0010_add_user_activity_days'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS metrics_events (
+            id VARCHAR PRIMARY KEY,
+            event_type VARCHAR NOT NULL,
+            entity_id VARCHAR NOT NULL,
+            user_id VARCHAR NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            processed_at TIMESTAMP WITH TIME ZONE,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            CONSTRAINT uq_metrics_events_type_entity UNIQUE (event_type, entity_id)
+        );
+        """,
+        """
+        DROP TABLE IF EXISTS metrics_events;
+        """
+    ),
+
+    # Pending events are looked up oldest first
+    step(
+        """
+        CREATE INDEX IF NOT EXISTS idx_metrics_events_pending
+        ON metrics_events(created_at) WHERE processed_at IS NULL;
+        """,
+        """
+        DROP INDEX IF EXISTS idx_metrics_events_pending;
+        """
+    ),
+]
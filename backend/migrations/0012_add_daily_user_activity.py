@@ -0,0 +1,77 @@
+"""
+Add daily_user_activity rollup - per user per day workouts, volume and cardio
+Backfilled from existing history; maintained by the API for the day of every session change
+"""
+
+from yoyo import step
+
+__depends__ = {'0011_add_metrics_events'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS daily_user_activity (
+            user_id VARCHAR NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            workout_count INTEGER NOT NULL DEFAULT 0,
+            training_minutes FLOAT NOT NULL DEFAULT 0,
+            sets_completed INTEGER NOT NULL DEFAULT 0,
+            reps_completed INTEGER NOT NULL DEFAULT 0,
+            total_volume FLOAT NOT NULL DEFAULT 0,
+            cardio_sessions INTEGER NOT NULL DEFAULT 0,
+            cardio_minutes INTEGER NOT NULL DEFAULT 0,
+            distance FLOAT NOT NULL DEFAULT 0,
+            calories_burned INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        );
+        """,
+        """
+        DROP TABLE IF EXISTS daily_user_activity;
+        """
+    ),
+
+    # Backfill: sets/reps are free text, only their leading number counts ('10-12' -> 10)
+    step(
+        """
+        INSERT INTO daily_user_activity (
+            user_id, day, workout_count, training_minutes, sets_completed, reps_completed,
+            total_volume, cardio_sessions, cardio_minutes, distance, calories_burned
+        )
+        SELECT user_id, day,
+               SUM(workout_count), SUM(training_minutes), SUM(sets_completed), SUM(reps_completed),
+               SUM(total_volume), SUM(cardio_sessions), SUM(cardio_minutes), SUM(distance), SUM(calories_burned)
+        FROM (
+            SELECT user_id, start_time::date AS day,
+                   1 AS workout_count, EXTRACT(EPOCH FROM end_time - start_time) / 60 AS training_minutes,
+                   0 AS sets_completed, 0 AS reps_completed, 0 AS total_volume,
+                   0 AS cardio_sessions, 0 AS cardio_minutes, 0 AS distance, 0 AS calories_burned
+            FROM workout_sessions
+            WHERE end_time IS NOT NULL
+
+            UNION ALL
+
+            SELECT user_id, day, 0, 0, sets, reps, sets * reps * weight, 0, 0, 0, 0
+            FROM (
+                SELECT ws.user_id, ws.start_time::date AS day,
+                       COALESCE(substring(el.sets_completed FROM '^ *([0-9]+)')::int, 0) AS sets,
+                       COALESCE(substring(el.reps_completed FROM '^ *([0-9]+)')::int, 0) AS reps,
+                       COALESCE(el.weight_used, 0) AS weight
+                FROM exercise_logs el
+                JOIN workout_sessions ws ON ws.id = el.session_id
+                WHERE ws.end_time IS NOT NULL
+            ) logs
+
+            UNION ALL
+
+            SELECT user_id, start_time::date, 0, 0, 0, 0, 0,
+                   1, duration, COALESCE(distance, 0), COALESCE(calories_burned, 0)
+            FROM cardio_sessions
+        ) activity
+        GROUP BY user_id, day
+        ON CONFLICT (user_id, day) DO NOTHING;
+        """,
+        """
+        DELETE FROM daily_user_activity;
+        """
+    ),
+]
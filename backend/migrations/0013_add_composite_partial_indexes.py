@@ -0,0 +1,66 @@
+"""
+Add composite and partial indexes matching the hot query shapes
+- workout_sessions (user_id, start_time DESC): history listing, active session lookup
+- workout_sessions (user_id, start_time DESC) INCLUDE (end_time) WHERE end_time IS NOT NULL:
+  completed-session aggregates (progress, metrics, rollup, exercise history)
+- exercise_logs (exercise_id, completed_at DESC): last performance per exercise
+- cardio_sessions (user_id, start_time DESC): cardio listing
+- login_attempts (identifier, attempted_at) WHERE success = false: lockout check
+The single-column user_id/exercise_id indexes from 0005 are prefixes of the new ones and are dropped.
+
+Built with CREATE INDEX CONCURRENTLY so writes are not blocked, which cannot run inside a
+transaction: this migration is non-transactional and every step is a single statement.
+An index left INVALID by an interrupted build is dropped and built again on the next run.
+"""
+
+from yoyo import step
+
+__depends__ = {'0012_add_daily_user_activity'}
+__transactional__ = False
+
+INDEXES = {
+    "ix_workout_sessions_user_start":
+        "ON workout_sessions (user_id, start_time DESC)",
+    "ix_workout_sessions_user_completed_start":
+        "ON workout_sessions (user_id, start_time DESC) INCLUDE (end_time) WHERE end_time IS NOT NULL",
+    "ix_exercise_logs_exercise_completed":
+        "ON exercise_logs (exercise_id, completed_at DESC)",
+    "ix_cardio_sessions_user_start":
+        "ON cardio_sessions (user_id, start_time DESC)",
+    "ix_login_attempts_identifier_failed":
+        "ON login_attempts (identifier, attempted_at) WHERE success = false",
+}
+
+# Superseded by the composite indexes above (name -> definition, to restore on rollback)
+REDUNDANT_INDEXES = {
+    "ix_workout_sessions_user_id": "ON workout_sessions (user_id)",
+    "ix_cardio_sessions_user_id": "ON cardio_sessions (user_id)",
+    "ix_exercise_logs_exercise_id": "ON exercise_logs (exercise_id)",
+}
+
+
+def create_index(name, definition):
+    def apply(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = %s AND NOT i.indisvalid",
+            (name,)
+        )
+        if cursor.fetchone():
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+    def rollback(conn):
+        conn.cursor().execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+    return apply, rollback
+
+
+def drop_index(name, definition):
+    apply, rollback = create_index(name, definition)
+    return rollback, apply
+
+
+steps = [step(*create_index(name, definition)) for name, definition in INDEXES.items()]
+steps += [step(*drop_index(name, definition)) for name, definition in REDUNDANT_INDEXES.items()]
@@ -0,0 +1,94 @@
+"""
+Convert every id / foreign key column from VARCHAR to the native UUID type
+16 bytes instead of 36 characters per value in every primary key, foreign key and index.
+The API still exchanges ids as strings; new ids are time-ordered UUIDv7 (see app/db/types.py).
+
+This migration rewrites the tables under an exclusive lock, which is fine for small databases.
+For a populated database run `python migrate_uuid_columns.py` first (online procedure,
+see docs/ADMIN_GUIDE.md): columns it already converted are skipped here.
+"""
+
+from yoyo import step
+
+__depends__ = {'0013_add_composite_partial_indexes'}
+
+ID_COLUMNS = {
+    "users": ["id", "personal_trainer_id"],
+    "exercises": ["id", "created_by"],
+    "workout_plans": ["id", "user_id"],
+    "plan_exercises": ["id", "workout_plan_id", "exercise_id"],
+    "workout_sessions": ["id", "user_id", "workout_plan_id"],
+    "exercise_logs": ["id", "session_id", "exercise_id"],
+    "user_exercise_last": ["user_id", "exercise_id", "session_id"],
+    "user_activity_days": ["user_id"],
+    "daily_user_activity": ["user_id"],
+    "cardio_sessions": ["id", "user_id"],
+    "assigned_exercises": ["id", "exercise_id", "client_id", "personal_trainer_id"],
+    "weight_history": ["id", "user_id"],
+    "client_metrics": ["id", "client_id", "personal_trainer_id"],
+    "password_reset_tokens": ["id", "user_id"],
+    "login_attempts": ["id", "user_id"],
+    "metrics_events": ["id", "entity_id", "user_id"],
+}
+
+UUID_PATTERN = "^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$"
+
+
+def to_uuid(column):
+    """
+    Cast a VARCHAR id to UUID; legacy ids that are not UUIDs (e.g. '<user id>-initial' weight
+    history rows from 0004) map to md5(id), identically on both sides of a foreign key
+    """
+    return f"CASE WHEN {column} ~ '{UUID_PATTERN}' THEN {column}::uuid ELSE md5({column})::uuid END"
+
+
+def convert_columns(conn, from_type, to_type):
+    """ALTER every id column still of from_type to to_type, dropping and restoring foreign keys around it"""
+    cursor = conn.cursor()
+    pending = {}
+    for table, columns in ID_COLUMNS.items():
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s AND data_type = %s",
+            (table, from_type)
+        )
+        matching = {row[0] for row in cursor.fetchall()}
+        if matching.intersection(columns):
+            pending[table] = [column for column in columns if column in matching]
+
+    if not pending:
+        return
+
+    # Foreign keys cannot span a VARCHAR and a UUID column mid-conversion
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE contype = 'f' AND conrelid::regclass::text = ANY(%s)",
+        (list(ID_COLUMNS),)
+    )
+    foreign_keys = cursor.fetchall()
+    for table, name, _ in foreign_keys:
+        cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+
+    for table, columns in pending.items():
+        alterations = ", ".join(
+            f"ALTER COLUMN {column} TYPE {to_type} USING "
+            + (to_uuid(column) if to_type == "uuid" else f"{column}::{to_type}")
+            for column in columns
+        )
+        cursor.execute(f"ALTER TABLE {table} {alterations}")
+
+    for table, name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+
+
+def apply_step(conn):
+    convert_columns(conn, "character varying", "uuid")
+
+
+def rollback_step(conn):
+    convert_columns(conn, "uuid", "varchar")
+
+
+steps = [
+    step(apply_step, rollback_step),
+]
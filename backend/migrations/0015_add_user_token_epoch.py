@@ -0,0 +1,15 @@
+"""
+Add token_epoch to users - access tokens carry it as a claim and are rejected once it is bumped
+(password change or reset), so every issued token can be revoked without a token blacklist
+"""
+
+from yoyo import step
+
+__depends__ = {'0014_convert_ids_to_uuid'}
+
+steps = [
+    step(
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_epoch INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE users DROP COLUMN IF EXISTS token_epoch"
+    ),
+]
@@ -0,0 +1,43 @@
+"""
+Add refresh_tokens table - long-lived refresh tokens (stored as SHA-256 hashes), rotated on
+every use, so expired access tokens are renewed by an indexed lookup instead of a bcrypt login
+"""
+
+from yoyo import step
+
+__depends__ = {'0015_add_user_token_epoch'}
+
+steps = [
+    step(
+        """
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            id UUID PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            family_id UUID NOT NULL,
+            token_hash VARCHAR(64) NOT NULL,
+            device_name VARCHAR(200),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            revoked_at TIMESTAMP WITH TIME ZONE,
+            replaced_by_id UUID
+        );
+        """,
+        """
+        DROP TABLE IF EXISTS refresh_tokens;
+        """
+    ),
+
+    # Refresh looks tokens up by hash; sign-out revokes by family, password changes by user
+    step(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_refresh_tokens_token_hash ON refresh_tokens(token_hash)",
+        "DROP INDEX IF EXISTS ix_refresh_tokens_token_hash"
+    ),
+    step(
+        "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens(family_id)",
+        "DROP INDEX IF EXISTS ix_refresh_tokens_family_id"
+    ),
+    step(
+        "CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens(user_id)",
+        "DROP INDEX IF EXISTS ix_refresh_tokens_user_id"
+    ),
+]
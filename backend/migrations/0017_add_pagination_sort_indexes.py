@@ -0,0 +1,59 @@
+"""
+Add composite indexes matching the sort keys of the cursor-paginated listings
+- weight_history (user_id, recorded_at DESC, id DESC): weight history, newest first
+- exercises (created_by, created_at, id): a trainer's exercise library, oldest first
+- workout_plans (user_id, created_at, id): workout plans, oldest first
+A page then starts with an index range scan right after the cursor row, instead of sorting
+all of the user's rows. The single-column user_id indexes from 0004/0005 are prefixes of the
+new ones and are dropped.
+
+Built with CREATE INDEX CONCURRENTLY like 0013: this migration is non-transactional and every
+step is a single statement. An index left INVALID by an interrupted build is built again.
+"""
+
+from yoyo import step
+
+__depends__ = {'0016_add_refresh_tokens'}
+__transactional__ = False
+
+INDEXES = {
+    "ix_weight_history_user_recorded":
+        "ON weight_history (user_id, recorded_at DESC, id DESC)",
+    "ix_exercises_created_by_created":
+        "ON exercises (created_by, created_at, id)",
+    "ix_workout_plans_user_created":
+        "ON workout_plans (user_id, created_at, id)",
+}
+
+# Superseded by the composite indexes above (name -> definition, to restore on rollback)
+REDUNDANT_INDEXES = {
+    "ix_weight_history_user_id": "ON weight_history (user_id)",
+    "ix_workout_plans_user_id": "ON workout_plans (user_id)",
+}
+
+
+def create_index(name, definition):
+    def apply(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = %s AND NOT i.indisvalid",
+            (name,)
+        )
+        if cursor.fetchone():
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+    def rollback(conn):
+        conn.cursor().execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+    return apply, rollback
+
+
+def drop_index(name, definition):
+    apply, rollback = create_index(name, definition)
+    return rollback, apply
+
+
+steps = [step(*create_index(name, definition)) for name, definition in INDEXES.items()]
+steps += [step(*drop_index(name, definition)) for name, definition in REDUNDANT_INDEXES.items()]
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the daily activity rollup (daily_user_activity) from workout and cardio history
+Usage:
+    python rebuild_activity_rollup.py                 # Rebuild for all users
+    python rebuild_activity_rollup.py --email user@example.com
+    python rebuild_activity_rollup.py --username john_doe
+"""
+
+import sys
+import os
+import argparse
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.database import SessionLocal
+from app.models.models import User
+from app.services.activity_rollup import rebuild_daily_activity
+from app.services.streak_service import update_user_streak
+
+
+def find_user(db, email=None, username=None):
+    """Find user by email or username"""
+    if email:
+        return db.query(User).filter(User.email == email).first()
+    return db.query(User).filter(User.username == username).first()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the per user per day activity rollup')
+    parser.add_argument('--email', type=str, help='Rebuild only for user with this email')
+    parser.add_argument('--username', type=str, help='Rebuild only for user with this username')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+
+    try:
+        print("=" * 80)
+        print("REBUILD DAILY ACTIVITY ROLLUP")
+        print("=" * 80)
+        print()
+
+        if args.email or args.username:
+            user = find_user(db, args.email, args.username)
+            if not user:
+                print(f"❌ User not found: {args.email or args.username}")
+                return
+            users = [user]
+            print(f"Rebuilding for: {user.name} ({user.email})")
+            rows = rebuild_daily_activity(db, user_id=user.id)
+        else:
+            users = db.query(User).all()
+            print("Rebuilding for all users...")
+            rows = rebuild_daily_activity(db)
+
+        # Streaks are derived from the rollup
+        for user in users:
+            update_user_streak(db, user.id)
+
+        db.commit()
+
+        print(f"\n✅ Wrote {rows} daily activity row(s) and refreshed {len(users)} streak(s)!")
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
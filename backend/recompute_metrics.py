@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Script to recompute every ClientMetrics row from workouts, cardio and weight history
+Clients are split into batches and recomputed in parallel worker processes
+Usage:
+    python recompute_metrics.py                      # Recompute all clients
+    python recompute_metrics.py --dry-run            # Show what would change, write nothing
+    python recompute_metrics.py --email user@example.com
+    python recompute_metrics.py --workers 8 --batch-size 500
+    python recompute_metrics.py --resume             # Continue an interrupted run
+"""
+
+import sys
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.database import SessionLocal, engine
+from app.models.models import ClientMetrics, User
+from app.services.metrics_recompute import recompute_client_metrics
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".recompute_metrics_checkpoint.json")
+
+
+def init_worker():
+    """Drop connections inherited from the parent process - each worker opens its own"""
+    engine.dispose(close=False)
+
+
+def recompute_batch(client_ids, dry_run):
+    """Recompute one batch of clients in a worker process"""
+    db = SessionLocal()
+    try:
+        return client_ids, recompute_client_metrics(db, client_ids, dry_run=dry_run)
+    finally:
+        db.close()
+
+
+def load_checkpoint(path):
+    """Client ids already recomputed by an earlier, interrupted run"""
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f)["completed_client_ids"])
+
+
+def save_checkpoint(path, completed_ids):
+    """Write the checkpoint atomically so an interruption never leaves it half-written"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"completed_client_ids": sorted(completed_ids)}, f)
+    os.replace(tmp_path, path)
+
+
+def print_differences(emails, differences):
+    """Print the changed fields of each client"""
+    for client_id, changed in differences.items():
+        print(f"  {emails.get(client_id, client_id)}")
+        for field, (old, new) in changed.items():
+            print(f"    - {field}: {old} -> {new}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute ClientMetrics from source tables')
+    parser.add_argument('--dry-run', action='store_true', help='Show differences without writing them')
+    parser.add_argument('--email', type=str, help='Recompute only the client with this email')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--batch-size', type=int, default=200, help='Clients per batch')
+    parser.add_argument('--resume', action='store_true', help='Skip clients completed by an interrupted run')
+    parser.add_argument('--checkpoint', type=str, default=DEFAULT_CHECKPOINT, help='Checkpoint file path')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(ClientMetrics.client_id, User.email).join(User, User.id == ClientMetrics.client_id)
+        if args.email:
+            query = query.filter(User.email == args.email)
+        emails = dict(query.order_by(ClientMetrics.client_id).all())
+    finally:
+        db.close()
+
+    print("=" * 80)
+    print("RECOMPUTE CLIENT METRICS" + (" (DRY RUN)" if args.dry_run else ""))
+    print("=" * 80)
+    print()
+
+    if not emails:
+        print("❌ No client metrics found.")
+        return
+
+    completed_ids = load_checkpoint(args.checkpoint) if args.resume else set()
+    pending_ids = [client_id for client_id in emails if client_id not in completed_ids]
+    if completed_ids:
+        print(f"Resuming: {len(emails) - len(pending_ids)} client(s) already done")
+
+    batches = [pending_ids[i:i + args.batch_size] for i in range(0, len(pending_ids), args.batch_size)]
+    print(f"Recomputing {len(pending_ids)} client(s) in {len(batches)} batch(es) with {args.workers} worker(s)...\n")
+
+    changed_clients = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        futures = [pool.submit(recompute_batch, batch, args.dry_run) for batch in batches]
+        for future in as_completed(futures):
+            client_ids, differences = future.result()
+            changed_clients += len(differences)
+            print_differences(emails, differences)
+
+            if not args.dry_run:
+                completed_ids.update(client_ids)
+                save_checkpoint(args.checkpoint, completed_ids)
+                print(f"✓ Batch done ({len(completed_ids)}/{len(emails)} clients)")
+
+    if not args.dry_run and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    if args.dry_run:
+        print(f"\n✅ {changed_clients} client(s) would change. Nothing was written.")
+    else:
+        print(f"\n✅ Recomputed metrics for {len(pending_ids)} client(s), {changed_clients} changed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app.db.database import SessionLocal
 from app.models.models import User
 from app.core.security import get_password_hash
+from app.core.user_cache import publish_user_change
 
 
 def reset_all_passwords():
@@ -40,7 +41,8 @@ def reset_all_passwords():
             updated_count += 1
             print(f"✓ Updated password for: {user.email} (username: {user.username})")
 
-        # Commit changes
+        # Commit changes (running API workers drop their cached copies on commit)
+        publish_user_change(db, *[user.id for user in users])
         db.commit()
 
         print(f"\n✅ Successfully reset passwords for {updated_count} users!")
@@ -0,0 +1,120 @@
+"""
+Shared fixtures: the app runs against a throwaway SQLite database
+The environment is set before the app is imported, since settings are read at import time.
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_test_dir = tempfile.mkdtemp(prefix="gymtracker-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_dir, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_test_dir, "uploads")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-" + "x" * 32)
+os.environ["LOGIN_LIMITER_PATH"] = ":memory:"
+# Queued login audit rows are only written on shutdown: query_budget counts every statement of
+# the process, so a flush in the middle of a budget block would fail the test
+os.environ["LOGIN_AUDIT_FLUSH_SECONDS"] = "3600"
+# Relationships get lazy="raise_on_sql": serializing one that was not eagerly loaded fails the test
+os.environ["DB_RAISE_ON_LAZY_LOAD"] = "true"
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+PASSWORD = "password123"
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def register_and_login(client: TestClient, role: str) -> dict:
+    """Register a new user with the role; returns the user with its auth headers under "headers" """
+    name = f"{role[:2]}{uuid.uuid4().hex[:10]}"
+    response = client.post("/api/auth/register", json={
+        "username": name,
+        "email": f"{name}@example.com",
+        "name": name,
+        "role": role,
+        "password": PASSWORD,
+        "confirm_password": PASSWORD,
+        "date_of_birth": "1990-01-01T00:00:00",
+        "weight": 80,
+        "height": 180,
+        "language": "en"
+    })
+    assert response.status_code == 201, response.text
+    response = client.post("/api/auth/login", json={"email": name, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return {**client.get("/api/auth/me", headers=headers).json(), "headers": headers}
+
+
+@pytest.fixture
+def make_user(client):
+    """register_and_login for more users of a test"""
+    return lambda role="client": register_and_login(client, role)
+
+
+@pytest.fixture
+def trainer(client):
+    return register_and_login(client, "personal_trainer")
+
+
+@pytest.fixture
+def trainee(client, trainer):
+    """A client of the trainer"""
+    user = register_and_login(client, "client")
+    response = client.post(f"/api/users/clients/{user['id']}/assign", headers=trainer["headers"])
+    assert response.status_code == 200, response.text
+    return user
+
+
+@pytest.fixture
+def auth_headers(trainee):
+    return trainee["headers"]
+
+
+@pytest.fixture
+def workout_plan(client, trainer, trainee):
+    """A plan of the trainee with two exercises, and three logged sessions of it"""
+    exercises = []
+    for name, muscle_group in (("Squat", "Legs"), ("Bench Press", "Chest")):
+        response = client.post(
+            "/api/exercises", data={"name": f"{name} {uuid.uuid4().hex[:6]}", "muscle_group": muscle_group},
+            headers=trainer["headers"]
+        )
+        assert response.status_code == 201, response.text
+        exercises.append(response.json())
+        client.post("/api/exercises/assign", json={"exercise_id": exercises[-1]["id"], "client_id": trainee["id"]},
+                    headers=trainer["headers"])
+
+    response = client.post("/api/workout-plans", json={
+        "name": "Plan A",
+        "client_id": trainee["id"],
+        "exercises": [
+            {"exercise_id": exercise["id"], "sets": "3", "reps": "10", "rest_time": "60", "order": order}
+            for order, exercise in enumerate(exercises)
+        ]
+    }, headers=trainer["headers"])
+    assert response.status_code == 201, response.text
+    plan = response.json()
+
+    for weight in (60, 61, 62):
+        session = client.post("/api/workout-sessions", json={"workout_plan_id": plan["id"]},
+                              headers=trainee["headers"]).json()
+        response = client.post(f"/api/workout-sessions/{session['id']}/exercises/bulk", json={
+            "exercise_logs": [
+                {"exercise_id": exercise["id"], "sets_completed": "3", "reps_completed": "10", "weight_used": weight}
+                for exercise in exercises
+            ],
+            "end_session": True
+        }, headers=trainee["headers"])
+        assert response.status_code == 201, response.text
+    return plan
@@ -0,0 +1,74 @@
+"""
+Activity calendar (year heatmap) served from the daily rollup, revalidated with its ETag
+"""
+
+from datetime import date
+
+from app.services.activity_rollup import calendar_level
+
+YEAR = 2024  # Leap year: 366 levels
+
+
+def log_cardio(client, headers: dict, day: str, minutes: int):
+    response = client.post("/api/cardio", json={
+        "activity_type": "run", "duration": minutes, "start_time": f"{day}T12:00:00"
+    }, headers=headers)
+    assert response.status_code == 201, response.text
+
+
+def level_of(calendar: dict, day: str) -> int:
+    return calendar["levels"][(date.fromisoformat(day) - date.fromisoformat(calendar["start_date"])).days]
+
+
+def test_calendar_level_buckets():
+    assert calendar_level(0, 0, 0) == 0
+    # Any session counts, however short
+    assert calendar_level(1, 0, 0) == 1
+    assert calendar_level(0, 1, 0.5) == 1
+    assert calendar_level(1, 0, 29.9) == 1
+    assert calendar_level(1, 0, 30) == 2
+    assert calendar_level(0, 1, 60) == 3
+    assert calendar_level(1, 1, 90) == 4
+    assert calendar_level(2, 1, 300) == 4
+
+
+def test_activity_calendar_levels(client, make_user):
+    headers = make_user()["headers"]
+    for day, minutes in (("2024-01-01", 10), ("2024-03-15", 45), ("2024-06-30", 60), ("2024-12-31", 120)):
+        log_cardio(client, headers, day, minutes)
+    # Two sessions of one day add up
+    log_cardio(client, headers, "2024-03-15", 45)
+
+    response = client.get("/api/users/activity-calendar", params={"year": YEAR}, headers=headers)
+    assert response.status_code == 200, response.text
+    calendar = response.json()
+    assert calendar["start_date"] == "2024-01-01"
+    assert len(calendar["levels"]) == 366
+    assert [level_of(calendar, day) for day in ("2024-01-01", "2024-03-15", "2024-06-30", "2024-12-31")] == [1, 4, 3, 4]
+    assert sum(1 for level in calendar["levels"] if level) == calendar["active_days"] == 4
+    assert calendar["total_cardio_sessions"] == 5
+    assert calendar["total_active_minutes"] == 280
+
+
+def test_activity_calendar_etag(client, make_user):
+    headers = make_user()["headers"]
+    log_cardio(client, headers, "2024-05-01", 30)
+
+    response = client.get("/api/users/activity-calendar", params={"year": YEAR}, headers=headers)
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = client.get("/api/users/activity-calendar", params={"year": YEAR},
+                          headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+
+    # New activity changes the calendar, so the old ETag no longer matches
+    log_cardio(client, headers, "2024-05-02", 30)
+    response = client.get("/api/users/activity-calendar", params={"year": YEAR},
+                          headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] != etag
+    assert level_of(response.json(), "2024-05-02") == 2
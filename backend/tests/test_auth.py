@@ -0,0 +1,112 @@
+"""
+Refresh tokens: rotation, the grace window of refresh races, reuse detection, sign-out
+"""
+
+from datetime import timedelta
+
+from app.core import refresh_tokens
+
+PASSWORD = "password123"
+
+
+def login(client, user, device_name=None):
+    response = client.post("/api/auth/login", json={
+        "email": user["email"], "password": PASSWORD, "device_name": device_name
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def refresh(client, token):
+    return client.post("/api/auth/refresh", json={"refresh_token": token})
+
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_refresh_rotates_the_token(client, make_user):
+    user = make_user()
+    tokens = login(client, user)
+
+    response = refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200, response.text
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/api/auth/me", headers=bearer(rotated)).json()["id"] == user["id"]
+
+    # The replacement is single use too
+    assert refresh(client, rotated["refresh_token"]).status_code == 200
+    assert refresh(client, "not-a-refresh-token").status_code == 401
+
+
+def test_refresh_race_within_grace_keeps_the_winner_signed_in(client, make_user):
+    user = make_user()
+    tokens = login(client, user)
+    winner = refresh(client, tokens["refresh_token"]).json()
+
+    # The losing tab presents the rotated token, then signs out with it
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    assert client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+
+    assert refresh(client, winner["refresh_token"]).status_code == 200
+
+
+def test_reused_token_revokes_the_family(client, make_user, monkeypatch):
+    user = make_user()
+    tokens = login(client, user)
+    rotated = refresh(client, tokens["refresh_token"]).json()
+
+    # Presented again after the grace window: a leaked token, the whole sign-in is revoked
+    monkeypatch.setattr(refresh_tokens, "ROTATION_GRACE", timedelta(seconds=-1))
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+
+    # Other sign-ins of the user are untouched
+    assert refresh(client, login(client, user)["refresh_token"]).status_code == 200
+
+
+def test_logout_signs_the_device_out(client, make_user):
+    user = make_user()
+    tokens = refresh(client, login(client, user)["refresh_token"]).json()
+
+    assert client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_device_list_and_sign_out(client, make_user):
+    user = make_user()
+    phone = login(client, user, "Phone")
+    laptop = login(client, user, "Laptop")
+
+    response = client.get("/api/auth/devices", headers=bearer(laptop))
+    assert response.status_code == 200, response.text
+    devices = {device["device_name"]: device["id"] for device in response.json()}
+    assert {"Phone", "Laptop"} <= set(devices)
+
+    assert client.delete(f"/api/auth/devices/{devices['Phone']}", headers=bearer(laptop)).status_code == 204
+    assert refresh(client, phone["refresh_token"]).status_code == 401
+    assert refresh(client, laptop["refresh_token"]).status_code == 200
+
+    # Another user's device cannot be signed out
+    other = make_user()
+    assert client.delete(f"/api/auth/devices/{devices['Laptop']}", headers=other["headers"]).status_code == 404
+
+
+def test_password_change_revokes_every_token(client, make_user):
+    user = make_user()
+    other_device = login(client, user)
+
+    response = client.post("/api/auth/change-password", json={
+        "current_password": PASSWORD, "new_password": "password456", "confirm_new_password": "password456"
+    }, headers=user["headers"])
+    assert response.status_code == 200, response.text
+    replacement = response.json()
+
+    # Access tokens from before the change fail the epoch check, refresh tokens are revoked
+    assert client.get("/api/auth/me", headers=user["headers"]).status_code == 401
+    assert client.get("/api/auth/devices", headers=bearer(other_device)).status_code == 401
+    assert refresh(client, other_device["refresh_token"]).status_code == 401
+
+    assert client.get("/api/auth/me", headers=bearer(replacement)).status_code == 200
+    assert refresh(client, replacement["refresh_token"]).status_code == 200
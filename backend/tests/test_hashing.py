@@ -0,0 +1,39 @@
+"""
+Password hashing pool: calls given up while waiting must leave the queue
+"""
+
+import asyncio
+import threading
+
+from app.core.hashing import HashingPool
+
+
+def test_cancelled_waiting_calls_leave_the_queue():
+    pool = HashingPool(max_workers=1, max_queue=2)
+    release = threading.Event()
+    ran = []
+
+    async def scenario():
+        busy = asyncio.create_task(pool.run(release.wait))
+        waiting = [asyncio.create_task(pool.run(ran.append, n)) for n in range(2)]
+        await asyncio.sleep(0.05)
+        assert pool.snapshot()["queued"] == 2
+
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        assert pool.snapshot()["queued"] == 0
+
+        release.set()
+        await busy
+        # The queue has room again, and the cancelled calls never ran
+        assert await pool.run(sum, [1, 2]) == 3
+        await asyncio.sleep(0.05)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+    snapshot = pool.snapshot()
+    assert ran == []
+    assert (snapshot["queued"], snapshot["running"], snapshot["rejected"]) == (0, 0, 0)
@@ -0,0 +1,35 @@
+"""
+Login rate limiting: the per-IP key only ever holds a client's address
+"""
+
+import uuid
+
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.login_attempts import limiter_keys, login_client_ip
+
+
+def request_from(host: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/api/auth/login", "headers": [], "client": (host, 50000)})
+
+
+def test_trusted_proxy_address_is_not_limited(monkeypatch):
+    monkeypatch.setattr(settings, "FORWARDED_ALLOW_IPS", "172.28.0.10, 127.0.0.1")
+    assert login_client_ip(request_from("172.28.0.10")) is None
+    assert login_client_ip(request_from("203.0.113.5")) == "203.0.113.5"
+    assert list(limiter_keys("user@example.com", None)) == ["identifier:user@example.com"]
+
+
+def test_per_ip_limit_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_IP_MAX_ATTEMPTS", 0)
+    assert list(limiter_keys("user@example.com", "203.0.113.5")) == ["identifier:user@example.com"]
+
+
+def test_identifier_is_locked_after_max_failures(client):
+    identifier = f"nobody-{uuid.uuid4().hex}@example.com"
+    for _ in range(settings.MAX_LOGIN_ATTEMPTS):
+        response = client.post("/api/auth/login", json={"email": identifier, "password": "wrong-password"})
+        assert response.status_code == 401
+    response = client.post("/api/auth/login", json={"email": identifier, "password": "wrong-password"})
+    assert response.status_code == 429, response.text
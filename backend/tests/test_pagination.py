@@ -0,0 +1,83 @@
+"""
+Keyset pagination of the list endpoints (X-Next-Cursor)
+Rows sharing the leading sort key value (created in the same second) must each appear on exactly
+one page: the id breaks the tie, in the same direction as the sort.
+"""
+
+import uuid
+
+from sqlalchemy import text
+from app.db.database import SessionLocal
+from app.db.pagination import NEXT_CURSOR_HEADER
+
+
+def tie_sort_key(table: str, column: str, owner_column: str, owner_id: str):
+    """Give every row of one owner the same sort key value, as rows inserted in the same second have"""
+    with SessionLocal() as db:
+        db.execute(text(
+            f"UPDATE {table} SET {column} = (SELECT min({column}) FROM {table} WHERE {owner_column} = :owner) "
+            f"WHERE {owner_column} = :owner"
+        ), {"owner": owner_id})
+        db.commit()
+
+
+def all_pages(client, url: str, headers: dict, limit: int) -> list:
+    """Follow X-Next-Cursor from the first page to the last, returning the pages"""
+    pages = []
+    params = {"limit": limit}
+    while True:
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        if NEXT_CURSOR_HEADER not in response.headers:
+            return pages
+        params = {"limit": limit, "cursor": response.headers[NEXT_CURSOR_HEADER]}
+
+
+def test_exercise_pages_split_ties_on_created_at(client, make_user):
+    trainer = make_user("personal_trainer")
+    for number in range(5):
+        response = client.post("/api/exercises", data={"name": f"Row {number} {uuid.uuid4().hex[:6]}",
+                                                       "muscle_group": "Back"}, headers=trainer["headers"])
+        assert response.status_code == 201, response.text
+    tie_sort_key("exercises", "created_at", "created_by", trainer["id"])
+
+    pages = all_pages(client, "/api/exercises", trainer["headers"], limit=2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    ids = [exercise["id"] for page in pages for exercise in page]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 5
+
+
+def test_weight_history_pages_split_ties_on_recorded_at(client, make_user):
+    user = make_user()
+    for weight in (81, 82, 83, 84):
+        response = client.put("/api/users/profile", json={"weight": weight}, headers=user["headers"])
+        assert response.status_code == 200, response.text
+    tie_sort_key("weight_history", "recorded_at", "user_id", user["id"])
+
+    # Newest first: with the timestamps tied, the id decides in the same (descending) direction
+    pages = all_pages(client, "/api/metrics/weight-history", user["headers"], limit=2)
+    assert [len(page) for page in pages] == [2, 2]
+    ids = [record["id"] for page in pages for record in page]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 4
+
+
+def test_last_page_has_no_cursor(client, make_user):
+    user = make_user()
+    response = client.put("/api/users/profile", json={"weight": 79}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/metrics/weight-history", params={"limit": 1}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 1
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_invalid_cursor_is_rejected(client, make_user):
+    headers = make_user()["headers"]
+    for cursor in ("not-a-cursor", "WzFd", "WyJub3QtYS1kYXRlIiwgIngiXQ"):
+        response = client.get("/api/metrics/weight-history", params={"cursor": cursor}, headers=headers)
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == "Invalid cursor"
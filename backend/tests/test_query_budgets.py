@@ -0,0 +1,41 @@
+"""
+Query counts of the list endpoints: each must stay the same however many rows are returned
+"""
+
+from app.db.query_stats import query_budget
+
+
+def test_list_workout_sessions_query_budget(client, auth_headers, workout_plan):
+    with query_budget(3):  # user, sessions, exercise logs joined to their exercises
+        response = client.get("/api/workout-sessions", headers=auth_headers)
+    assert response.status_code == 200
+    sessions = response.json()
+    assert len(sessions) == 3
+    assert all(len(session["exercise_logs"]) == 2 for session in sessions)
+
+
+def test_list_workout_plans_query_budget(client, auth_headers, workout_plan):
+    with query_budget(4):  # user, plans, plan exercises joined to their exercises, last weights
+        response = client.get("/api/workout-plans", headers=auth_headers)
+    assert response.status_code == 200
+    plan_exercises = response.json()[0]["plan_exercises"]
+    assert len(plan_exercises) == 2
+    assert all(plan_exercise["last_weight_used"] == 62 for plan_exercise in plan_exercises)
+
+
+def test_trainer_plans_query_budget(client, trainer, workout_plan):
+    with query_budget(4):  # user, plans of every client, plan exercises, last weights
+        response = client.get("/api/workout-plans", headers=trainer["headers"])
+    assert response.status_code == 200
+    assert [plan["id"] for plan in response.json()] == [workout_plan["id"]]
+
+
+def test_trainer_summary_query_budget(client, trainer, workout_plan):
+    with query_budget(2):  # token epoch, summary of every client in one statement
+        response = client.get("/api/metrics/dashboard-summary", headers=trainer["headers"])
+    assert response.status_code == 200
+    assert response.json()["total_workouts_all_clients"] == 3
+
+    with query_budget(1):  # cached until a client of the trainer changes; at most the token epoch
+        response = client.get("/api/metrics/dashboard-summary", headers=trainer["headers"])
+    assert response.status_code == 200
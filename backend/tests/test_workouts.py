@@ -0,0 +1,144 @@
+"""
+Workout plan and session endpoints
+They serialize nested relationships (plan exercises, exercise logs and their exercises), which
+must be loaded with selectinload/joinedload: the conftest makes any lazy load raise.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from app.models.models import LAZY_LOADING
+
+
+def test_lazy_loads_raise():
+    assert LAZY_LOADING == "raise_on_sql"
+
+
+def test_workout_plan_endpoints(client, trainer, trainee, workout_plan):
+    plan_id = workout_plan["id"]
+    assert [pe["exercise"]["id"] for pe in workout_plan["plan_exercises"]]
+
+    response = client.get(f"/api/workout-plans/{plan_id}", headers=trainee["headers"])
+    assert response.status_code == 200, response.text
+    assert len(response.json()["plan_exercises"]) == 2
+
+    response = client.put(f"/api/workout-plans/{plan_id}", json={"name": "Plan B"}, headers=trainer["headers"])
+    assert response.status_code == 200, response.text
+    assert response.json()["name"] == "Plan B"
+    assert all(pe["exercise"]["name"] for pe in response.json()["plan_exercises"])
+
+    exercise_id = workout_plan["plan_exercises"][0]["exercise_id"]
+    response = client.post(f"/api/workout-plans/{plan_id}/exercises", json={
+        "exercise_id": exercise_id, "sets": "4", "reps": "6", "rest_time": "120", "order": 2
+    }, headers=trainer["headers"])
+    assert response.status_code == 200, response.text
+    assert len(response.json()["plan_exercises"]) == 3
+
+    response = client.get("/api/workout-plans", headers=trainer["headers"])
+    assert response.status_code == 200, response.text
+    assert len(response.json()[0]["plan_exercises"]) == 3
+
+
+def test_workout_session_endpoints(client, trainee, workout_plan):
+    headers = trainee["headers"]
+    exercise_ids = [pe["exercise_id"] for pe in workout_plan["plan_exercises"]]
+
+    response = client.post("/api/workout-sessions", json={"workout_plan_id": workout_plan["id"]}, headers=headers)
+    assert response.status_code == 201, response.text
+    session_id = response.json()["id"]
+
+    response = client.post(f"/api/workout-sessions/{session_id}/exercises", json={
+        "exercise_id": exercise_ids[0], "sets_completed": "3", "reps_completed": "8", "weight_used": 70
+    }, headers=headers)
+    assert response.status_code == 201, response.text
+
+    response = client.post(f"/api/workout-sessions/{session_id}/exercises/bulk", json={"exercise_logs": [
+        {"exercise_id": exercise_ids[1], "sets_completed": "3", "reps_completed": "8", "weight_used": 40}
+    ]}, headers=headers)
+    assert response.status_code == 201, response.text
+    assert len(response.json()["exercise_logs"]) == 2
+
+    response = client.get("/api/workout-sessions/active", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == session_id
+
+    response = client.put(f"/api/workout-sessions/{session_id}", json={"notes": "Heavy day"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["notes"] == "Heavy day"
+
+    response = client.post(f"/api/workout-sessions/{session_id}/end", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["end_time"] is not None
+
+    response = client.get(f"/api/workout-sessions/{session_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert {log["exercise"]["id"] for log in response.json()["exercise_logs"]} == set(exercise_ids)
+
+    response = client.get("/api/workout-plans", headers=headers)
+    weights = {pe["exercise_id"]: pe["last_weight_used"] for pe in response.json()[0]["plan_exercises"]}
+    assert weights == {exercise_ids[0]: 70, exercise_ids[1]: 40}
+
+
+def test_editing_end_time_of_closed_session_refreshes_rollup(client, make_user):
+    headers = make_user()["headers"]
+
+    response = client.post("/api/workout-sessions", json={}, headers=headers)
+    assert response.status_code == 201, response.text
+    session = response.json()
+    start = datetime.fromisoformat(session["start_time"])
+
+    response = client.post(f"/api/workout-sessions/{session['id']}/end", headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/users/activity-calendar", params={"year": start.year}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["total_active_minutes"] < 1
+
+    response = client.put(f"/api/workout-sessions/{session['id']}", json={
+        "end_time": (start + timedelta(minutes=90)).isoformat()
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/users/activity-calendar", params={"year": start.year}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["total_active_minutes"] == 90
+    assert response.json()["total_workouts"] == 1
+
+    response = client.get("/api/users/dashboard", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["active_streak"] == 1
+
+
+def test_bulk_log_with_unknown_exercise_saves_nothing(client, trainee, workout_plan):
+    headers = trainee["headers"]
+    exercise_id = workout_plan["plan_exercises"][0]["exercise_id"]
+    unknown_id = str(uuid.uuid4())
+
+    response = client.post("/api/workout-sessions", json={"workout_plan_id": workout_plan["id"]}, headers=headers)
+    assert response.status_code == 201, response.text
+    session_id = response.json()["id"]
+
+    logs = [
+        {"exercise_id": exercise_id, "sets_completed": "3", "reps_completed": "8", "weight_used": 90},
+        {"exercise_id": unknown_id, "sets_completed": "3", "reps_completed": "8", "weight_used": 50},
+    ]
+    response = client.post(f"/api/workout-sessions/{session_id}/exercises/bulk",
+                           json={"exercise_logs": logs, "end_session": True}, headers=headers)
+    assert response.status_code == 404, response.text
+    assert unknown_id in response.json()["detail"]
+
+    # Neither the valid log nor the end of the session was saved
+    response = client.get(f"/api/workout-sessions/{session_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["exercise_logs"] == []
+    assert response.json()["end_time"] is None
+
+    response = client.get("/api/workout-plans", headers=headers)
+    weights = {pe["exercise_id"]: pe["last_weight_used"] for pe in response.json()[0]["plan_exercises"]}
+    assert weights[exercise_id] != 90
+
+    response = client.post(f"/api/workout-sessions/{session_id}/exercises/bulk",
+                           json={"exercise_logs": logs[:1], "end_session": True}, headers=headers)
+    assert response.status_code == 201, response.text
+    assert len(response.json()["exercise_logs"]) == 1
+    assert response.json()["end_time"] is not None
@@ -1,6 +1,8 @@
 // API Configuration
 const API_BASE = '/api';
 let authToken = localStorage.getItem('authToken');
+let refreshToken = localStorage.getItem('refreshToken');
+let refreshInFlight = null;
 let currentUser = null;
 let activeWorkoutSession = null;
 let workoutTimer = null;
@@ -18,7 +20,57 @@ function showAlert(message, type = 'success') {
     }, 3000);
 }
 
-async function apiRequest(endpoint, options = {}) {
+function storeTokens(data) {
+    authToken = data.access_token;
+    localStorage.setItem('authToken', authToken);
+    if (data.refresh_token) {
+        refreshToken = data.refresh_token;
+        localStorage.setItem('refreshToken', refreshToken);
+    }
+}
+
+// Tokens another tab stored after rotating the refresh token this tab sent; false if there are none
+function adoptTokensOfAnotherTab(sentToken) {
+    const storedToken = localStorage.getItem('refreshToken');
+    if (!storedToken || storedToken === sentToken) return false;
+    authToken = localStorage.getItem('authToken');
+    refreshToken = storedToken;
+    return true;
+}
+
+// Renew an expired access token with the refresh token instead of sending the user to the login form.
+// Concurrent 401s share one refresh: each refresh token can only be used once.
+function refreshAccessToken() {
+    if (!refreshInFlight) {
+        refreshInFlight = (async () => {
+            // Another tab may already have rotated the token
+            refreshToken = localStorage.getItem('refreshToken') || refreshToken;
+            if (!refreshToken) return false;
+            const sentToken = refreshToken;
+
+            const response = await fetch(`${API_BASE}/auth/refresh`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: sentToken })
+            });
+            if (!response.ok) {
+                // Lost a refresh race against another tab: its response may still be on the way,
+                // so give it a moment to store the replacement tokens before giving up
+                if (adoptTokensOfAnotherTab(sentToken)) return true;
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                return adoptTokensOfAnotherTab(sentToken);
+            }
+
+            storeTokens(await response.json());
+            return true;
+        })().catch(() => false).finally(() => {
+            refreshInFlight = null;
+        });
+    }
+    return refreshInFlight;
+}
+
+async function apiRequest(endpoint, options = {}, retried = false) {
     const headers = {
         'Content-Type': 'application/json',
         ...options.headers
@@ -34,6 +86,10 @@ async function apiRequest(endpoint, options = {}) {
             headers
         });
 
+        if (response.status === 401 && !options.noAuth && !retried && await refreshAccessToken()) {
+            return apiRequest(endpoint, options, true);
+        }
+
         if (response.status === 401) {
             logout();
             throw new Error('Unauthorized');
@@ -52,7 +108,7 @@ async function apiRequest(endpoint, options = {}) {
     }
 }
 
-async function uploadFile(endpoint, formData, method = 'POST') {
+async function uploadFile(endpoint, formData, method = 'POST', retried = false) {
     const headers = {};
     if (authToken) {
         headers['Authorization'] = `Bearer ${authToken}`;
@@ -65,6 +121,10 @@ async function uploadFile(endpoint, formData, method = 'POST') {
             body: formData
         });
 
+        if (response.status === 401 && !retried && await refreshAccessToken()) {
+            return uploadFile(endpoint, formData, method, true);
+        }
+
         if (response.status === 401) {
             logout();
             throw new Error('Unauthorized');
@@ -91,8 +151,7 @@ async function login(email, password) {
         noAuth: true
     });
 
-    authToken = data.access_token;
-    localStorage.setItem('authToken', authToken);
+    storeTokens(data);
     await loadUser();
     showApp();
     showAlert(t('common.success'));
@@ -114,9 +173,20 @@ async function register(userData) {
 }
 
 function logout() {
+    // Revoke this device's refresh token (the newest, whichever tab rotated it); nothing to wait for
+    const deviceRefreshToken = localStorage.getItem('refreshToken') || refreshToken;
+    if (deviceRefreshToken) {
+        fetch(`${API_BASE}/auth/logout`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: deviceRefreshToken })
+        }).catch(() => {});
+    }
     authToken = null;
+    refreshToken = null;
     currentUser = null;
     localStorage.removeItem('authToken');
+    localStorage.removeItem('refreshToken');
     // Clear password field on logout
     document.getElementById('login-password').value = '';
     document.getElementById('login-email').value = '';
@@ -2540,6 +2610,10 @@ async function handleChangePassword(e) {
         const data = await response.json();
 
         if (response.ok) {
+            // Tokens issued before the change are revoked; keep this session with the new one
+            if (data.access_token) {
+                storeTokens(data);
+            }
             showAlert(data.message || 'Password changed successfully', 'success');
             closeChangePasswordModal();
         } else {
@@ -0,0 +1,9 @@
+#!/bin/bash
+# Convert id columns to UUID online - Wrapper script
+
+if ! podman ps | grep -q gym_backend; then
+    echo "❌ Error: gym_backend container is not running!"
+    exit 1
+fi
+
+podman exec -it gym_backend python migrate_uuid_columns.py "$@"
@@ -0,0 +1,9 @@
+#!/bin/bash
+# Rebuild daily activity rollup - Wrapper script
+
+if ! podman ps | grep -q gym_backend; then
+    echo "❌ Error: gym_backend container is not running!"
+    exit 1
+fi
+
+podman exec -it gym_backend python rebuild_activity_rollup.py "$@"
@@ -128,10 +128,6 @@ if command -v getenforce &>/dev/null && [ "$(getenforce)" = "Enforcing" ]; then
     SELINUX_FLAG=",Z"
 fi
 
-# Create network
-echo "Creating network..."
-$RUNTIME network create gym_network 2>/dev/null || true
-
 # Create volumes
 echo "Creating volumes..."
 $RUNTIME volume create gym_postgres_data 2>/dev/null || true
@@ -142,6 +138,16 @@ echo "Cleaning up old containers..."
 $RUNTIME stop gym_postgres gym_backend gym_nginx 2>/dev/null || true
 $RUNTIME rm gym_postgres gym_backend gym_nginx 2>/dev/null || true
 
+# Create network (after the containers using it are gone)
+echo "Creating network..."
+# Fixed subnet: nginx gets a fixed address, the only one the backend trusts for X-Forwarded-For
+GYM_SUBNET=172.28.0.0/24
+NGINX_IP=172.28.0.10
+if ! $RUNTIME network inspect gym_network 2>/dev/null | grep -q "$GYM_SUBNET"; then
+  $RUNTIME network rm gym_network 2>/dev/null || true
+  $RUNTIME network create --subnet "$GYM_SUBNET" gym_network
+fi
+
 # Build backend image if needed
 echo "Building backend image..."
 cd "$SCRIPT_DIR/backend"
@@ -189,6 +195,7 @@ $RUNTIME run -d \
   -e SECRET_KEY="your-secret-key-change-this-in-production" \
   -e ALGORITHM="HS256" \
   -e ACCESS_TOKEN_EXPIRE_MINUTES=30 \
+  -e FORWARDED_ALLOW_IPS="$NGINX_IP" \
   -v "$SCRIPT_DIR/backend:/app:ro${SELINUX_FLAG}" \
   -v gym_backend_uploads:/app/uploads \
   localhost/gym_backend:latest
@@ -201,6 +208,7 @@ echo "Starting Nginx..."
 $RUNTIME run -d \
   --name gym_nginx \
   --network gym_network \
+  --ip "$NGINX_IP" \
   -p 8080:80 \
   -v "$SCRIPT_DIR/nginx/nginx.conf:/etc/nginx/nginx.conf:ro${SELINUX_FLAG}" \
   -v "$SCRIPT_DIR/frontend:/usr/share/nginx/html:ro${SELINUX_FLAG}" \
@@ -8,8 +8,13 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 echo "Starting Gym Tracker containers..."
 
-# Create network
-podman network create gym_network 2>/dev/null || true
+# Create network with a fixed subnet: nginx gets a fixed address, the only one the backend trusts for X-Forwarded-For
+GYM_SUBNET=172.28.0.0/24
+NGINX_IP=172.28.0.10
+if ! podman network inspect gym_network 2>/dev/null | grep -q "$GYM_SUBNET"; then
+  podman network rm gym_network 2>/dev/null || true
+  podman network create --subnet "$GYM_SUBNET" gym_network
+fi
 
 # Create volumes
 podman volume create gym_postgres_data 2>/dev/null || true
@@ -47,6 +52,7 @@ podman run -d \
   -e SECRET_KEY="your-secret-key-change-this-in-production" \
   -e ALGORITHM="HS256" \
   -e ACCESS_TOKEN_EXPIRE_MINUTES=30 \
+  -e FORWARDED_ALLOW_IPS="$NGINX_IP" \
   -v "$SCRIPT_DIR/backend:/app:Z" \
   -v gym_backend_uploads:/app/uploads \
   localhost/gym_backend:latest
@@ -56,6 +62,7 @@ echo "Starting Nginx..."
 podman run -d \
   --name gym_nginx \
   --network gym_network \
+  --ip "$NGINX_IP" \
   -p 8080:80 \
   -v "$SCRIPT_DIR/nginx/nginx.conf:/etc/nginx/nginx.conf:ro,Z" \
   -v "$SCRIPT_DIR/frontend:/usr/share/nginx/html:ro,Z" \